@@ -0,0 +1,11 @@
+"""
+Performance benchmarks for the simuvex hot paths.
+
+The workloads are self-contained (they synthesize their own states and IRSBs, no binaries are needed). Run them with
+
+    python -m benchmarks.run -o results.json
+
+and compare two runs with
+
+    python -m benchmarks.compare baseline.json results.json
+"""
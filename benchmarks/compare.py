@@ -0,0 +1,74 @@
+"""
+Compares two benchmark result files, and flags the workloads that got slower.
+
+    python -m benchmarks.compare [-t THRESHOLD] baseline.json results.json
+
+The exit status is 1 if any workload regressed by more than the threshold.
+"""
+
+import sys
+import json
+import argparse
+
+def compare(baseline, current, threshold=0.1, stat='min'):
+    """
+    Compare two sets of benchmark results.
+
+    :param baseline:    The baseline results, as written by benchmarks.run.
+    :param current:     The new results.
+    :param threshold:   The relative slowdown above which a workload is flagged, e.g. 0.1 for 10%.
+    :param stat:        The statistic to compare.
+    :return:            A list of (name, baseline time, current time, ratio, regressed) tuples. The times are None for
+                        workloads that only appear on one side.
+    """
+    base_results = baseline['results']
+    cur_results = current['results']
+
+    rows = [ ]
+    for name in sorted(set(base_results) | set(cur_results)):
+        if name not in base_results or name not in cur_results:
+            rows.append((name,
+                         base_results[name][stat] if name in base_results else None,
+                         cur_results[name][stat] if name in cur_results else None,
+                         None,
+                         False))
+            continue
+
+        b = base_results[name][stat]
+        c = cur_results[name][stat]
+        ratio = c / b if b else float('inf')
+        rows.append((name, b, c, ratio, ratio > 1 + threshold))
+
+    return rows
+
+def _fmt(t):
+    return '-' if t is None else '%.6f' % t
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare simuvex benchmark results against a baseline.")
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('-t', '--threshold', type=float, default=0.1,
+                        help="the relative slowdown that counts as a regression (default: 0.1)")
+    parser.add_argument('-s', '--stat', default='min', choices=('min', 'median', 'max'),
+                        help="the statistic to compare (default: min)")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    rows = compare(baseline, current, threshold=args.threshold, stat=args.stat)
+
+    width = max([ len(r[0]) for r in rows ] + [ len('workload') ])
+    print '%-*s %12s %12s %8s' % (width, 'workload', 'baseline', 'current', 'ratio')
+    for name, b, c, ratio, regressed in rows:
+        print '%-*s %12s %12s %8s%s' % (width, name, _fmt(b), _fmt(c),
+                                        '-' if ratio is None else '%.3f' % ratio,
+                                        '  REGRESSION' if regressed else '')
+
+    return 1 if any(r[4] for r in rows) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+Runs the benchmark workloads and writes their timings out as JSON.
+
+    python -m benchmarks.run [-o results.json] [-r REPEAT] [-k SUBSTRING ...]
+"""
+
+import sys
+import json
+import time
+import timeit
+import logging
+import platform
+import argparse
+
+l = logging.getLogger("simuvex.benchmarks")
+
+def _median(values):
+    values = sorted(values)
+    mid = len(values) / 2
+    if len(values) % 2:
+        return values[mid]
+    return (values[mid - 1] + values[mid]) / 2.0
+
+def time_workload(setup, repeat):
+    """
+    Time a workload.
+
+    :param setup:   The workload function. It returns the callable to time.
+    :param repeat:  How many times to set up and time the workload.
+    :return:        A dict of timing statistics, in seconds.
+    """
+    timings = [ ]
+    for _ in xrange(repeat):
+        run = setup()
+        start = timeit.default_timer()
+        run()
+        timings.append(timeit.default_timer() - start)
+
+    return {
+        'min': min(timings),
+        'median': _median(timings),
+        'max': max(timings),
+        'repeat': repeat,
+    }
+
+def run_benchmarks(names=None, repeat=5):
+    """
+    Run the benchmark workloads.
+
+    :param names:   Substrings to select workloads by name. All workloads are run if it is empty or None.
+    :param repeat:  How many times each workload is timed.
+    :return:        A dict that is ready to be dumped as JSON.
+    """
+    from .workloads import WORKLOADS
+    import simuvex
+
+    results = { }
+    for name in sorted(WORKLOADS):
+        if names and not any(n in name for n in names):
+            continue
+
+        l.info("Running %s", name)
+        results[name] = time_workload(WORKLOADS[name], repeat)
+        l.info("... %.6fs (min), %.6fs (median)", results[name]['min'], results[name]['median'])
+
+    return {
+        'meta': {
+            'timestamp': time.time(),
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'simuvex': getattr(simuvex, '__version__', None),
+        },
+        'results': results,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the simuvex benchmarks.")
+    parser.add_argument('-o', '--output', help="the JSON file to write the results to (default: stdout)")
+    parser.add_argument('-r', '--repeat', type=int, default=5, help="how many times each workload is timed")
+    parser.add_argument('-k', '--keyword', action='append', default=[ ],
+                        help="only run the workloads whose name contains this substring (can be repeated)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig()
+    l.setLevel(logging.INFO)
+
+    results = run_benchmarks(names=args.keyword, repeat=args.repeat)
+
+    if args.output is None:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+    main()
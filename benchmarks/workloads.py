@@ -0,0 +1,207 @@
+"""
+The benchmark workloads.
+
+A workload is a function that takes no arguments, builds whatever it needs and returns a callable that performs the
+timed work. Only the returned callable is timed, and a workload is set up again before every repetition, so the
+callable is free to mutate what it was given.
+"""
+
+import pyvex
+
+from simuvex import SimState, SimIRSB, SimProcedures
+from simuvex.s_snapshot import dump_states, load_states
+
+WORKLOADS = { }
+
+def workload(name):
+    def decorator(f):
+        WORKLOADS[name] = f
+        return f
+    return decorator
+
+# mov rax, rdi; add rax, rsi; imul rax, rdx; xor rcx, rcx; mov [rsp+8], rax; mov rbx, [rsp+8]; add rbx, rcx; ret
+AMD64_BLOCK = '\x48\x89\xf8\x48\x01\xf0\x48\x0f\xaf\xc2\x48\x31\xc9\x48\x89\x44\x24\x08\x48\x8b\x5c\x24\x08' \
+              '\x48\x01\xcb\xc3'
+
+def _state():
+    return SimState(arch='AMD64', mode='symbolic')
+
+#
+# Memory
+#
+
+@workload('memory.store_load.concrete')
+def memory_store_load_concrete():
+    s = _state()
+    values = [ s.se.BVV(i * 0x01010101, 32) for i in xrange(256) ]
+
+    def run():
+        for i, v in enumerate(values):
+            s.memory.store(0x1000 + i * 4, v)
+        for i in xrange(len(values)):
+            s.memory.load(0x1000 + i * 4, 4)
+
+    return run
+
+@workload('memory.store_load.symbolic')
+def memory_store_load_symbolic():
+    s = _state()
+    values = [ s.se.BVS('v_%d' % i, 32) for i in xrange(256) ]
+
+    def run():
+        for i, v in enumerate(values):
+            s.memory.store(0x1000 + i * 4, v)
+        for i in xrange(len(values)):
+            s.memory.load(0x1000 + i * 2, 4)
+
+    return run
+
+@workload('memory.concretize_addr')
+def memory_concretize_addr():
+    s = _state()
+    addr = s.se.BVS('addr', 64)
+    s.add_constraints(addr >= 0x1000, addr < 0x1100)
+    addrs = [ addr + i for i in xrange(32) ]
+
+    def run():
+        for a in addrs:
+            s.memory.concretize_write_addr(a)
+            s.memory.concretize_read_addr(a)
+
+    return run
+
+#
+# States
+#
+
+@workload('state.copy.chain')
+def state_copy_chain():
+    s = _state()
+    for i in xrange(64):
+        s.memory.store(0x1000 + i * 8, s.se.BVV(i, 64))
+    s.regs.rax = s.se.BVS('rax', 64)
+
+    def run():
+        c = s
+        for i in xrange(100):
+            c = c.copy()
+            c.memory.store(0x2000 + i * 8, s.se.BVV(i, 64))
+            c.regs.rbx = i
+
+    return run
+
+@workload('state.merge.8')
+def state_merge():
+    base = _state()
+    for i in xrange(16):
+        base.memory.store(0x1000 + i * 8, base.se.BVV(i, 64))
+
+    others = [ ]
+    for i in xrange(8):
+        c = base.copy()
+        c.memory.store(0x1000, c.se.BVV(0x100 + i, 64))
+        c.regs.rax = i
+        others.append(c)
+
+    def run():
+        others[0].merge(*others[1:])
+
+    return run
+
+def _snapshot_states():
+    base = _state()
+    for i in xrange(64):
+        base.memory.store(0x1000 + i * 8, base.se.BVS('m_%d' % i, 64))
+    base.regs.rax = base.se.BVS('rax', 64)
+
+    states = [ ]
+    for i in xrange(16):
+        c = base.copy()
+        c.memory.store(0x8000 + i * 8, c.regs.rax + i)
+        c.add_constraints(c.regs.rax != i)
+        states.append(c)
+    return states
+
+@workload('snapshot.encode.16')
+def snapshot_encode():
+    states = _snapshot_states()
+
+    def run():
+        dump_states(states)
+
+    return run
+
+@workload('snapshot.decode.16')
+def snapshot_decode():
+    data = dump_states(_snapshot_states())
+
+    def run():
+        load_states(data)
+
+    return run
+
+#
+# IRSB execution
+#
+
+@workload('irsb.amd64')
+def irsb_amd64():
+    states = [ ]
+    for _ in xrange(20):
+        s = _state()
+        s.regs.rsp = 0x7fff0000
+        s.regs.rdi = s.se.BVS('rdi', 64)
+        s.regs.rsi = 10
+        s.regs.rdx = 3
+        states.append(s)
+    irsb = pyvex.IRSB(AMD64_BLOCK, 0x400000, states[0].arch)
+
+    def run():
+        for s in states:
+            SimIRSB(s, irsb).flat_successors
+
+    return run
+
+#
+# SimProcedures
+#
+
+def _string_state(n):
+    s = _state()
+    s.memory.store(0x1000, s.se.BVV(('A' * (n - 1)) + '\x00'), endness='Iend_BE')
+    s.memory.store(0x2000, s.se.BVV(('A' * (n - 1)) + '\x00'), endness='Iend_BE')
+    return s
+
+@workload('procedure.strlen')
+def procedure_strlen():
+    strlen = SimProcedures['libc.so.6']['strlen']
+    s = _string_state(64)
+
+    def run():
+        for _ in xrange(10):
+            strlen(s, inline=True, arguments=[s.se.BVV(0x1000, 64)])
+
+    return run
+
+@workload('procedure.memcpy')
+def procedure_memcpy():
+    memcpy = SimProcedures['libc.so.6']['memcpy']
+    s = _string_state(256)
+
+    def run():
+        for i in xrange(10):
+            memcpy(s, inline=True, arguments=[s.se.BVV(0x3000 + i * 0x100, 64), s.se.BVV(0x1000, 64),
+                                              s.se.BVV(256, 64)])
+
+    return run
+
+@workload('procedure.strcmp')
+def procedure_strcmp():
+    strcmp = SimProcedures['libc.so.6']['strcmp']
+    s = _string_state(64)
+
+    def run():
+        for _ in xrange(10):
+            strcmp(s, inline=True, arguments=[s.se.BVV(0x1000, 64), s.se.BVV(0x2000, 64)])
+
+    return run
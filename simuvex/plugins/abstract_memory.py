@@ -17,7 +17,7 @@ READ_TARGETS_LIMIT = 4096
 invalid_read_ctr = count()
 
 class MemoryRegion(object):
-    def __init__(self, id, state, is_stack=False, related_function_addr=None, init_memory=True, backer_dict=None, endness=None): #pylint:disable=redefined-builtin,unused-argument
+    def __init__(self, id, state, is_stack=False, related_function_addr=None, init_memory=True, backer_dict=None, endness=None, merge_token=None): #pylint:disable=redefined-builtin,unused-argument
         self._endness = endness
         self._id = id
         self._state = state
@@ -27,6 +27,10 @@ class MemoryRegion(object):
         # AbstractLocation objects
         self._alocs = { }
 
+        # Copies of a region share its merge token until the next merge or widening. Two regions with the same token
+        # that have not been written to since they got it hold the same content, so there is nothing to merge.
+        self._merge_token = object() if merge_token is None else merge_token
+
         if init_memory:
             if backer_dict is None:
                 self._memory = SimSymbolicMemory(memory_id=id, endness=self._endness, abstract_backer=True)
@@ -59,6 +63,20 @@ class MemoryRegion(object):
     def related_function_addr(self):
         return self._related_function_addr
 
+    @property
+    def dirty(self):
+        """
+        Whether this region has been written to since its last merge point.
+        """
+        return self._memory.mem.dirty
+
+    def _unchanged_since_join(self, other):
+        return self._merge_token is other._merge_token and not self.dirty and not other.dirty
+
+    def _new_merge_point(self):
+        self._merge_token = object()
+        self._memory.mem.clear_dirty()
+
     def get_abstract_locations(self, addr, size):
         """
         Get a list of abstract locations that is within the range of [addr, addr + size]
@@ -91,7 +109,7 @@ class MemoryRegion(object):
         r = MemoryRegion(self._id, self.state,
                          is_stack=self._is_stack,
                          related_function_addr=self._related_function_addr,
-                         init_memory=False, endness=self._endness)
+                         init_memory=False, endness=self._endness, merge_token=self._merge_token)
         r._memory = self.memory.copy()
         r._alocs = copy.deepcopy(self._alocs)
         return r
@@ -125,6 +143,10 @@ class MemoryRegion(object):
     def merge(self, others, merge_flag, flag_values):
         merging_occurred = False
 
+        others = [ o for o in others if not self._unchanged_since_join(o) ]
+        if not others:
+            return False
+
         for other_region in others:
             # Merge alocs
             for aloc_id, aloc in other_region.alocs.iteritems():
@@ -140,11 +162,16 @@ class MemoryRegion(object):
 
             merging_occurred |= merging_result
 
+        self._new_merge_point()
         return merging_occurred
 
     def widen(self, others, merge_flag, flag_values):
         widening_occurred = False
 
+        others = [ o for o in others if not self._unchanged_since_join(o) ]
+        if not others:
+            return False
+
         for other_region in others:
             for aloc_id, aloc in other_region.alocs.iteritems():
                 if aloc_id not in self.alocs:
@@ -158,6 +185,7 @@ class MemoryRegion(object):
 
             widening_occurred |= widening_result
 
+        self._new_merge_point()
         return widening_occurred
 
     def __contains__(self, addr):
@@ -514,40 +542,47 @@ class SimAbstractMemory(SimMemory): #pylint:disable=abstract-method
         am._stack_size = self._stack_size
         return am
 
-    def merge(self, others, merge_flag, flag_values):
+    def _region_merge_jobs(self, others):
         """
-        Merge this guy with another SimAbstractMemory instance
-        :param others:
-        :param merge_flag:
-        :param flag_values:
-        :return:
+        Adopts the regions that only exist in `others`, and groups the remaining ones by region ID.
+
+        :return: A tuple of (whether any region was adopted, a list of (our region, [their regions]) tuples).
         """
-        merging_occurred = False
+        adopted = False
+        jobs = { }
 
         for o in others:
-            for region_id, region in o._regions.items():
+            for region_id, region in o._regions.iteritems():
                 if region_id in self._regions:
-                    merging_occurred |= self._regions[region_id].merge([region], merge_flag, flag_values)
+                    jobs.setdefault(region_id, (self._regions[region_id], [ ]))[1].append(region)
                 else:
-                    merging_occurred = True
+                    adopted = True
                     self._regions[region_id] = region
 
+        return adopted, jobs.values()
+
+    def merge(self, others, merge_flag, flag_values):
+        """
+        Merge this guy with another SimAbstractMemory instance. Regions that have not been touched on any side since
+        the last merge point are skipped.
+
+        :param others:
+        :param merge_flag:
+        :param flag_values:
+        :return:
+        """
+        merging_occurred, jobs = self._region_merge_jobs(others)
+        results = [ region.merge(theirs, merge_flag, flag_values) for region, theirs in jobs ]
+
         # We have no constraints to return!
-        return merging_occurred, []
+        return merging_occurred or any(results), []
 
     def widen(self, others, merge_flag, flag_values):
 
-        widening_occurred = False
-
-        for o in others:
-            for region_id, region in o._regions.items():
-                if region_id in self._regions:
-                    widening_occurred |= self._regions[region_id].widen([ region ], merge_flag, flag_values)
-                else:
-                    widening_occurred = True
-                    self._regions[region_id] = region
+        widening_occurred, jobs = self._region_merge_jobs(others)
+        results = [ region.widen(theirs, merge_flag, flag_values) for region, theirs in jobs ]
 
-        return widening_occurred, [ ]
+        return widening_occurred or any(results), [ ]
 
     def __contains__(self, dst):
         if type(dst) in (int, long):
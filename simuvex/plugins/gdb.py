@@ -1,5 +1,7 @@
 import os
 import re
+import mmap
+import struct
 from .plugin import SimStatePlugin
 from ..s_errors import SimStateError
 import libc as libc
@@ -9,6 +11,21 @@ import binascii
 
 l = logging.getLogger('simuvex.plugins.gdb')
 
+# ELF core files
+_ET_CORE = 4
+_PT_LOAD = 1
+_PT_NOTE = 4
+_NT_PRSTATUS = 1
+
+# where the general purpose registers are in the NT_PRSTATUS notes (struct elf_prstatus), and their order
+# (struct user_regs_struct). The registers that are None are not set.
+_PRSTATUS_REGS = {
+    'AMD64': (112, 8, ['r15', 'r14', 'r13', 'r12', 'rbp', 'rbx', 'r11', 'r10', 'r9', 'r8', 'rax', 'rcx', 'rdx',
+                       'rsi', 'rdi', None, 'rip', None, None, 'rsp', None, 'fs', 'gs', None, None, None, None]),
+    'X86': (72, 4, ['ebx', 'ecx', 'edx', 'esi', 'edi', 'ebp', 'eax', 'ds', 'es', 'fs', 'gs', None, 'eip', 'cs',
+                    None, 'esp', 'ss']),
+}
+
 #global heap_location
 
 class GDB(SimStatePlugin):
@@ -16,6 +33,8 @@ class GDB(SimStatePlugin):
     Initialize or update a state from gdb dumps of the stack, heap, registers and data (or arbitrary) segments.
     """
 
+    STATELESS = True
+
     def __init__(self, omit_fp=False, adjust_stack=False):
         """
         :param omit_fp:         The frame pointer register is used for something else. (i.e. --omit_frame_pointer)
@@ -41,12 +60,12 @@ class GDB(SimStatePlugin):
         :param stack_dump:  The dump file.
         :param stack_top:   The address of the top of the stack in the gdb session.
         """
-        data = self._read_data(stack_dump)
+        size = self._dump_size(stack_dump)
         self.real_stack_top = stack_top
-        addr = stack_top - len(data) # Address of the bottom of the stack
+        addr = stack_top - size # Address of the bottom of the stack
         l.info("Setting stack from 0x%x up to 0x%x" % (addr, stack_top))
         #FIXME: we should probably make we don't overwrite other stuff loaded there
-        self._write(addr, data)
+        self._map(addr, stack_dump)
 
     def set_heap(self, heap_dump, heap_base):
         """
@@ -59,20 +78,80 @@ class GDB(SimStatePlugin):
         :param heap_base:   The start address of the heap in the gdb session.
         """
         # We set the heap at the same addresses as the gdb session to avoid pointer corruption.
-        data = self._read_data(heap_dump)
-        self.state.libc.heap_location = heap_base + len(data)
+        size = self._dump_size(heap_dump)
+        self.state.libc.heap_location = heap_base + size
         addr = heap_base
-        l.info("Set heap from 0x%x to 0x%x" % (addr, addr+len(data)))
+        l.info("Set heap from 0x%x to 0x%x" % (addr, addr+size))
         #FIXME: we should probably make we don't overwrite other stuff loaded there
-        self._write(addr, data)
+        self._map(addr, heap_dump)
 
     def set_data(self, addr, data_dump):
         """
         Update any data range (most likely use is the data segments of loaded objects)
         """
-        data = self._read_data(data_dump)
-        l.info("Set data from 0x%x to 0x%x" % (addr, addr+len(data)))
-        self._write(addr, data)
+        size = self._dump_size(data_dump)
+        l.info("Set data from 0x%x to 0x%x" % (addr, addr+size))
+        self._map(addr, data_dump)
+
+    def set_core(self, core_dump):
+        """
+        Initialize the memory and the registers from an ELF core file, i.e. the result of ``generate-core-file`` in
+        gdb. Every loaded segment is mapped, and the registers are set from the first thread. Like the other dumps, the
+        segments are only read when they are touched.
+
+        :param core_dump:   The core file.
+        """
+        if not os.path.exists(core_dump):
+            raise SimStateError("File does not exist")
+        with open(core_dump, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                raise SimStateError("%s is not an ELF file" % core_dump)
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            if len(data) < 64 or data[:4] != '\x7fELF':
+                raise SimStateError("%s is not an ELF file" % core_dump)
+
+            bits = { 1: 32, 2: 64 }.get(ord(data[4]), None)
+            endness = { 1: '<', 2: '>' }.get(ord(data[5]), None)
+            if bits is None or endness is None:
+                raise SimStateError("%s has an unsupported ELF class or data encoding" % core_dump)
+
+            e_type, = struct.unpack_from(endness + 'H', data, 16)
+            if bits == 64:
+                e_phoff, = struct.unpack_from(endness + 'Q', data, 32)
+                e_phentsize, e_phnum = struct.unpack_from(endness + 'HH', data, 54)
+            else:
+                e_phoff, = struct.unpack_from(endness + 'I', data, 28)
+                e_phentsize, e_phnum = struct.unpack_from(endness + 'HH', data, 42)
+            if e_type != _ET_CORE:
+                raise SimStateError("%s is not a core file" % core_dump)
+
+            prstatus = None
+            for i in xrange(e_phnum):
+                off = e_phoff + i*e_phentsize
+                if bits == 64:
+                    p_type, p_flags, p_offset, p_vaddr, _, p_filesz, p_memsz, _ = struct.unpack_from(endness + 'IIQQQQQQ', data, off)
+                else:
+                    p_type, p_offset, p_vaddr, _, p_filesz, p_memsz, p_flags, _ = struct.unpack_from(endness + 'IIIIIIII', data, off)
+
+                if p_type == _PT_LOAD:
+                    # PF_X, PF_W and PF_R are the other way around from the page permissions
+                    permissions = (p_flags & 1) << 2 | (p_flags & 2) | (p_flags & 4) >> 2
+                    l.info("Mapping core segment from 0x%x to 0x%x", p_vaddr, p_vaddr+p_memsz)
+                    if p_filesz:
+                        self._map(p_vaddr, core_dump, offset=p_offset, size=p_filesz, permissions=permissions)
+                    if p_memsz > p_filesz:
+                        self._map(p_vaddr+p_filesz, None, size=p_memsz-p_filesz, permissions=permissions)
+                elif p_type == _PT_NOTE and prstatus is None:
+                    prstatus = self._find_note(data[p_offset:p_offset+p_filesz], _NT_PRSTATUS, endness)
+        finally:
+            data.close()
+
+        if prstatus is None:
+            l.warning("%s has no NT_PRSTATUS note, the registers were not set", core_dump)
+        else:
+            self._set_prstatus_regs(prstatus, endness)
 
     def set_regs(self, regs_dump):
         """
@@ -117,16 +196,59 @@ class GDB(SimStatePlugin):
         if not self.omit_fp:
             self.state.registers.store(bp, self.state.regs.bp + stack_shift)
 
+    @staticmethod
+    def _find_note(notes, note_type, endness):
+        """
+        Returns the descriptor of the first note of a type, from the contents of a PT_NOTE segment.
+        """
+        off = 0
+        while off + 12 <= len(notes):
+            namesz, descsz, n_type = struct.unpack_from(endness + 'III', notes, off)
+            desc = off + 12 + ((namesz + 3) & ~3)
+            if n_type == note_type:
+                return notes[desc:desc+descsz]
+            off = desc + ((descsz + 3) & ~3)
+        return None
+
+    def _set_prstatus_regs(self, prstatus, endness):
+        try:
+            offset, size, names = _PRSTATUS_REGS[self.state.arch.name]
+        except KeyError:
+            l.warning("Reading the registers of %s core files is not supported", self.state.arch.name)
+            return
+
+        fmt = endness + ('Q' if size == 8 else 'I') * len(names)
+        for reg, val in zip(names, struct.unpack_from(fmt, prstatus, offset)):
+            if reg is None or reg not in self.state.arch.registers:
+                continue
+            bits = self.state.arch.registers[reg][1] * 8
+            self.state.registers.store(reg, claripy.BVV(val & ((1 << bits) - 1), bits))
+
     def _read_data(self, path):
         if not os.path.exists(path):
             raise SimStateError("File does not exist")
         f = open(path, "rb")
         return f.read()
 
+    def _dump_size(self, path): #pylint:disable=no-self-use
+        if not os.path.exists(path):
+            raise SimStateError("File does not exist")
+        return os.path.getsize(path)
+
+    def _map(self, addr, path, offset=0, size=None, permissions=None):
+        """
+        Map (part of) a dump to an address, or zeros if `path` is None. Symbolic memories read it lazily, the other
+        memories get it in one store.
+        """
+        source = SimPageSource(path, offset=offset, size=size)
+        if isinstance(self.state.memory, SimSymbolicMemory):
+            self.state.memory.map_source(addr, source, permissions=permissions)
+        else:
+            self._write(addr, source.read(0, source.size))
+
     def _write(self, addr, data):
-        for d in data:
-            self.state.memory.store(addr, d, size=1)
-            addr = addr + 1
+        if len(data):
+            self.state.memory.store(addr, claripy.BVV(data))
 
     def _to_bvv(self, data):
         sz = len(data)
@@ -137,3 +259,6 @@ class GDB(SimStatePlugin):
         return GDB()
 
 SimStatePlugin.register_default('gdb', GDB)
+
+from ..storage.page_source import SimPageSource
+from .symbolic_memory import SimSymbolicMemory
@@ -60,11 +60,17 @@ class SimStateLibc(SimStatePlugin):
                     0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00
                   ]
 
+    # the heap allocator hands out chunks of a few size classes, so that freed chunks can be handed out again
+    HEAP_MIN_CHUNK = 0x10
+    HEAP_PAGE_SIZE = 0x1000
+
     def __init__(self):
         SimStatePlugin.__init__(self)
 
         # various thresholds
         self.heap_location = heap_location
+        self.heap_chunks = { }  # address -> chunk size, for the allocated chunks
+        self.free_chunks = { }  # chunk size -> addresses of freed chunks of that size
         self.buf_symbolic_bytes = 60
         self.max_symbolic_strstr = 1
         self.max_symbolic_strchr = 16
@@ -94,6 +100,8 @@ class SimStateLibc(SimStatePlugin):
     def copy(self):
         c = SimStateLibc()
         c.heap_location = self.heap_location
+        c.heap_chunks = dict(self.heap_chunks)
+        c.free_chunks = { k:list(v) for k,v in self.free_chunks.iteritems() }
         c.buf_symbolic_bytes = self.buf_symbolic_bytes
         c.max_symbolic_strstr = self.max_symbolic_strstr
         c.max_symbolic_strchr = self.max_symbolic_strchr
@@ -110,6 +118,53 @@ class SimStateLibc(SimStatePlugin):
 
         return c
 
+    def _chunk_size(self, size):
+        """
+        Rounds an allocation size up to its size class: a power of two for allocations smaller than a page, and a
+        whole number of pages for the rest.
+        """
+        if size > self.HEAP_PAGE_SIZE / 2:
+            return (size + self.HEAP_PAGE_SIZE - 1) / self.HEAP_PAGE_SIZE * self.HEAP_PAGE_SIZE
+
+        chunk = self.HEAP_MIN_CHUNK
+        while chunk < size:
+            chunk <<= 1
+        return chunk
+
+    def allocate(self, size):
+        """
+        Allocates a chunk of heap memory, reusing a freed chunk of the same size class if there is one.
+
+        :param size:    The number of bytes to allocate.
+        :return:        The address of the chunk.
+        """
+        chunk = self._chunk_size(max(size, 1))
+
+        free = self.free_chunks.get(chunk)
+        if free:
+            addr = free.pop()
+            if len(free) == 0:
+                del self.free_chunks[chunk]
+        else:
+            align = self.HEAP_PAGE_SIZE if chunk >= self.HEAP_PAGE_SIZE else self.HEAP_MIN_CHUNK
+            addr = (self.heap_location + align - 1) / align * align
+            self.heap_location = addr + chunk
+
+        self.heap_chunks[addr] = chunk
+        return addr
+
+    def release(self, addr):
+        """
+        Frees a chunk that was handed out by allocate(), so that later allocations can reuse it.
+
+        :param addr:    The address of the chunk.
+        :return:        The size of the chunk, or None if `addr` is not an allocated chunk.
+        """
+        chunk = self.heap_chunks.pop(addr, None)
+        if chunk is not None:
+            self.free_chunks.setdefault(chunk, [ ]).append(addr)
+        return chunk
+
     def merge(self, others, merge_flag, flag_values):
         merging_occured = False
 
@@ -118,6 +173,25 @@ class SimStateLibc(SimStatePlugin):
             self.heap_location = new_heap_location
             merging_occured = True
 
+        # a chunk is allocated if it is allocated on any path, and it can only be reused if it is free on all of them
+        for o in others:
+            for addr, chunk in o.heap_chunks.iteritems():
+                if addr not in self.heap_chunks:
+                    self.heap_chunks[addr] = chunk
+                    merging_occured = True
+
+        free_chunks = { }
+        for chunk, addrs in self.free_chunks.iteritems():
+            common = set(addrs)
+            for o in others:
+                common &= set(o.free_chunks.get(chunk, ( )))
+            common -= set(self.heap_chunks)
+            if len(common) != len(addrs):
+                merging_occured = True
+            if common:
+                free_chunks[chunk] = sorted(common)
+        self.free_chunks = free_chunks
+
         return merging_occured, [ ]
 
     def widen(self, others, merge_flag, flag_values):
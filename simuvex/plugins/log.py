@@ -46,6 +46,12 @@ class SimStateLog(SimStatePlugin):
     def actions_of_type(self, action_type):
         return [ action for action in self.actions if action.type == action_type ]
 
+    def footprint(self, seen):
+        # the events are shared with the logs that this one was copied from
+        new_events = [ e for e in self.events if id(e) not in seen ]
+        seen.update(id(e) for e in new_events)
+        return { 'events': len(new_events) }
+
     def copy(self):
         return SimStateLog(log=self)
 
@@ -8,6 +8,10 @@ default_plugins = { }
 class SimStatePlugin(ana.Storable):
     #__slots__ = [ 'state' ]
 
+    # Plugins that keep no per-state data (views, for instance) set this. They are not carried over to copies of a state,
+    # which create a fresh one when it is first used.
+    STATELESS = False
+
     def __init__(self):
         self.state = None
 
@@ -40,6 +44,14 @@ class SimStatePlugin(ana.Storable):
 
         raise Exception('widen() not implemented for %s', self.__class__.__name__)
 
+    def footprint(self, seen): #pylint:disable=unused-argument,no-self-use
+        """
+        Should return a dict of counters describing the memory held by the plugin. Objects whose ids are in `seen` were
+        already accounted for (as part of another state) and should not be counted again, and the ids of the objects
+        that are counted should be added to it.
+        """
+        return { }
+
     @staticmethod
     def register_default(name, cls):
         if name in default_plugins:
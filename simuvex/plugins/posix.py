@@ -1,4 +1,4 @@
-from collections import namedtuple
+from collections import namedtuple, Counter
 
 from .plugin import SimStatePlugin
 from ..storage.file import SimFile
@@ -15,6 +15,90 @@ Stat = namedtuple('Stat', ('st_dev', 'st_ino', 'st_nlink', 'st_mode', 'st_uid',
                            'st_blocks', 'st_atime', 'st_atimensec', 'st_mtime',
                            'st_mtimensec', 'st_ctime', 'st_ctimensec'))
 
+class SimFileTable(dict):
+    """
+    The open files of a state, by file descriptor. After a copy, the files are shared with the copy, and each side
+    copies a file only when it first looks it up.
+    """
+
+    # a class-level default, so that items can be set before unpickling restores the instance attributes
+    _shared = frozenset()
+
+    def __init__(self, files=None, shared=None, sockets=None):
+        super(SimFileTable, self).__init__()
+        self._shared = set() if shared is None else shared
+        self._sockets = { } if sockets is None else sockets
+        self.state = None
+        if files is not None:
+            dict.update(self, files)
+
+    def __reduce__(self):
+        return (SimFileTable, (dict(dict.items(self)), set(self._shared), self._sockets), { 'state': self.state })
+
+    def __getitem__(self, fd):
+        f = dict.__getitem__(self, fd)
+        if fd in self._shared:
+            self._shared.discard(fd)
+            f = f.copy()
+            if self.state is not None:
+                f.set_state(self.state)
+            dict.__setitem__(self, fd, f)
+            if fd in self._sockets:
+                self._sockets[fd] = f
+        return f
+
+    def __setitem__(self, fd, f):
+        if fd in self._shared:
+            self._shared.discard(fd)
+        dict.__setitem__(self, fd, f)
+
+    def __delitem__(self, fd):
+        self._shared.discard(fd)
+        dict.__delitem__(self, fd)
+
+    def get(self, fd, default=None):
+        return self[fd] if fd in self else default
+
+    def pop(self, fd, *args):
+        if fd in self:
+            f = self[fd]
+            del self[fd]
+            return f
+        return dict.pop(self, fd, *args)
+
+    def itervalues(self):
+        for fd in self.keys():
+            yield self[fd]
+
+    def iteritems(self):
+        for fd in self.keys():
+            yield fd, self[fd]
+
+    def values(self):
+        return list(self.itervalues())
+
+    def items(self):
+        return list(self.iteritems())
+
+    def set_state(self, state):
+        """
+        Binds the files that are our own to `state`. Shared files get bound when they are copied.
+        """
+        self.state = state
+        for fd, f in dict.items(self):
+            if fd not in self._shared:
+                f.set_state(state)
+
+    def fork(self, sockets):
+        """
+        Shares all the files with a new table. Both tables copy a file the first time they look it up.
+
+        :param sockets: The socket dict of the new table's owner.
+        :return:        The new table.
+        """
+        self._shared = set(self.keys())
+        return SimFileTable(dict(dict.items(self)), set(self._shared), sockets)
+
 class SimStateSystem(SimStatePlugin):
     #__slots__ = [ 'maximum_symbolic_syscalls', 'files', 'max_length' ]
 
@@ -69,8 +153,8 @@ class SimStateSystem(SimStatePlugin):
         self.maximum_symbolic_syscalls = 255
         self.max_length = 2 ** 16
 
-        self.files = { } if files is None else files
         self.sockets = {} if sockets is None else sockets
+        self.files = files if isinstance(files, SimFileTable) else SimFileTable(files, sockets=self.sockets)
         self.pcap = None if pcap_backer is None else pcap_backer
         self.pflag = 0 if self.pcap is None else 1
         self.fs = {} if fs is None else fs
@@ -117,12 +201,7 @@ class SimStateSystem(SimStatePlugin):
     def set_state(self, state):
         SimStatePlugin.set_state(self, state)
         l.debug("%s setting state to %s", self, state)
-        for fd, f in self.files.iteritems():
-            l.debug("... file %s with fd %s", f, fd)
-            f.set_state(state)
-
-            if self.state is not f.state:
-                raise SimError("states somehow differ")
+        self.files.set_state(state)
 
     def open(self, name, mode, preferred_fd=None):
         """
@@ -169,7 +248,7 @@ class SimStateSystem(SimStatePlugin):
                     return -1
                 cbvv = self.state.se.BVV(content)
                 backing.store(0, cbvv)
-                f = SimFile(name, mode, content=backing, size=len(content))
+                f = SimFile(name, mode, content=backing, size=len(content), extent=(0, len(content)) if content else None)
             else:
                 f = SimFile(name, mode)
         else:
@@ -290,7 +369,8 @@ class SimStateSystem(SimStatePlugin):
 
     def filename_to_fd(self, name):
         # TODO: replace with something better
-        for fd, f in self.files.items():
+        # only the names are needed, so the files are looked at without copying the shared ones
+        for fd, f in dict.items(self.files):
             if f.name == name:
                 return fd
 
@@ -337,14 +417,23 @@ class SimStateSystem(SimStatePlugin):
         )
 
 
+    def footprint(self, seen):
+        # the files are looked at without copying the shared ones
+        report = Counter(files=0)
+        for f in dict.values(self.files):
+            if id(f) in seen:
+                continue
+            seen.add(id(f))
+            report['files'] += 1
+            report.update(f.content.footprint(seen))
+        return dict(report)
+
     def copy(self):
-        sockets = {}
-        files = { fd:f.copy() for fd,f in self.files.iteritems() }
-        for f in self.files:
-            if f in self.sockets:
-                sockets[f] = files[f]
+        # the files are copied lazily, by whichever state touches them first
+        sockets = { fd:dict.__getitem__(self.files, fd) for fd in self.files if fd in self.sockets }
+        files = self.files.fork(sockets)
 
-        return SimStateSystem(initialize=False, files=files, concrete_fs=self.concrete_fs, chroot=self.chroot, sockets=sockets, pcap_backer=self.pcap, argv=self.argv, argc=self.argc, environ=self.environ, auxv=self.auxv, tls_modules=self.tls_modules, fs=self.fs, queued_syscall_returns=list(self.queued_syscall_returns), sigmask=self._sigmask, pid=self.pid)
+        return SimStateSystem(initialize=False, files=files, concrete_fs=self.concrete_fs, chroot=self.chroot, sockets=sockets, pcap_backer=None if self.pcap is None else self.pcap.copy(), argv=self.argv, argc=self.argc, environ=self.environ, auxv=self.auxv, tls_modules=self.tls_modules, fs=self.fs, queued_syscall_returns=list(self.queued_syscall_returns), sigmask=self._sigmask, pid=self.pid)
 
     def merge(self, others, merge_flag, flag_values):
         all_files = set.union(*(set(o.files.keys()) for o in [ self ] + others))
@@ -369,7 +458,11 @@ class SimStateSystem(SimStatePlugin):
         :return:    The concrete content.
         :rtype:     str
         """
-        return self.state.se.any_str(self.get_file(fd).all_bytes())
+        f = self.get_file(fd)
+        data = f.concrete_bytes()
+        if data is not None:
+            return data
+        return self.state.se.any_str(f.all_bytes())
 
     def dump(self, fd, filename):
         """
@@ -422,4 +515,4 @@ class SimStateSystem(SimStatePlugin):
 SimStatePlugin.register_default('posix', SimStateSystem)
 
 from ..plugins.symbolic_memory import SimSymbolicMemory
-from ..s_errors import SimPosixError, SimError
+from ..s_errors import SimPosixError
@@ -23,8 +23,9 @@ class SimStateScratch(SimStatePlugin):
         self.source = None
         self.exit_stmt_idx = None
 
-        # information on VEX temps of this IRSB
-        self.temps = { }
+        # information on VEX temps of this IRSB, indexed by temp number. SimIRSB sizes the list from the type
+        # environment of the block, and temps are dead once the block ends, so copies start without them.
+        self.temps = [ ]
 
         # variable analysis of this block
         self.input_variables = SimVariableSet()
@@ -32,7 +33,6 @@ class SimStateScratch(SimStatePlugin):
         self.ignored_variables = None
 
         if scratch is not None:
-            self.temps.update(scratch.temps)
             self.jumpkind = scratch.jumpkind
             self.guard = scratch.guard
             self.target = scratch.target
@@ -58,11 +58,34 @@ class SimStateScratch(SimStatePlugin):
         :param simplify: simplify the tmp before returning it
         :returns: a Claripy expression of the tmp
         """
-        self.state._inspect('tmp_read', BP_BEFORE, tmp_read_num=tmp)
-        v = self.temps[tmp]
-        self.state._inspect('tmp_read', BP_AFTER, tmp_read_expr=v)
+        inspect = self._breakpoints_armed('tmp_read')
+        if inspect:
+            self.state._inspect('tmp_read', BP_BEFORE, tmp_read_num=tmp)
+
+        v = self.temps[tmp] if tmp < len(self.temps) else None
+        if v is None:
+            raise KeyError(tmp)
+
+        if inspect:
+            self.state._inspect('tmp_read', BP_AFTER, tmp_read_expr=v)
         return v
 
+    def has_tmp(self, tmp):
+        """
+        Checks whether a VEX temp has been written in the current block.
+
+        :param tmp: the number of the tmp
+        """
+        return tmp < len(self.temps) and self.temps[tmp] is not None
+
+    def prepare_temps(self, count):
+        """
+        Gets the temps ready for a new block, dropping the ones of the previous block.
+
+        :param count: the number of temps in the block
+        """
+        self.temps = [ None ] * count
+
     def store_tmp(self, tmp, content):
         """
         Stores a Claripy expression in a VEX temp value.
@@ -70,9 +93,14 @@ class SimStateScratch(SimStatePlugin):
         :param tmp: the number of the tmp
         :param content: a Claripy expression of the content
         """
-        self.state._inspect('tmp_write', BP_BEFORE, tmp_write_num=tmp, tmp_write_expr=content)
-        tmp = self.state._inspect_getattr('tmp_write_num', tmp)
-        content = self.state._inspect_getattr('tmp_write_expr', content)
+        inspect = self._breakpoints_armed('tmp_write')
+        if inspect:
+            self.state._inspect('tmp_write', BP_BEFORE, tmp_write_num=tmp, tmp_write_expr=content)
+            tmp = self.state._inspect_getattr('tmp_write_num', tmp)
+            content = self.state._inspect_getattr('tmp_write_expr', content)
+
+        if tmp >= len(self.temps):
+            self.temps.extend([ None ] * (tmp + 1 - len(self.temps)))
 
         if o.SYMBOLIC_TEMPS not in self.state.options:
             # Non-symbolic
@@ -81,7 +109,15 @@ class SimStateScratch(SimStatePlugin):
             # Symbolic
             self.state.add_constraints(self.temps[tmp] == content)
 
-        self.state._inspect('tmp_write', BP_AFTER)
+        if inspect:
+            self.state._inspect('tmp_write', BP_AFTER)
+
+    def _breakpoints_armed(self, event_type):
+        """
+        Checks whether there are any breakpoints for `event_type`, so that temp accesses can skip the inspector
+        otherwise.
+        """
+        return 'inspector' in self.state.plugins and len(self.state.inspect._breakpoints[event_type]) > 0
 
 
     def copy(self):
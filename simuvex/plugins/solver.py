@@ -74,9 +74,30 @@ break_time = float(os.environ.get('SOLVER_BREAK_TIME', -1))
 def auto_actions(f):
     @functools.wraps(f)
     def autoed_f(self, *args, **kwargs):
-        return ast_stripping_op(f, self, *args, **kwargs)
+        if s_profiler.profiler is not None:
+            p = s_profiler.profiler
+            p.start('solver', f.__name__)
+            try:
+                return ast_stripping_op(f, self, *args, **kwargs)
+            finally:
+                p.stop(site=s_profiler.call_site(self.state))
+        if _timing_enabled:
+            return ast_stripping_op(f, self, *args, **kwargs)
+        return _actual_ast_stripping_op(f, self, *args, **kwargs)
     return autoed_f
 
+def passthrough(f, name):
+    """
+    Wraps a claripy operation into a SimSolver method.
+    """
+    def passthrough_f(self, *args, **kwargs):
+        if _timing_enabled:
+            return ast_stripping_op(f, *args, the_solver=self, **kwargs)
+        return _actual_ast_stripping_op(f, *args, **kwargs)
+    passthrough_f.__name__ = name
+    passthrough_f.__doc__ = f.__doc__
+    return passthrough_f
+
 def error_converter(f):
     @functools.wraps(f)
     def wrapped_f(self, *args, **kwargs):
@@ -177,12 +198,13 @@ class SimSolver(SimStatePlugin):
     # Operation passthroughs to claripy
     #
 
+    # the claripy operations are installed as methods when this module is imported, so this is only reached for
+    # anything that was added to claripy later on
     def __getattr__(self, a):
         f = getattr(claripy._all_operations, a)
         if hasattr(f, '__call__'):
-            ff = functools.partial(ast_stripping_op, f, the_solver=self)
-            ff.__doc__ = f.__doc__
-            return ff
+            setattr(SimSolver, a, passthrough(f, a))
+            return getattr(self, a)
         else:
             return f
 
@@ -220,6 +242,13 @@ class SimSolver(SimStatePlugin):
     def constraints(self):
         return self._solver.constraints
 
+    def footprint(self, seen):
+        constraints = [ ] if self._stored_solver is None else self._stored_solver.constraints
+        return {
+            'constraints': len(constraints),
+            'ast_nodes': count_ast_nodes(constraints, seen),
+        }
+
     def _adjust_constraint(self, c):
         if self.state._global_condition is None:
             return c
@@ -427,6 +456,15 @@ class SimSolver(SimStatePlugin):
         return e.variables
 
 SimStatePlugin.register_default('solver_engine', SimSolver)
+
+for _name in dir(claripy._all_operations):
+    if not _name.startswith('_') and not hasattr(SimSolver, _name) and \
+       hasattr(getattr(claripy._all_operations, _name), '__call__'):
+        setattr(SimSolver, _name, passthrough(getattr(claripy._all_operations, _name), _name))
+del _name
+
 from .. import s_options as o
+from .. import s_profiler
+from ..s_footprint import count_ast_nodes
 from .inspect import BP_AFTER
 from ..s_errors import SimValueError, SimUnsatError, SimSolverModeError
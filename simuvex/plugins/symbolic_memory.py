@@ -8,7 +8,7 @@ l = logging.getLogger("simuvex.plugins.symbolic_memory")
 import claripy
 from ..storage.memory import SimMemory
 from ..storage.paged_memory import SimPagedMemory
-from ..storage.memory_object import SimMemoryObject
+from ..storage.memory_object import SimMemoryObject, SimRepeatedMemoryObject
 
 DEFAULT_MAX_SEARCH = 8
 
@@ -37,6 +37,22 @@ class SimSymbolicMemory(SimMemory): #pylint:disable=abstract-method
     # Lifecycle management
     #
 
+    def footprint(self, seen):
+        return self.mem.footprint(seen)
+
+    def intern_pages(self):
+        """
+        Deduplicate the pages this memory wrote to against the pages of other states. See
+        SimPagedMemory.intern_pages().
+        """
+        return self.mem.intern_pages()
+
+    def map_source(self, addr, source, permissions=None):
+        """
+        Map a SimPageSource to an address, to be read lazily. See SimPagedMemory.map_source().
+        """
+        self.mem.map_source(addr, source, permissions=permissions)
+
     def copy(self):
         """
         Return a copy of the SimMemory.
@@ -72,28 +88,8 @@ class SimSymbolicMemory(SimMemory): #pylint:disable=abstract-method
             changed_bytes |= self.changed_bytes(o)
 
         if options.FRESHNESS_ANALYSIS in self.state.options and self.state.scratch.ignored_variables is not None:
-            ignored_var_changed_bytes = set()
-
-            if self.category == 'reg':
-                fresh_vars = self.state.scratch.ignored_variables.register_variables
-
-                for v in fresh_vars:
-                    offset, size = v.reg, v.size
-                    ignored_var_changed_bytes |= set(xrange(offset, offset + size))
-
-            else:
-                fresh_vars = self.state.scratch.ignored_variables.memory_variables
-
-                for v in fresh_vars:
-                    # v.addr is an AddressWrapper object
-                    region_id = v.addr.region
-                    offset = v.addr.address
-                    size = v.size
-
-                    if region_id == self.id:
-                        ignored_var_changed_bytes |= set(range(offset, offset + size))
-
-            changed_bytes = changed_bytes - ignored_var_changed_bytes
+            fresh_bytes = self._fresh_bytes()
+            changed_bytes = { b for b in changed_bytes if b not in fresh_bytes }
 
         l.info("Merging %d bytes", len(changed_bytes))
         l.info("... %s has changed bytes %s", self.id, changed_bytes)
@@ -121,28 +117,8 @@ class SimSymbolicMemory(SimMemory): #pylint:disable=abstract-method
             changed_bytes |= self.changed_bytes(o)
 
         if options.FRESHNESS_ANALYSIS in self.state.options and self.state.scratch.ignored_variables is not None:
-            ignored_var_changed_bytes = set()
-
-            if self.category == 'reg':
-                fresh_vars = self.state.scratch.ignored_variables.register_variables
-
-                for v in fresh_vars:
-                    offset, size = v.reg, v.size
-                    ignored_var_changed_bytes |= set(xrange(offset, offset + size))
-
-            else:
-                fresh_vars = self.state.scratch.ignored_variables.memory_variables
-
-                for v in fresh_vars:
-                    # v.addr is an AddressWrapper object
-                    region_id = v.addr.region
-                    offset = v.addr.address
-                    size = v.size
-
-                    if region_id == self.id:
-                        ignored_var_changed_bytes |= set(range(offset, offset + size))
-
-            changed_bytes = changed_bytes - ignored_var_changed_bytes
+            fresh_bytes = self._fresh_bytes()
+            changed_bytes = { b for b in changed_bytes if b not in fresh_bytes }
 
         widening_occurred = (len(changed_bytes) > 0)
 
@@ -153,6 +129,26 @@ class SimSymbolicMemory(SimMemory): #pylint:disable=abstract-method
 
         return widening_occurred
 
+    def _fresh_bytes(self):
+        """
+        The bytes of this memory that belong to the variables the freshness analysis ignores.
+
+        :return: A SimIntervalSet of addresses (or of register offsets).
+        """
+        fresh_bytes = SimIntervalSet()
+
+        if self.category == 'reg':
+            for v in self.state.scratch.ignored_variables.register_variables:
+                fresh_bytes.add_range(v.reg, v.reg + v.size)
+
+        else:
+            for v in self.state.scratch.ignored_variables.memory_variables:
+                # v.addr is an AddressWrapper object
+                if v.addr.region == self.id:
+                    fresh_bytes.add_range(v.addr.address, v.addr.address + v.size)
+
+        return fresh_bytes
+
     def _merge(self, others, changed_bytes, flag, flag_values, is_widening=False):
 
         all_memories = [self] + others
@@ -515,7 +511,14 @@ class SimSymbolicMemory(SimMemory): #pylint:disable=abstract-method
     def _read_from(self, addr, num_bytes):
         the_bytes, missing =  self.mem.load_bytes(addr, num_bytes)
 
-        if len(missing) > 0:
+        if len(missing) > 0 and self.category == 'mem' and options.CGC_ZERO_FILL_UNCONSTRAINED_MEMORY in self.state.options:
+            # zero-filled memory is kept as a single repeated zero byte rather than as page-sized zero bitvectors
+            self.state.log.add_event('uninitialized', memory_id=self.id, addr=addr, size=num_bytes)
+            default_mo = SimRepeatedMemoryObject(self.state.se.BVV(0, 8), addr, num_bytes)
+            for m in missing:
+                the_bytes[m] = default_mo
+            self.mem.store_memory_object(default_mo, overwrite=False)
+        elif len(missing) > 0:
             name = "%s_%x" % (self.id, addr)
             all_missing = [ self.get_unconstrained_bytes(name, min(self.mem._page_size, num_bytes)*8, source=i) for i in range(addr, addr+num_bytes, self.mem._page_size) ]
             if self.category == 'reg' and self.state.arch.register_endness == 'Iend_LE':
@@ -531,7 +534,7 @@ class SimSymbolicMemory(SimMemory): #pylint:disable=abstract-method
             #   self.mem[addr+m] = default_mo
             self.mem.store_memory_object(default_mo, overwrite=False)
 
-        if 0 in the_bytes and isinstance(the_bytes[0], SimMemoryObject) and len(the_bytes) == the_bytes[0].object.length/8:
+        if 0 in the_bytes and isinstance(the_bytes[0], SimMemoryObject) and len(the_bytes) == the_bytes[0].length:
             for mo in the_bytes.itervalues():
                 if mo is not the_bytes[0]:
                     break
@@ -561,6 +564,35 @@ class SimSymbolicMemory(SimMemory): #pylint:disable=abstract-method
         return r
 
 
+    def concrete_prefix(self, addr, size):
+        the_bytes, missing = self.mem.load_bytes(addr, size)
+
+        # the_bytes and missing hold the offsets at which a run of bytes from the same source starts
+        end = min(missing) if len(missing) > 0 else size
+        offsets = sorted(o for o in the_bytes if o < end)
+
+        chunks = [ ]
+        for i, off in enumerate(offsets):
+            run_length = (offsets[i+1] if i + 1 < len(offsets) else end) - off
+            mo = the_bytes[off]
+            if not isinstance(mo, SimMemoryObject):
+                break
+
+            data = mo.bytes_at(addr + off, run_length)
+            if not data.symbolic:
+                chunks.append(('%x' % data._model_concrete.value).zfill(run_length * 2).decode('hex'))
+                continue
+
+            # keep the concrete bytes at the start of a partly symbolic run
+            if data.op == 'Concat':
+                for arg in data.args:
+                    if arg.symbolic or arg.size() == 0 or arg.size() % 8 != 0:
+                        break
+                    chunks.append(('%x' % arg._model_concrete.value).zfill(arg.size() / 4).decode('hex'))
+            break
+
+        return ''.join(chunks)
+
     def _load(self, dst, size, condition=None, fallback=None):
         if self.state.se.symbolic(size):
             l.warning("Concretizing symbolic length. Much sad; think about implementing.")
@@ -899,6 +931,41 @@ class SimSymbolicMemory(SimMemory): #pylint:disable=abstract-method
 
         return req
 
+    def store_repeated(self, addr, pattern, length):
+        """
+        Fills `length` bytes of memory, starting at `addr`, with `pattern` repeated over and over. The range is kept as
+        a single :class:`SimRepeatedMemoryObject`, so the repeated expression is only built if something reads all of
+        it back.
+
+        Symbolic addresses and lengths, and states with mem_write breakpoints, go through a normal store.
+
+        :param addr:    The address to start at.
+        :param pattern: A claripy bitvector of the bytes to repeat, in memory order.
+        :param length:  The number of bytes to fill.
+        """
+        if self.state.se.symbolic(addr) or self.state.se.symbolic(length) or (
+                self.state.has_plugin('inspector') and self.state.inspect._breakpoints['mem_write']):
+            return super(SimSymbolicMemory, self).store_repeated(addr, pattern, length)
+
+        if isinstance(addr, claripy.ast.Base):
+            addr = self.state.se.any_int(addr)
+        if isinstance(length, claripy.ast.Base):
+            length = self.state.se.any_int(length)
+        if length == 0:
+            return
+
+        pattern.make_uuid()
+        mo = SimRepeatedMemoryObject(pattern, addr, length)
+        self.mem.store_memory_object(mo)
+
+        if options.AUTO_REFS in self.state.options and not self._abstract_backer:
+            # the action only has the size, since the data would be the whole repeated expression that this avoids
+            # building
+            action = SimActionData(self.state, self.category, 'write', addr=addr, size=length)
+            action.actual_addrs = [ addr ]
+            action.added_constraints = action._make_object(self.state.se.true)
+            self.state.log.add_action(action)
+
     def get_unconstrained_bytes(self, name, bits, source=None):
         """
         Get some consecutive unconstrained bytes.
@@ -1105,8 +1172,18 @@ class SimSymbolicMemory(SimMemory): #pylint:disable=abstract-method
         '''
         return self.mem.map_region(addr, length, permissions)
 
+    def unmap_region(self, addr, length):
+        '''
+        Release the pages that lie entirely within a region, e.g. after it was freed or unmapped.
+        :param addr: address of the region
+        :param length: length in bytes of the region, partly covered pages at either end are kept
+        '''
+        return self.mem.unmap_region(addr, length)
+
 SimSymbolicMemory.register_default('memory', SimSymbolicMemory)
 SimSymbolicMemory.register_default('registers', SimSymbolicMemory)
 from ..s_errors import SimUnsatError, SimMemoryError, SimMemoryLimitError, SimMemoryAddressError
 from .. import s_options as options
 from .inspect import BP_AFTER, BP_BEFORE
+from ..s_action import SimActionData
+from ..s_interval import SimIntervalSet
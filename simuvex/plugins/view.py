@@ -2,6 +2,8 @@ import claripy
 from .plugin import SimStatePlugin
 
 class SimRegNameView(SimStatePlugin):
+    STATELESS = True
+
     def __init__(self):
         super(SimRegNameView, self).__init__()
 
@@ -40,6 +42,8 @@ class SimRegNameView(SimStatePlugin):
         return False, [ ]
 
 class SimMemView(SimStatePlugin):
+    STATELESS = True
+
     def __init__(self, ty=None, addr=None, state=None):
         super(SimMemView, self).__init__()
         self._type = ty
@@ -17,8 +17,9 @@ class deallocate(simuvex.SimProcedure):
 
         aligned_length = ((length + 0xfff) / 0x1000) * 0x1000
 
-        # TODO: not sure if this is valuable until we actually model CGC
-        # allocations accurately
-        # self.state.memory.unmap_region(addr, aligned_length)
+        # release the pages only when the deallocation has to succeed
+        if not self.state.se.symbolic(addr) and not self.state.se.symbolic(aligned_length) and \
+                self.state.se.max_int(r) == 0:
+            self.state.memory.unmap_region(self.state.se.any_int(addr), self.state.se.any_int(aligned_length))
 
         return r
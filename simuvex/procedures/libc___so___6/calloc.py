@@ -31,9 +31,7 @@ class calloc(simuvex.SimProcedure):
         if final_size > plugin.max_variable_size:
             final_size = plugin.max_variable_size
 
-        addr = plugin.heap_location
-        plugin.heap_location += final_size
-        v = self.state.se.BVV(0, final_size)
-        self.state.memory.store(addr, v)
+        addr = plugin.allocate(final_size / 8)
+        self.state.memory.store_repeated(addr, self.state.se.BVV(0, 8), final_size / 8)
 
         return addr
@@ -7,6 +7,14 @@ from simuvex.s_type import SimTypeTop
 class free(simuvex.SimProcedure):
     #pylint:disable=arguments-differ
 
-    def run(self, ptr): #pylint:disable=unused-argument
+    def run(self, ptr):
         self.argument_types = {0: self.ty_ptr(SimTypeTop())}
+
+        if not self.state.se.symbolic(ptr):
+            addr = self.state.se.any_int(ptr)
+            size = self.state.libc.release(addr)
+            if size is not None:
+                # the chunk can be handed out again, and the pages it covers no longer need to be carried around
+                self.state.memory.unmap_region(addr, size)
+
         return self.state.se.Unconstrained('free', self.state.arch.bits)
@@ -20,8 +20,6 @@ class malloc(simuvex.SimProcedure):
             if size > self.state.libc.max_variable_size:
                 size = self.state.libc.max_variable_size
         else:
-            size = self.state.se.any_int(sim_size) * 8
+            size = self.state.se.any_int(sim_size)
 
-        addr = self.state.libc.heap_location
-        self.state.libc.heap_location += size
-        return addr
+        return self.state.libc.allocate(size)
@@ -17,6 +17,21 @@ class memcmp(simuvex.SimProcedure):
         max_memcmp_size = self.state.libc.max_buffer_size
 
         definite_size = self.state.se.min_int(n)
+
+        if not self.state.se.symbolic(s1_addr) and not self.state.se.symbolic(s2_addr) and not (
+                self.state.has_plugin('inspector') and self.state.inspect._breakpoints['mem_read']):
+            # compare the concrete prefixes natively, without the solver
+            s1_conc = self.state.memory.concrete_prefix(self.state.se.any_int(s1_addr), definite_size)
+            s2_conc = self.state.memory.concrete_prefix(self.state.se.any_int(s2_addr), definite_size)
+            known = min(len(s1_conc), len(s2_conc))
+            result = cmp(s1_conc[:known], s2_conc[:known])
+            if result != 0:
+                return self.state.se.BVV(result, self.state.arch.bits)
+            if known == definite_size and not self.state.se.symbolic(n):
+                return self.state.se.BVV(0, self.state.arch.bits)
+            if known > 0:
+                # the prefixes are equal, so only the rest needs to be compared
+                return self.inline_call(memcmp, s1_addr + known, s2_addr + known, n - known).ret_expr
         conditional_s1_start = s1_addr + definite_size
         conditional_s2_start = s2_addr + definite_size
         if self.state.se.symbolic(n):
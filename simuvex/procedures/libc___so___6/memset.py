@@ -1,5 +1,6 @@
 import simuvex
 from simuvex.s_type import SimTypeTop, SimTypeInt, SimTypeLength
+from simuvex.storage.memory_object import SimRepeatedMemoryObject
 
 import logging
 l = logging.getLogger("simuvex.procedures.libc.memset")
@@ -11,33 +12,6 @@ l = logging.getLogger("simuvex.procedures.libc.memset")
 class memset(simuvex.SimProcedure):
     #pylint:disable=arguments-differ
 
-    @staticmethod
-    def _repeat_bytes(byt, rep):
-        """
-        Get a long number for a byte being repeated for many times. This is part of the effort of optimizing
-        performance of angr's memory operations.
-
-        :param int byt: the byte to repeat
-        :param int rep: times to repeat the byte
-        :return: a long integer representing the repeating bytes
-        ;rtype: int
-        """
-
-        if rep == 1:
-            return byt
-
-        remainder = rep % 2
-        quotient = rep / 2
-
-        r_ = memset._repeat_bytes(byt, quotient)
-        if remainder == 1:
-            r = r_ << ((quotient + 1) * 8)
-            r |= (r_ << 8) + byt
-        else:
-            r = r_ << (quotient * 8)
-            r |= r_
-        return r
-
     def run(self, dst_addr, char, num):
         char = char[7:0]
 
@@ -49,20 +23,15 @@ class memset(simuvex.SimProcedure):
         if self.state.se.symbolic(num):
             l.debug("symbolic length")
             max_size = self.state.se.min_int(num) + self.state.libc.max_buffer_size
-            write_bytes = self.state.se.Concat(*([ char ] * max_size))
+            write_bytes = SimRepeatedMemoryObject(char, 0, max_size).object
             self.state.memory.store(dst_addr, write_bytes, size=num)
         else:
             max_size = self.state.se.any_int(num)
             if max_size == 0:
                 return 0
 
-            # Concatenating many bytes is slow, so some sort of optimization is required
-            if char._model_concrete.value == 0:
-                write_bytes = self.state.se.BVV(0, max_size * 8)
-            else:
-                rb = memset._repeat_bytes(char._model_concrete.value, max_size * 8)
-                write_bytes = self.state.se.BVV(rb, max_size * 8)
-            self.state.memory.store(dst_addr, write_bytes)
+            # the bytes are kept as a single repeated memory object, instead of as a concatenation of max_size bytes
+            self.state.memory.store_repeated(dst_addr, char, max_size)
 
             l.debug("memset writing %d bytes", max_size)
 
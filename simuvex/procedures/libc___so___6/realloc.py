@@ -22,9 +22,14 @@ class realloc(simuvex.SimProcedure):
                                 1: SimTypeLength(self.state.arch) }
         self.return_type = self.ty_ptr(SimTypeTop(size))
 
-        addr = self.state.libc.heap_location
+        addr = self.state.libc.allocate(size_int)
         v = self.state.memory.load(ptr, size_int)
         self.state.memory.store(addr, v)
-        self.state.libc.heap_location += size_int
+
+        if not self.state.se.symbolic(ptr):
+            old_addr = self.state.se.any_int(ptr)
+            old_size = self.state.libc.release(old_addr)
+            if old_size is not None:
+                self.state.memory.unmap_region(old_addr, old_size)
 
         return addr
@@ -12,11 +12,23 @@ class strcmp(simuvex.SimProcedure):
                        1: self.ty_ptr(SimTypeString())}
         self.return_type = SimTypeInt(32, True)
 
+        strncmp = simuvex.SimProcedures['libc.so.6']['strncmp']
+
+        if not self.state.se.symbolic(a_addr) and not self.state.se.symbolic(b_addr):
+            result, prefix = strncmp._concrete_compare(self.state, a_addr, b_addr)
+            if result is not None:
+                l.debug("concrete strings compare as %d", result)
+                return self.state.se.BVV(result, self.state.arch.bits)
+            if prefix > 0:
+                # the prefixes are equal, so only the symbolic rest needs to be compared
+                l.debug("comparing the symbolic rest after %d concrete bytes", prefix)
+                return self.inline_call(strcmp, a_addr + prefix, b_addr + prefix).ret_expr
+
         strlen = simuvex.SimProcedures['libc.so.6']['strlen']
 
         a_strlen = strlen(self.state, inline=True, arguments=[a_addr])
         b_strlen = strlen(self.state, inline=True, arguments=[b_addr])
         maxlen = self.state.se.BVV(max(a_strlen.max_null_index, b_strlen.max_null_index), self.state.arch.bits)
 
-        strncmp = self.inline_call(simuvex.SimProcedures['libc.so.6']['strncmp'], a_addr, b_addr, maxlen, a_len=a_strlen, b_len=b_strlen)
-        return strncmp.ret_expr
+        ret = self.inline_call(strncmp, a_addr, b_addr, maxlen, a_len=a_strlen, b_len=b_strlen)
+        return ret.ret_expr
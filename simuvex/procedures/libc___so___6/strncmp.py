@@ -4,9 +4,51 @@ from simuvex.s_type import SimTypeString, SimTypeLength, SimTypeInt
 import logging
 l = logging.getLogger("simuvex.procedures.libc.strncmp")
 
+# how many bytes of each string are read at a time when comparing concrete strings
+CONCRETE_CHUNK_SIZE = 0x40
+
 class strncmp(simuvex.SimProcedure):
     #pylint:disable=arguments-differ
 
+    @staticmethod
+    def _concrete_compare(state, a_addr, b_addr, limit=None):
+        """
+        Compares the concrete prefixes of two strings natively, without going through the solver.
+
+        :param state:   The state to read the strings from.
+        :param a_addr:  The concrete address of the first string.
+        :param b_addr:  The concrete address of the second string.
+        :param limit:   The maximum number of bytes to compare, or None for no limit.
+        :return:        A tuple of the result (-1, 0 or 1, or None if the concrete prefixes do not decide it) and the
+                        number of leading bytes that are concrete, equal and not NUL.
+        """
+        if state.has_plugin('inspector') and state.inspect._breakpoints['mem_read']:
+            return None, 0
+
+        a_addr = state.se.any_int(a_addr)
+        b_addr = state.se.any_int(b_addr)
+
+        compared = 0
+        while limit is None or compared < limit:
+            size = CONCRETE_CHUNK_SIZE if limit is None else min(CONCRETE_CHUNK_SIZE, limit - compared)
+            a_str = state.memory.concrete_prefix(a_addr + compared, size)
+            b_str = state.memory.concrete_prefix(b_addr + compared, size)
+
+            known = min(len(a_str), len(b_str))
+            nul = a_str.find('\x00', 0, known)
+            end = known if nul == -1 else nul + 1
+            if a_str[:end] != b_str[:end]:
+                return cmp(a_str[:end], b_str[:end]), compared
+            if nul != -1:
+                return 0, compared + nul
+
+            compared += known
+            if known < size:
+                # the rest is symbolic or uninitialized
+                return None, compared
+
+        return 0, compared
+
     def run(self, a_addr, b_addr, limit, a_len=None, b_len=None): #pylint:disable=arguments-differ
         # TODO: smarter types here?
         self.argument_types = {0: self.ty_ptr(SimTypeString()),
@@ -14,6 +56,18 @@ class strncmp(simuvex.SimProcedure):
                        2: SimTypeLength(self.state.arch)}
         self.return_type = SimTypeInt(32, True)
 
+        if a_len is None and b_len is None and not self.state.se.symbolic(a_addr) and \
+                not self.state.se.symbolic(b_addr) and not self.state.se.symbolic(limit):
+            c_limit = self.state.se.any_int(limit)
+            result, prefix = self._concrete_compare(self.state, a_addr, b_addr, c_limit)
+            if result is not None:
+                l.debug("concrete strings compare as %d", result)
+                return self.state.se.BVV(result, self.state.arch.bits)
+            if prefix > 0:
+                # the prefixes are equal, so only the symbolic rest needs to be compared
+                l.debug("comparing the symbolic rest after %d concrete bytes", prefix)
+                return self.inline_call(strncmp, a_addr + prefix, b_addr + prefix, limit - prefix).ret_expr
+
         strlen = simuvex.SimProcedures['libc.so.6']['strlen']
 
         a_strlen = a_len if a_len is not None else self.inline_call(strlen, a_addr)
@@ -6,6 +6,17 @@ import simuvex.s_cc
 import logging
 l = logging.getLogger('simuvex.procedures.syscalls')
 
+# arch name -> the syscall calling convention. It only describes where the arguments live, so all the syscalls share it.
+# The procedures themselves are looked up on every call, so that changes to syscall_table or SimProcedures are seen.
+_syscall_ccs = { }
+
+def _syscall_cc(arch):
+    try:
+        return _syscall_ccs[arch.name]
+    except KeyError:
+        cc = _syscall_ccs[arch.name] = simuvex.s_cc.SyscallCC[arch.name](arch)
+        return cc
+
 class handler(simuvex.SimProcedure):
     # The NO_RET flag of handler is set to True, since normally it does not return - the real syscall would return.
     # However, if coming across an unsupported syscall, we will override this flag to False, since the real syscall is
@@ -38,46 +49,58 @@ class handler(simuvex.SimProcedure):
             self.overriding_no_ret = False
             l.debug("Not resolving symbolic syscall")
             return self.state.se.Unconstrained('unresolved_syscall', self.state.arch.bits)
-        maximum = self.state.posix.maximum_symbolic_syscalls
-        possible = self.state.se.any_n_int(syscall_num, maximum+1)
+        if not syscall_num.symbolic:
+            # no need to ask the solver about a concrete syscall number
+            possible = [ syscall_num._model_concrete.value ]
+        else:
+            maximum = self.state.posix.maximum_symbolic_syscalls
+            possible = self.state.se.any_n_int(syscall_num, maximum+1)
+
+            if len(possible) == 0:
+                self.overriding_no_ret = False
+                raise SimUnsatError("unsatisifiable state attempting to do a syscall")
 
-        if len(possible) == 0:
-            self.overriding_no_ret = False
-            raise SimUnsatError("unsatisifiable state attempting to do a syscall")
+            if len(possible) > maximum:
+                l.warning("Too many possible syscalls. Concretizing to 1.")
+                possible = possible[:1]
 
-        if len(possible) > maximum:
-            l.warning("Too many possible syscalls. Concretizing to 1.")
-            possible = possible[:1]
+            l.debug("Possible syscall values: %s", possible)
+            self.state.add_constraints(self.state.se.Or(*[syscall_num == n for n in possible]))
 
-        l.debug("Possible syscall values: %s", possible)
-        self.state.add_constraints(self.state.se.Or(*[syscall_num == n for n in possible]))
+        if self.state.has_plugin('cgc'):
+            map_name = 'CGC'
+            syscall_lib = 'cgc'
+        else:
+            map_name = self.state.arch.name
+            syscall_lib = 'syscalls'
+        cc = _syscall_cc(self.state.arch)
+        procedures = simuvex.SimProcedures[syscall_lib]
 
         for n in possible:
-            if self.state.has_plugin('cgc'):
-                map_name = 'CGC'
-                syscall_lib = 'cgc'
-            else:
-                map_name = self.state.arch.name
-                syscall_lib = 'syscalls'
-
             if n not in syscall_table[map_name]:
-                self.overriding_no_ret = False
-                l.error("no syscall %d for arch %s", n, map_name)
-                if simuvex.o.BYPASS_UNSUPPORTED_SYSCALL in self.state.options:
-                    self.state.log.add_event('resilience', resilience_type='syscall', syscall=n, message='unsupported syscall')
-                    return self.state.se.Unconstrained('syscall_%d' % n, self.state.arch.bits)
-                else:
-                    raise simuvex.UnsupportedSyscallError("no syscall %d for arch %s" % (n, map_name))
-
-            self.callname = syscall_table[map_name][n]
+                return self._unsupported(n, "no syscall %d for arch %s" % (n, map_name))
+
+            callname = syscall_table[map_name][n]
+            if callname not in procedures:
+                return self._unsupported(n, "syscall %s (%d) is not implemented for arch %s" % (callname, n, map_name))
+
+            self.callname = callname
             l.debug("Routing to syscall %s", self.callname)
 
-            cc = simuvex.s_cc.SyscallCC[self.state.arch.name](self.state.arch)
-            self._syscall = simuvex.SimProcedures[syscall_lib][self.callname](self.state, ret_to=self.state.regs.ip, convention=cc)
+            self._syscall = procedures[callname](self.state, ret_to=self.state.regs.ip, convention=cc)
             self.successors.extend(self._syscall.successors)
             self.flat_successors.extend(self._syscall.flat_successors)
             self.unsat_successors.extend(self._syscall.unsat_successors)
 
+    def _unsupported(self, n, message):
+        self.overriding_no_ret = False
+        l.error(message)
+        if simuvex.o.BYPASS_UNSUPPORTED_SYSCALL in self.state.options:
+            self.state.log.add_event('resilience', resilience_type='syscall', syscall=n, message='unsupported syscall')
+            return self.state.se.Unconstrained('syscall_%d' % n, self.state.arch.bits)
+        else:
+            raise simuvex.UnsupportedSyscallError(message)
+
     def __repr__(self):
         return '<Syscall (%s)>' % ('Unsupported' if self.callname is None else self.callname)
 
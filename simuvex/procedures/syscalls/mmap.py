@@ -10,9 +10,9 @@ class mmap(simuvex.SimProcedure):
             if size > self.state.libc.max_variable_size:
                 size = self.state.libc.max_variable_size
         else:
-            size = self.state.se.any_int(length) * 8
+            size = self.state.se.any_int(length)
 
-        # mmap on the heap, lol
-        addr = self.state.libc.heap_location
-        self.state.libc.heap_location += size
-        return addr
+        # mmap on the heap, lol. mappings are whole pages, so that munmap can release them
+        page_size = self.state.libc.HEAP_PAGE_SIZE
+        size = max(size, 1)
+        return self.state.libc.allocate((size + page_size - 1) / page_size * page_size)
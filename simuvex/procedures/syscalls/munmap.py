@@ -1,6 +1,14 @@
 import simuvex
 
 class munmap(simuvex.SimProcedure):
-    def run(self, addr, length): #pylint:disable=arguments-differ,unused-argument
-        # TODO: actually do something
+    def run(self, addr, length): #pylint:disable=arguments-differ
+        if not self.state.se.symbolic(addr) and not self.state.se.symbolic(length):
+            addr = self.state.se.any_int(addr)
+            length = self.state.se.any_int(length)
+
+            chunk = self.state.libc.heap_chunks.get(addr)
+            if chunk is not None and chunk <= length:
+                self.state.libc.release(addr)
+            self.state.memory.unmap_region(addr, length)
+
         return self.state.se.BVV(0, self.state.arch.bits)
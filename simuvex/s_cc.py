@@ -7,6 +7,9 @@ from .s_action_object import SimActionObject
 
 l = logging.getLogger("simuvex.s_cc")
 
+# (calling convention class, arch name) -> a tuple of (offset, size) of the argument registers
+_arg_reg_locations = { }
+
 class SimFunctionArgument(object):
     def __init__(self):
         pass
@@ -113,6 +116,41 @@ class SimCC(object):
 
         return self.arg_getter(state, reg_offsets, stackarg_mem_base, index)
 
+    def get_args(self, state, count):
+        """
+        Returns bitvector expressions for the first `count` arguments of a function, like arg() does for each of them.
+        The register locations are resolved once per calling convention and architecture, and the stack pointer is only
+        read once.
+        """
+        if count == 0:
+            return [ ]
+
+        reg_locations = self._arg_reg_locations(state.arch)
+        reg_endness = state.arch.register_endness
+        args = [ state.registers.load(offset, size, endness=reg_endness) for offset, size in reg_locations[:count] ]
+
+        if count > len(reg_locations):
+            if self.STACKARG_SP_DIFF is None:
+                raise NotImplementedError('STACKARG_SP_DIFF is not specified for calling convention %s' % type(self))
+
+            stack_step = -state.arch.stack_change
+            mem_base = state.regs.sp + self.STACKARG_SP_DIFF + self.STACKARG_SP_BUFF
+            for index in xrange(count - len(reg_locations)):
+                args.append(state.memory.load(mem_base + index * stack_step, stack_step,
+                                              endness=state.arch.memory_endness))
+
+        return args
+
+    def _arg_reg_locations(self, arch):
+        key = (type(self), arch.name)
+        try:
+            return _arg_reg_locations[key]
+        except KeyError:
+            if self.ARG_REGS is None:
+                raise NotImplementedError('ARG_REGS is not specified for calling convention %s' % type(self))
+            locations = tuple(arch.registers[reg] for reg in self.ARG_REGS)
+            _arg_reg_locations[key] = locations
+            return locations
 
     def set_return_expr(self, state, expr):
         """
@@ -34,6 +34,9 @@ class SimFileError(SimMemoryError):
 class SimPosixError(SimStateError):
     pass
 
+class SimPCAPError(SimPosixError):
+    pass
+
 #
 # Solver-related errors
 #
@@ -149,3 +152,17 @@ class SimUCManagerError(SimError):
 
 class SimUCManagerAllocationError(SimUCManagerError):
     pass
+
+#
+# Snapshot errors
+#
+
+class SimSnapshotError(SimError):
+    pass
+
+#
+# Parallel stepping errors
+#
+
+class SimParallelError(SimError):
+    pass
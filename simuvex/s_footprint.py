@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+"""
+Memory footprint accounting for states.
+
+SimState.footprint() reports what a single state holds, per plugin. footprint() does the same for a collection of
+states, counting the structure they share (pages, memory objects, ASTs, plugins that were not copied yet) only once.
+"""
+
+import collections
+
+import claripy
+
+def count_ast_nodes(asts, seen):
+    """
+    Count the AST nodes that are reachable from some ASTs.
+
+    :param asts:    The ASTs to start from.
+    :param seen:    A set of the ids of the objects that were already accounted for. It is updated with the nodes that
+                    are counted.
+    :return:        The number of nodes that were not in `seen`.
+    """
+    n = 0
+    stack = list(asts)
+    while stack:
+        a = stack.pop()
+        if not isinstance(a, claripy.ast.Base) or id(a) in seen:
+            continue
+        seen.add(id(a))
+        n += 1
+        stack.extend(a.args)
+    return n
+
+def footprint(states):
+    """
+    Report the memory held by a collection of states, with the shared structure counted only once.
+
+    :param states:  The states.
+    :return:        A dict of plugin name -> counter -> total over all the states. Each plugin also has an 'instances'
+                    counter: the number of distinct plugin objects.
+    """
+    seen = set()
+    totals = collections.defaultdict(collections.Counter)
+    for s in states:
+        for name, report in s.footprint(seen=seen).iteritems():
+            totals[name]['instances'] += 1
+            totals[name].update({ k: v for k, v in report.iteritems() if k != 'shared' })
+    return { name: dict(counters) for name, counters in totals.iteritems() }
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+"""
+A set of integers, stored as sorted, disjoint ranges. It is made for sets of addresses and register offsets, where the
+elements come in runs: adding, removing or looking up a range costs a binary search, however long the range is.
+"""
+
+import bisect
+
+class SimIntervalSet(object):
+    """
+    A set of integers, stored as disjoint, non-adjacent [start, end) ranges, sorted by their starts.
+    """
+
+    def __init__(self, items=None):
+        self._starts = [ ]
+        self._ends = [ ]
+        self._len = 0
+
+        if items is not None:
+            for i in items:
+                self.add(i)
+
+    @classmethod
+    def from_ranges(cls, ranges):
+        """
+        Create a set from some [start, end) ranges, which may overlap.
+        """
+        s = cls()
+        for start, end in ranges:
+            s.add_range(start, end)
+        return s
+
+    def copy(self):
+        s = SimIntervalSet()
+        s._starts = list(self._starts)
+        s._ends = list(self._ends)
+        s._len = self._len
+        return s
+
+    def ranges(self):
+        """
+        Iterate over the [start, end) ranges of the set, in order.
+        """
+        return zip(self._starts, self._ends)
+
+    #
+    # Updates
+    #
+
+    def add(self, item):
+        self.add_range(item, item + 1)
+
+    def add_range(self, start, end):
+        """
+        Add all the integers in [start, end).
+        """
+        if start >= end:
+            return
+
+        # the ranges that overlap or touch [start, end) are lo ... hi-1
+        lo = bisect.bisect_left(self._ends, start)
+        hi = bisect.bisect_right(self._starts, end)
+
+        if lo < hi:
+            start = min(start, self._starts[lo])
+            end = max(end, self._ends[hi-1])
+            self._len -= sum(e - s for s, e in zip(self._starts[lo:hi], self._ends[lo:hi]))
+
+        self._starts[lo:hi] = [ start ]
+        self._ends[lo:hi] = [ end ]
+        self._len += end - start
+
+    def discard(self, item):
+        self.discard_range(item, item + 1)
+
+    def remove(self, item):
+        if item not in self:
+            raise KeyError(item)
+        self.discard(item)
+
+    def discard_range(self, start, end):
+        """
+        Remove all the integers in [start, end) that are in the set.
+        """
+        if start >= end:
+            return
+
+        # the ranges that overlap [start, end) are lo ... hi-1
+        lo = bisect.bisect_right(self._ends, start)
+        hi = bisect.bisect_left(self._starts, end)
+        if lo >= hi:
+            return
+
+        first_start, last_end = self._starts[lo], self._ends[hi-1]
+        self._len -= sum(e - s for s, e in zip(self._starts[lo:hi], self._ends[lo:hi]))
+
+        starts, ends = [ ], [ ]
+        if first_start < start:
+            starts.append(first_start)
+            ends.append(start)
+        if end < last_end:
+            starts.append(end)
+            ends.append(last_end)
+
+        self._starts[lo:hi] = starts
+        self._ends[lo:hi] = ends
+        self._len += sum(e - s for s, e in zip(starts, ends))
+
+    def clear(self):
+        self._starts = [ ]
+        self._ends = [ ]
+        self._len = 0
+
+    #
+    # Lookups
+    #
+
+    def __contains__(self, item):
+        i = bisect.bisect_right(self._starts, item) - 1
+        return i >= 0 and item < self._ends[i]
+
+    def contains_range(self, start, end):
+        """
+        Whether all the integers in [start, end) are in the set.
+        """
+        if start >= end:
+            return True
+        i = bisect.bisect_right(self._starts, start) - 1
+        return i >= 0 and end <= self._ends[i]
+
+    def overlaps_range(self, start, end):
+        """
+        Whether any integer in [start, end) is in the set.
+        """
+        if start >= end:
+            return False
+        i = bisect.bisect_right(self._ends, start)
+        return i < len(self._starts) and self._starts[i] < end
+
+    def __len__(self):
+        return self._len
+
+    def __nonzero__(self):
+        return self._len != 0
+
+    def __iter__(self):
+        for start, end in zip(self._starts, self._ends):
+            for i in xrange(start, end):
+                yield i
+
+    def __eq__(self, other):
+        if isinstance(other, SimIntervalSet):
+            return self._starts == other._starts and self._ends == other._ends
+        return NotImplemented
+
+    def __ne__(self, other):
+        r = self.__eq__(other)
+        return r if r is NotImplemented else not r
+
+    def __repr__(self):
+        return "<SimIntervalSet %s>" % ", ".join("[%#x, %#x)" % r for r in self.ranges())
+
+    #
+    # Set operations
+    #
+
+    def __or__(self, other):
+        s = self.copy()
+        s |= other
+        return s
+
+    def __ior__(self, other):
+        for start, end in other.ranges():
+            self.add_range(start, end)
+        return self
+
+    def __sub__(self, other):
+        s = self.copy()
+        s -= other
+        return s
+
+    def __isub__(self, other):
+        for start, end in other.ranges():
+            self.discard_range(start, end)
+        return self
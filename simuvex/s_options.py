@@ -199,6 +199,10 @@ KEEP_IP_SYMBOLIC = "KEEP_IP_SYMBOLIC"
 # It is only applied to SimAbstractMemory
 KEEP_MEMORY_READS_DISCRETE = "KEEP_MEMORY_READS_DISCRETE"
 
+# When a memory is branched, replace the pages it wrote to with identical pages of other states (see
+# SimPagedMemory.intern_pages())
+INTERN_PAGES = "INTERN_PAGES"
+
 #
 # CGC specific state options
 #
@@ -217,9 +221,14 @@ symbolic = { DO_CCALLS, SYMBOLIC, TRACK_CONSTRAINTS, LAZY_SOLVES, SYMBOLIC_INITI
 simplification = { SIMPLIFY_MEMORY_WRITES, SIMPLIFY_EXIT_STATE, SIMPLIFY_EXIT_GUARD, SIMPLIFY_REGISTER_WRITES }
 common_options_without_simplification = { DO_GETS, DO_PUTS, DO_LOADS, DO_OPS, COW_STATES, DO_STORES, OPTIMIZE_IR, TRACK_MEMORY_MAPPING }
 common_options = common_options_without_simplification | simplification
+# the options SimProcedures turn on while they run
+auto_refs = frozenset({ AST_DEPS, AUTO_REFS })
 
 modes = { }
 modes['symbolic'] = common_options | symbolic | refs #| approximation | { VALIDATE_APPROXIMATIONS }
 modes['symbolic_approximating'] = common_options | symbolic | refs | approximation
 modes['static'] = common_options_without_simplification | refs | { BEST_EFFORT_MEMORY_STORING, UNINITIALIZED_ACCESS_AWARENESS, SYMBOLIC_INITIAL_VALUES, DO_CCALLS, DO_RET_EMULATION, TRUE_RET_EMULATION_GUARD, BLOCK_SCOPE_CONSTRAINTS, TRACK_CONSTRAINTS, ABSTRACT_MEMORY, ABSTRACT_SOLVER, USE_SIMPLIFIED_CCALLS, REVERSE_MEMORY_NAME_MAP }
 modes['fastpath'] = ((modes['symbolic'] | { BEST_EFFORT_MEMORY_STORING, AVOID_MULTIVALUED_READS, AVOID_MULTIVALUED_WRITES, IGNORE_EXIT_GUARDS, SYMBOLIC_INITIAL_VALUES, DO_RET_EMULATION } | resilience_options) - simplification - approximation) - { SYMBOLIC, DO_CCALLS }
+
+# the modes are built once and shared by every state created from them, which copies them into its own set
+modes = { name: frozenset(mode_options) for name, mode_options in modes.iteritems() }
@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+"""
+Stepping states in a pool of local worker processes.
+
+    with SimParallelStepper(workers=4) as stepper:
+        for r in stepper.step(states):
+            print r.addr, r.flat_successors
+
+The states are split into chunks, which are moved to the workers and back in the snapshot format (see s_snapshot), so
+that what the states of a chunk share is only sent once. Each worker starts with its own contiguous share of the
+chunks, and when a worker runs out, it steals the last chunk of the worker that has the most left.
+
+The results do not depend on the number of workers or on the scheduling: there is one result per state, in the order
+of the states, and the successors of each result are in the order that the SimRun produced them.
+"""
+
+import Queue
+import itertools
+import traceback
+import collections
+import multiprocessing
+
+import pyvex
+
+from .s_errors import SimParallelError, SimIRSBError
+
+import logging
+l = logging.getLogger("simuvex.s_parallel")
+
+# the number of bytes step_block() lifts from
+BLOCK_BYTES = 400
+
+SUCCESSOR_LISTS = ('successors', 'flat_successors', 'unsat_successors', 'unconstrained_successors')
+
+
+def step_block(state):
+    """
+    The default step function: lift the basic block at the state's instruction pointer from the concrete bytes of the
+    state's memory, and execute it.
+
+    :param state:   The state.
+    :return:        The SimIRSB.
+    """
+    addr = state.se.any_int(state.ip)
+    # a load() would fill unmapped memory with fresh bytes, log actions, fire breakpoints and pick values for symbolic
+    # bytes, all on the state that is stepped
+    data = state.memory.concrete_prefix(addr, BLOCK_BYTES)
+    if not data:
+        raise SimIRSBError("no concrete code at %#x" % addr)
+    return SimIRSB(state, pyvex.IRSB(data, addr, state.arch))
+
+
+class SimStepResult(object):
+    """
+    The outcome of stepping one state.
+
+    :ivar addr:                     The address of the SimRun, or None if stepping failed.
+    :ivar successors:               The successors of the SimRun.
+    :ivar flat_successors:          Its flat successors.
+    :ivar unsat_successors:         Its unsatisfiable successors.
+    :ivar unconstrained_successors: Its unconstrained successors.
+    :ivar error:                    The traceback of the exception that stepping raised, or None.
+    """
+
+    def __init__(self, addr=None, successors=(), flat_successors=(), unsat_successors=(),
+                 unconstrained_successors=(), error=None):
+        self.addr = addr
+        self.successors = list(successors)
+        self.flat_successors = list(flat_successors)
+        self.unsat_successors = list(unsat_successors)
+        self.unconstrained_successors = list(unconstrained_successors)
+        self.error = error
+
+    def __repr__(self):
+        if self.error is not None:
+            return "<SimStepResult failed>"
+        return "<SimStepResult %s with %d flat successors>" % (
+            "%#x" % self.addr if type(self.addr) in (int, long) else self.addr, len(self.flat_successors))
+
+
+def _step_chunk(step, states):
+    """
+    Step some states.
+
+    :return: A tuple of the list of all the successor states, and the layout: for every state, its SimRun address,
+             the number of states in each of its successor lists and the error.
+    """
+    successors = [ ]
+    layout = [ ]
+    for s in states:
+        try:
+            run = step(s)
+            lists = [ getattr(run, name) for name in SUCCESSOR_LISTS ]
+            addr = run.addr
+        except Exception: #pylint:disable=broad-except
+            layout.append((None, (0,) * len(SUCCESSOR_LISTS), traceback.format_exc()))
+            continue
+
+        layout.append((addr, tuple(len(succ) for succ in lists), None))
+        for succ in lists:
+            successors.extend(succ)
+    return successors, layout
+
+def _results(successors, layout):
+    results = [ ]
+    i = 0
+    for addr, counts, error in layout:
+        lists = [ ]
+        for n in counts:
+            lists.append(successors[i:i+n])
+            i += n
+        results.append(SimStepResult(addr, *lists, error=error))
+    return results
+
+def _worker(step, backers, tasks, results, worker_id):
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+
+        batch, chunk_id, data = task
+        try:
+            successors, layout = _step_chunk(step, load_states(data, backers=backers))
+            results.put((worker_id, batch, chunk_id, dump_states(successors, backers=backers), layout, None))
+        except Exception: #pylint:disable=broad-except
+            results.put((worker_id, batch, chunk_id, None, None, traceback.format_exc()))
+
+
+class SimParallelStepper(object):
+    """
+    Steps states in a pool of worker processes.
+
+    :ivar stats:    A counter of the 'states' and 'chunks' that were stepped, and of the chunks that were stolen by a
+                    worker from another one ('steals').
+    """
+
+    def __init__(self, step=None, workers=None, chunk_size=4, prefetch=2, backers=None):
+        """
+        :param step:        The function that steps a state, returning a SimRun. It defaults to step_block(). It is
+                            called in the worker processes.
+        :param workers:     The number of worker processes. It defaults to the number of CPUs. With 0 workers, the
+                            states are stepped in this process.
+        :param chunk_size:  The number of states that are sent to a worker at once.
+        :param prefetch:    The number of chunks a worker can have queued.
+        :param backers:     A dict of name -> cle.Clemory, for the memory backers that the workers have too (for
+                            example, because they were forked after loading the binary). They are not sent with the
+                            states.
+        """
+        self._step = step_block if step is None else step
+        self._n = multiprocessing.cpu_count() if workers is None else workers
+        self._chunk_size = chunk_size
+        self._prefetch = prefetch
+        self._backers = backers
+
+        self._processes = [ ]
+        self._tasks = [ ]
+        self._results = None
+        self._batches = itertools.count()
+
+        self.stats = collections.Counter()
+
+    def start(self):
+        """
+        Start the worker processes. step() starts them if needed.
+        """
+        if self._processes or self._n == 0:
+            return
+
+        self._results = multiprocessing.Queue()
+        for i in xrange(self._n):
+            tasks = multiprocessing.Queue()
+            p = multiprocessing.Process(target=_worker, args=(self._step, self._backers, tasks, self._results, i))
+            p.daemon = True
+            p.start()
+            self._tasks.append(tasks)
+            self._processes.append(p)
+
+    def close(self):
+        """
+        Stop the worker processes.
+        """
+        for tasks in self._tasks:
+            tasks.put(None)
+        for p in self._processes:
+            p.join()
+
+        self._processes = [ ]
+        self._tasks = [ ]
+        self._results = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def step(self, states):
+        """
+        Step some states.
+
+        :param states:  The states.
+        :return:        A list of SimStepResults, one per state, in the order of the states.
+        """
+        states = list(states)
+        self.stats['states'] += len(states)
+
+        if self._n == 0:
+            # the workers step decoded copies, so the states we are given are left alone here too
+            return _results(*_step_chunk(self._step, [ s.copy() for s in states ]))
+
+        self.start()
+
+        batch = next(self._batches)
+        chunks = [ states[i:i+self._chunk_size] for i in xrange(0, len(states), self._chunk_size) ]
+        results = [ None ] * len(chunks)
+        in_flight = [ 0 ]
+
+        # every worker starts with a contiguous share of the chunks
+        queues = [ collections.deque() for _ in xrange(self._n) ]
+        for i in xrange(len(chunks)):
+            queues[i * self._n // len(chunks)].append(i)
+
+        def dispatch(w):
+            if queues[w]:
+                chunk_id = queues[w].popleft()
+            else:
+                victim = max(xrange(self._n), key=lambda v: len(queues[v]))
+                if not queues[victim]:
+                    return
+                chunk_id = queues[victim].pop()
+                self.stats['steals'] += 1
+
+            self._tasks[w].put((batch, chunk_id, dump_states(chunks[chunk_id], backers=self._backers)))
+            in_flight[0] += 1
+
+        for w in xrange(self._n):
+            for _ in xrange(self._prefetch):
+                dispatch(w)
+
+        failure = None
+        while in_flight[0]:
+            w, result_batch, chunk_id, data, layout, error = self._next_result()
+            if result_batch != batch:
+                # left over from a batch that was interrupted
+                continue
+            in_flight[0] -= 1
+
+            if failure is not None:
+                # wait for the chunks that are still in flight, so that the pool is ready for the next batch
+                continue
+            if error is not None:
+                failure = "worker %d failed on a chunk:\n%s" % (w, error)
+                continue
+
+            results[chunk_id] = _results(load_states(data, backers=self._backers), layout)
+            self.stats['chunks'] += 1
+            dispatch(w)
+
+        if failure is not None:
+            raise SimParallelError(failure)
+
+        return [ r for chunk_results in results for r in chunk_results ]
+
+    def _next_result(self):
+        while True:
+            try:
+                return self._results.get(timeout=1)
+            except Queue.Empty:
+                dead = [ i for i, p in enumerate(self._processes) if not p.is_alive() ]
+                if dead:
+                    self.close()
+                    raise SimParallelError("worker %d died" % dead[0])
+
+from .vex.irsb import SimIRSB
+from .s_snapshot import dump_states, load_states
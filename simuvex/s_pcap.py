@@ -1,69 +1,239 @@
+import os
+import mmap
+import array
+import struct
+import cPickle as pickle
+
 import dpkt
 import socket
 import logging
 l = logging.getLogger("simuvex.s_pcap")
 
+# index cache format version. Bump this when the layout of the cache file changes.
+_INDEX_VERSION = 1
+
+# pcap record header: ts_sec, ts_usec, incl_len, orig_len
+_GLOBAL_HEADER_SIZE = 24
+_RECORD_HEADER_SIZE = 16
+
+
+class PCAPIndex(object):
+    """
+    A read-only, compact index of the TCP payloads in a pcap file. The file is memory-mapped, and for each direction of
+    the flow we only keep the offsets and the lengths of the payloads. Payloads are sliced out of the mapping when they
+    are requested.
+
+    A PCAPIndex is meant to be shared between all copies of a PCAP backer. The mapping is released by close(), or
+    when the index is garbage collected.
+    """
+
+    def __init__(self, path, ip, port, index_path=None):
+        self.path = os.path.abspath(path)
+        self.ip = ip
+        self.port = port
+        self.index_path = index_path
+
+        self._mmap = None
+
+        # offsets and lengths of the payloads, per direction
+        self.in_offsets = array.array('L')
+        self.in_lengths = array.array('L')
+        self.out_offsets = array.array('L')
+        self.out_lengths = array.array('L')
+
+        self._map()
+        if not self._load_index():
+            self._build_index()
+            self._store_index()
+
+    def __getstate__(self):
+        return {
+            'path': self.path,
+            'ip': self.ip,
+            'port': self.port,
+            'index_path': self.index_path,
+            'in_offsets': self.in_offsets,
+            'in_lengths': self.in_lengths,
+            'out_offsets': self.out_offsets,
+            'out_lengths': self.out_lengths,
+        }
+
+    def __setstate__(self, s):
+        self.__dict__.update(s)
+        self._mmap = None
+        self._map()
+
+    def _map(self):
+        # the mapping keeps its own reference to the file, so the file itself can be closed right away
+        with open(self.path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                # mmap refuses to map empty files
+                self._mmap = ''
+            else:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        """
+        Release the mapping of the pcap file. The payloads cannot be read afterwards.
+        """
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+        self._mmap = None
+
+    def _cache_key(self):
+        st = os.stat(self.path)
+        return (_INDEX_VERSION, st.st_size, int(st.st_mtime), self.ip, self.port)
+
+    def _load_index(self):
+        if self.index_path is None or not os.path.exists(self.index_path):
+            return False
+
+        try:
+            with open(self.index_path, 'rb') as f:
+                key, in_offsets, in_lengths, out_offsets, out_lengths = pickle.load(f)
+        except Exception: #pylint:disable=broad-except
+            l.warning("Unable to read the pcap index cache %s. Rebuilding it.", self.index_path, exc_info=True)
+            return False
+
+        if key != self._cache_key():
+            l.debug("The pcap index cache %s is stale.", self.index_path)
+            return False
+
+        self.in_offsets, self.in_lengths = in_offsets, in_lengths
+        self.out_offsets, self.out_lengths = out_offsets, out_lengths
+        return True
+
+    def _store_index(self):
+        if self.index_path is None:
+            return
+
+        try:
+            with open(self.index_path, 'wb') as f:
+                pickle.dump((self._cache_key(), self.in_offsets, self.in_lengths, self.out_offsets, self.out_lengths),
+                            f, pickle.HIGHEST_PROTOCOL)
+        except IOError:
+            l.warning("Unable to write the pcap index cache %s.", self.index_path, exc_info=True)
+
+    def _build_index(self):
+        buf = self._mmap
+        if len(buf) < _GLOBAL_HEADER_SIZE:
+            raise SimPCAPError("%s is not a pcap file" % self.path)
+
+        magic = buf[:4]
+        if magic == '\xd4\xc3\xb2\xa1':
+            record_header = struct.Struct('<IIII')
+        elif magic == '\xa1\xb2\xc3\xd4':
+            record_header = struct.Struct('>IIII')
+        else:
+            raise SimPCAPError("%s is not a pcap file (bad magic)" % self.path)
+
+        off = _GLOBAL_HEADER_SIZE
+        while off + _RECORD_HEADER_SIZE <= len(buf):
+            _, _, incl_len, _ = record_header.unpack_from(buf, off)
+            frame_off = off + _RECORD_HEADER_SIZE
+            off = frame_off + incl_len
+
+            # only the headers are decoded here, the payload is left in the mapping
+            eth = dpkt.ethernet.Ethernet(buf[frame_off:off])
+            ip = eth.data
+            tcp = ip.data
+            if len(tcp.data) == 0:
+                continue
+
+            payload_off = frame_off + (len(eth) - len(ip)) + ip.hl * 4 + tcp.off * 4
+            if socket.inet_ntoa(ip.dst) == self.ip and tcp.dport == self.port:
+                self.out_offsets.append(payload_off)
+                self.out_lengths.append(len(tcp.data))
+            else:
+                self.in_offsets.append(payload_off)
+                self.in_lengths.append(len(tcp.data))
+
+        l.debug("Indexed %d incoming and %d outgoing packets in %s", len(self.in_offsets), len(self.out_offsets),
+                self.path)
+
+    def in_payload(self, i, start=0, end=None):
+        """
+        Returns (a slice of) the payload of the ith incoming packet.
+        """
+        base = self.in_offsets[i]
+        end = self.in_lengths[i] if end is None else min(end, self.in_lengths[i])
+        return self._mmap[base+start:base+end]
+
+    def out_payload(self, i, start=0, end=None):
+        """
+        Returns (a slice of) the payload of the ith outgoing packet.
+        """
+        base = self.out_offsets[i]
+        end = self.out_lengths[i] if end is None else min(end, self.out_lengths[i])
+        return self._mmap[base+start:base+end]
+
+
+class _PCAPStreamView(object):
+    """
+    A lazy, list-like view of (length, payload) tuples over one direction of a PCAPIndex.
+    """
+
+    def __init__(self, lengths, payload):
+        self._lengths = lengths
+        self._payload = payload
+
+    def __len__(self):
+        return len(self._lengths)
+
+    def __getitem__(self, i):
+        return self._lengths[i], self._payload(i)
+
+    def __iter__(self):
+        for i in xrange(len(self._lengths)):
+            yield self[i]
+
 
 class PCAP(object):
-    def __init__(self,path, ip_port_tup, init=True):
+    """
+    A pcap backer for sockets. The packet index is built when the backer is created (or loaded from the cache file at
+    `index_path`, if it is up to date) and is shared by all copies; a copy only carries its own read cursor.
+    """
+
+    def __init__(self, path, ip_port_tup, init=True, index_path=None, index=None):
         self.path = path
         self.packet_num = 0
         self.pos = 0
-        self.in_streams = []
-        self.out_streams = []
-        #self.in_buf = ''
         self.ip = ip_port_tup[0]
         self.port = ip_port_tup[1]
-        if init:
+        self.index_path = index_path
+
+        self._index = index
+        if init and self._index is None:
             self.initialize(self.path)
 
-    def initialize(self,path):
-        #import ipdb;ipdb.set_trace()
-        f = open(path)
-        pcap = dpkt.pcap.Reader(f)
-        for _,buf in pcap:
-            #data = dpkt.ethernet.Ethernet(buf).ip.data.data
-            ip = dpkt.ethernet.Ethernet(buf).ip
-            tcp = ip.data
-            myip = socket.inet_ntoa(ip.dst)
-            if myip is self.ip and tcp.dport is self.port and len(tcp.data) is not 0:
-                self.out_streams.append((len(tcp.data),tcp.data))
-            elif len(tcp.data) is not 0:
-                self.in_streams.append((len(tcp.data),tcp.data))
-        f.close()
+    def initialize(self, path):
+        self._index = PCAPIndex(path, self.ip, self.port, index_path=self.index_path)
 
-    def recv(self, length):
-        #import ipdb;ipdb.set_trace()
-        temp = 0
-        #import ipdb;ipdb.set_trace()
-        #pcap = self.pcap
-        initial_packet = self.packet_num
-        plength, pdata = self.in_streams[self.packet_num]
-        length = min(length, plength)
-        if self.pos is 0:
-            if plength > length:
-                temp = length
-            else:
-                self.packet_num += 1
+    @property
+    def in_streams(self):
+        return _PCAPStreamView(self._index.in_lengths, self._index.in_payload)
 
-            packet_data = pdata[self.pos:length]
-            self.pos += temp
-        else:
-            if (self.pos + length) >= plength:
-                rest = plength-self.pos
-                length = rest
-                self.packet_num += 1
+    @property
+    def out_streams(self):
+        return _PCAPStreamView(self._index.out_lengths, self._index.out_payload)
+
+    def recv(self, length):
+        plength = self._index.in_lengths[self.packet_num]
+        length = min(length, plength - self.pos)
 
-            packet_data = pdata[self.pos:plength]
+        packet_data = self._index.in_payload(self.packet_num, self.pos, self.pos + length)
 
-        if self.packet_num is not initial_packet:
+        self.pos += length
+        if self.pos >= plength:
+            self.packet_num += 1
             self.pos = 0
+
         return packet_data, length
 
     def copy(self):
-        new_pcap = PCAP(self.path, (self.ip, self.port), init=False)
+        new_pcap = PCAP(self.path, (self.ip, self.port), init=False, index_path=self.index_path, index=self._index)
         new_pcap.packet_num = self.packet_num
         new_pcap.pos = self.pos
-        new_pcap.in_streams = self.in_streams
-        new_pcap.out_streams = self.out_streams
         return new_pcap
+
+from .s_errors import SimPCAPError
@@ -9,6 +9,9 @@ l = logging.getLogger(name = "simuvex.s_procedure")
 
 symbolic_count = itertools.count()
 
+# SimProcedure class -> the number of arguments its run() takes
+_num_args_cache = { }
+
 from .s_run import SimRun
 from .s_cc import DefaultCC
 
@@ -54,37 +57,63 @@ class SimProcedure(SimRun):
         # prepare and run!
         if o.AUTO_REFS not in self.state.options:
             cleanup_options = True
-            self.state.options.add(o.AST_DEPS)
-            self.state.options.add(o.AUTO_REFS)
+            self.state.options.update(o.auto_refs)
         else:
             cleanup_options = False
 
-        run_spec = inspect.getargspec(self.run)
-        num_args = len(run_spec.args) - (len(run_spec.defaults) if run_spec.defaults is not None else 0) - 1
-        args = [ self.arg(_) for _ in xrange(num_args) ]
-
-        run_func = getattr(self, run_func_name)
-        r = run_func(*args, **self.kwargs)
-
-        if (self.overriding_no_ret is False) or \
-                (self.overriding_no_ret is None and not self.NO_RET):
-            self.ret(r)
+        if s_profiler.profiler is None:
+            self._run_and_ret()
+        else:
+            p = s_profiler.profiler
+            p.start('procedure', self.__class__.__name__)
+            try:
+                self._run_and_ret()
+            finally:
+                p.stop()
 
         if o.FRESHNESS_ANALYSIS in self.state.options:
             self.state.scratch.update_ignored_variables()
 
         if cleanup_options:
-            self.state.options.discard(o.AST_DEPS)
-            self.state.options.discard(o.AUTO_REFS)
+            self.state.options.difference_update(o.auto_refs)
 
         if self._inline:
             # If this is an inlined call, restore old scratch members
             self.state.scratch.bbl_addr = old_bbl_addr
             self.state.scratch.sim_procedure = old_sim_procedure
 
+    def _run_and_ret(self):
+        num_args = self.num_args()
+        if self.arguments is None and type(self).arg.__func__ is SimProcedure.arg.__func__:
+            # fetch all arguments at once, resolving their locations only once
+            args = self.cc.get_args(self.state, num_args)
+        else:
+            args = [ self.arg(_) for _ in xrange(num_args) ]
+
+        run_func = getattr(self, self.run_func_name)
+        r = run_func(*args, **self.kwargs)
+
+        if (self.overriding_no_ret is False) or \
+                (self.overriding_no_ret is None and not self.NO_RET):
+            self.ret(r)
+
     def run(self, *args, **kwargs): #pylint:disable=unused-argument
         raise SimProcedureError("%s does not implement a run() method" % self.__class__.__name__)
 
+    @classmethod
+    def num_args(cls):
+        """
+        The number of positional arguments run() takes, without the ones that have default values. It is computed once
+        per class.
+        """
+        try:
+            return _num_args_cache[cls]
+        except KeyError:
+            run_spec = inspect.getargspec(cls.run)
+            num_args = len(run_spec.args) - (len(run_spec.defaults) if run_spec.defaults is not None else 0) - 1
+            _num_args_cache[cls] = num_args
+            return num_args
+
     def reanalyze(self, new_state=None, addr=None, stmt_from=None, convention=None):
         new_state = self.initial_state.copy() if new_state is None else new_state
         addr = self.addr if addr is None else addr
@@ -175,8 +204,7 @@ class SimProcedure(SimRun):
             self.add_successor(self.state, self.ret_to, self.state.se.true, 'Ijk_Ret')
         else:
             if self.cleanup:
-                self.state.options.discard(o.AST_DEPS)
-                self.state.options.discard(o.AUTO_REFS)
+                self.state.options.difference_update(o.auto_refs)
 
             if o.KEEP_IP_SYMBOLIC in self.state.options and isinstance(self.addr, claripy.ast.Base):
                 # TODO maybe i want to keep address symbolic
@@ -195,8 +223,7 @@ class SimProcedure(SimRun):
                 ret_state = (ret_simirsb.flat_successors + ret_simirsb.unsat_successors)[0]
 
             if self.cleanup:
-                self.state.options.add(o.AST_DEPS)
-                self.state.options.add(o.AUTO_REFS)
+                self.state.options.update(o.auto_refs)
 
             self._add_successor(ret_state, ret_state.scratch.target)
 
@@ -233,8 +260,7 @@ class SimProcedure(SimRun):
         self.add_successor(self.state, addr, self.state.se.true, 'Ijk_Boring')
 
     def exit(self, exit_code):
-        self.state.options.discard(o.AST_DEPS)
-        self.state.options.discard(o.AUTO_REFS)
+        self.state.options.difference_update(o.auto_refs)
 
         if isinstance(exit_code, (int, long)):
             exit_code = self.state.se.BVV(exit_code, self.state.arch.bits)
@@ -270,6 +296,7 @@ class SimProcedureContinuation(SimProcedure):
         return self
 
 from . import s_options as o
+from . import s_profiler
 from .s_errors import SimProcedureError, SimProcedureArgumentError
 from .vex.irsb import SimIRSB
 from .s_type import SimTypePointer
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+"""
+An opt-in profiler for the simuvex hot paths.
+
+When it is enabled, it aggregates counts and wall time for the executed IRSBs (per address), SimProcedures (per class),
+solver operations (per operation, along with their call sites), memory loads and stores, and state copies and merges.
+Every measured call is also accounted to the stack of measured calls it ran under, so that the results can be rendered
+as a flame graph.
+
+    from simuvex import s_profiler
+    p = s_profiler.enable_profiling()
+    ... # run stuff
+    s_profiler.disable_profiling()
+    p.dump_json('profile.json')
+    p.dump_collapsed('profile.folded') # flamegraph.pl profile.folded > profile.svg
+"""
+
+import json
+import time
+import collections
+
+import logging
+l = logging.getLogger("simuvex.s_profiler")
+
+# the active profiler, or None when profiling is disabled
+profiler = None
+
+
+class SimProfiler(object):
+    """
+    Aggregated counters and timings.
+
+    :ivar counters: A dict of category -> key -> stats. The categories are 'irsb', 'procedure', 'solver', 'memory' and
+                    'state'. The stats are a dict with the call 'count' and the inclusive 'time' in seconds. IRSBs also
+                    have the number of executed 'statements', and solver operations have a dict of call 'sites'.
+    :ivar stacks:   A dict of call stacks (tuples of frame names) to the exclusive time spent in them, in seconds.
+    """
+
+    def __init__(self):
+        self.counters = collections.defaultdict(dict)
+        self.stacks = collections.defaultdict(float)
+        self._frames = [ ]
+        self._names = [ ]
+
+    def start(self, category, key):
+        """
+        Start measuring a call. Every start() must be paired with a stop().
+        """
+        self._names.append('%s %#x' % (category, key) if type(key) in (int, long) else '%s %s' % (category, key))
+        self._frames.append([ category, key, 0.0, time.time() ])
+
+    def stop(self, site=None, statements=None):
+        """
+        Stop measuring the innermost call, and account it.
+
+        :param site:        The call site, for solver operations.
+        :param statements:  The number of executed statements, for IRSBs.
+        """
+        end = time.time()
+        category, key, children, start = self._frames.pop()
+        duration = end - start
+
+        self.stacks[tuple(self._names)] += duration - children
+        self._names.pop()
+        if self._frames:
+            self._frames[-1][2] += duration
+
+        try:
+            stats = self.counters[category][key]
+        except KeyError:
+            stats = self.counters[category][key] = { 'count': 0, 'time': 0.0 }
+            if statements is not None:
+                stats['statements'] = 0
+            if site is not None:
+                stats['sites'] = collections.Counter()
+
+        stats['count'] += 1
+        stats['time'] += duration
+        if statements is not None:
+            stats['statements'] += statements
+        if site is not None:
+            stats['sites'][site] += 1
+
+    def clear(self):
+        self.counters.clear()
+        self.stacks.clear()
+
+    #
+    # Export
+    #
+
+    def to_dict(self):
+        """
+        The counters, as a dict that is ready to be dumped as JSON. Integer keys (the IRSB addresses) are converted to
+        hex strings.
+        """
+        return {
+            category: {
+                ('%#x' % key if type(key) in (int, long) else str(key)): dict(stats)
+                for key, stats in keyed.iteritems()
+            }
+            for category, keyed in self.counters.iteritems()
+        }
+
+    def dump_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2, sort_keys=True)
+
+    def collapsed_stacks(self):
+        """
+        The stacks in the collapsed format that flamegraph.pl reads: one line per stack, with the frames separated by
+        semicolons and followed by the exclusive time in microseconds.
+        """
+        return [ '%s %d' % (';'.join(stack), int(t * 1000000))
+                 for stack, t in sorted(self.stacks.iteritems()) if t > 0 ]
+
+    def dump_collapsed(self, path):
+        with open(path, 'w') as f:
+            for line in self.collapsed_stacks():
+                f.write(line + '\n')
+
+
+def enable_profiling(p=None):
+    """
+    Start profiling.
+
+    :param p:   The profiler to collect into. A new one is created if it is None.
+    :return:    The active profiler.
+    """
+    global profiler #pylint:disable=global-statement
+    profiler = SimProfiler() if p is None else p
+    return profiler
+
+def disable_profiling():
+    """
+    Stop profiling.
+
+    :return:    The profiler that was active, if any.
+    """
+    global profiler #pylint:disable=global-statement
+    p, profiler = profiler, None
+    return p
+
+def call_site(state):
+    """
+    A short description of where the state currently is, for the solver call sites.
+    """
+    scratch = state.scratch
+    if scratch.sim_procedure is not None:
+        return "sim_procedure %s" % scratch.sim_procedure
+    elif scratch.ins_addr is not None:
+        return "inst %#x" % scratch.ins_addr
+    elif scratch.bbl_addr is not None:
+        return "bbl %#x" % scratch.bbl_addr
+    else:
+        return "unknown"
@@ -73,8 +73,7 @@ class SimRun(object):
         state.regs.ip = target
 
         # clean up the state
-        state.options.discard(o.AST_DEPS)
-        state.options.discard(o.AUTO_REFS)
+        state.options.difference_update(o.auto_refs)
 
         return self._add_successor(state, target)
 
@@ -1,8 +1,22 @@
 
+from collections import OrderedDict
+
 import pyvex
 
 from .s_errors import SimSlicerError
 
+# The maximum number of blocks whose def-use information is kept around
+DEF_USE_CACHE_SIZE = 256
+
+# (slicer class, id(statements), arch name, initial stack pointer) -> SimBlockDefUse, least recently used first
+_def_use_cache = OrderedDict()
+
+# (slicer class, handler prefix, node type or operation) -> unbound handler, or None
+_handler_cache = { }
+
+def clear_def_use_cache():
+    _def_use_cache.clear()
+
 class SimLightState(object):
     def __init__(self, temps=None, regs=None, stack_offsets=None, options=None):
         self.temps = temps if temps is not None else set()
@@ -10,12 +24,27 @@ class SimLightState(object):
         self.stack_offsets = stack_offsets if stack_offsets is not None else set()
         self.options = {} if options is None else options
 
+class SimBlockDefUse(object):
+    """
+    The def-use summary of a block: for each statement, the location it defines (if any) and the tmps, registers and
+    stack offsets it uses to do so. It only depends on the statements and the architecture, so it is computed once per
+    block and shared by all slices of that block.
+    """
+    def __init__(self, statements, aliases, stmts_def_use):
+        self.statements = statements
+        self.aliases = aliases
+        # a list of (kind, location, SimLightState of uses) tuples, or None for statements that define nothing
+        self.stmts_def_use = stmts_def_use
+
 class SimSlicer(object):
     """
     A super lightweight intra-IRSB slicing class.
+
+    The def-use information of a block is cached, keyed by its list of statements, so that list should not be modified
+    after it has been sliced. Use slice_many() to answer several target sets against the same block at once.
     """
     def __init__(self, arch, statements, target_tmps=None, target_regs=None, target_stack_offsets=None,
-                 inslice_callback=None, inslice_callback_infodict=None):
+                 inslice_callback=None, inslice_callback_infodict=None, defer_slicing=False):
         self._arch = arch
         self._statements = statements
         self._target_tmps = target_tmps if target_tmps is not None else set()
@@ -38,8 +67,98 @@ class SimSlicer(object):
 
         self._aliases = { }
 
+        self._def_use = self._get_def_use()
+        self._aliases = self._def_use.aliases
+
+        if not defer_slicing:
+            self._slice()
+
+    @classmethod
+    def slice_many(cls, arch, statements, targets, inslice_callback=None, inslice_callback_infodict=None):
+        """
+        Slice the same block for several target sets, in a single backward pass over its statements.
+
+        :param arch:        The architecture.
+        :param statements:  The statements of the block.
+        :param targets:     An iterable of (target_tmps, target_regs, target_stack_offsets) tuples. Any of them may be
+                            None.
+        :return:            A list of SimSlicer instances, one per target set, in the same order.
+        """
+        slicers = [ cls(arch, statements, target_tmps=t, target_regs=r, target_stack_offsets=s,
+                        inslice_callback=inslice_callback, inslice_callback_infodict=inslice_callback_infodict,
+                        defer_slicing=True)
+                    for t, r, s in targets ]
+
+        if slicers:
+            cls._backward_pass(slicers[0]._def_use, slicers)
+
+        return slicers
+
+    #
+    # Def-use information
+    #
+
+    def _get_def_use(self):
+        """
+        Get the def-use information of our block, from the cache if possible.
+
+        :return: A SimBlockDefUse instance.
+        """
+        # the alias analysis mocks the stack pointer with the arch's initial value
+        key = (type(self), id(self._statements), self._arch.name, self._arch.initial_sp)
+
+        def_use = _def_use_cache.pop(key, None)
+        if def_use is not None and def_use.statements is self._statements:
+            _def_use_cache[key] = def_use
+            return def_use
+
         self._alias_analysis()
-        self._slice()
+        def_use = SimBlockDefUse(self._statements, self._aliases,
+                                 [ self._stmt_def_use(stmt) for stmt in self._statements ])
+
+        # the cache holds a reference to the statements, so their id cannot be reused while the entry lives
+        _def_use_cache[key] = def_use
+        while len(_def_use_cache) > DEF_USE_CACHE_SIZE:
+            _def_use_cache.popitem(last=False)
+
+        return def_use
+
+    def _stmt_def_use(self, stmt):
+        """
+        Get the location a statement defines, and what it uses to define it.
+
+        :return: A (kind, location, SimLightState) tuple, where kind is one of 'tmp', 'reg' and 'stack', or None if the
+                 statement does not define any location we track.
+        """
+        handler = self._handler("_backward_handler_stmt_", type(stmt).__name__)
+        if handler is None:
+            return None
+
+        uses = SimLightState()
+        defined = handler(self, stmt, uses)
+        if defined is None:
+            return None
+
+        kind, location = defined
+        return kind, location, uses
+
+    #
+    # Handler dispatch
+    #
+
+    def _handler(self, prefix, name):
+        """
+        Look up the handler method `prefix + name`, caching the result per class.
+
+        :return: The unbound method, or None if there is no such handler.
+        """
+        key = (type(self), prefix, name)
+        try:
+            return _handler_cache[key]
+        except KeyError:
+            handler = getattr(type(self), prefix + name, None)
+            _handler_cache[key] = handler
+            return handler
 
     def _alias_analysis(self, mock_sp=True, mock_bp=True):
         """
@@ -81,10 +200,10 @@ class SimSlicer(object):
         :return:
         """
 
-        funcname = "_forward_handler_stmt_%s" % type(stmt).__name__
+        handler = self._handler("_forward_handler_stmt_", type(stmt).__name__)
 
-        if hasattr(self, funcname):
-            getattr(self, funcname)(stmt, state)
+        if handler is not None:
+            handler(self, stmt, state)
 
     def _forward_handler_stmt_WrTmp(self, stmt, state):
         tmp = stmt.tmp
@@ -107,10 +226,10 @@ class SimSlicer(object):
         :return:
         """
 
-        funcname = "_forward_handler_expr_%s" % type(expr).__name__
+        handler = self._handler("_forward_handler_expr_", type(expr).__name__)
 
-        if hasattr(self, funcname):
-            return getattr(self, funcname)(expr, state)
+        if handler is not None:
+            return handler(self, expr, state)
 
         return None
 
@@ -139,13 +258,13 @@ class SimSlicer(object):
 
     def _forward_handler_expr_Binop(self, expr, state):
 
-        funcname = "_forward_handler_expr_binop_%s" % expr.op.strip("Iop_")
+        handler = self._handler("_forward_handler_expr_binop_", expr.op.strip("Iop_"))
 
-        if hasattr(self, funcname):
+        if handler is not None:
             op0_val = self._forward_handler_expr(expr.args[0], state)
             op1_val = self._forward_handler_expr(expr.args[1], state)
             if op0_val is not None and op1_val is not None:
-                return getattr(self, funcname)(op0_val, op1_val, state)
+                return handler(self, op0_val, op1_val, state)
 
         return None
 
@@ -162,65 +281,87 @@ class SimSlicer(object):
         Slice it!
         """
 
-        regs = set(self._target_regs)
-        tmps = set(self._target_tmps)
-        stack_offsets = set(self._target_stack_offsets)
+        self._backward_pass(self._def_use, [ self ])
 
-        state = SimLightState(regs=regs, temps=tmps, stack_offsets=stack_offsets)
-
-        for stmt_idx, stmt in reversed(list(enumerate(self._statements))):
-            if self._backward_handler_stmt(stmt, state):
-                self.stmts.insert(0, stmt)
-                self.stmt_indices.insert(0, stmt_idx)
+    @staticmethod
+    def _backward_pass(def_use, slicers):
+        """
+        Walk the statements of a block backwards once, and slice it for each of the slicers.
 
-                if self._inslice_callback:
-                    self._inslice_callback(stmt_idx, stmt, self.inslice_callback_infodict)
+        :param SimBlockDefUse def_use: The def-use information of the block.
+        :param list slicers:           SimSlicer instances of that block.
+        :return: None
+        """
 
-            if not regs and not tmps:
-                break
+        # (slicer, state, indices of the statements in its slice) tuples
+        states = [ ]
+        for slicer in slicers:
+            state = SimLightState(regs=set(slicer._target_regs), temps=set(slicer._target_tmps),
+                                  stack_offsets=set(slicer._target_stack_offsets))
+            states.append((slicer, state, [ ]))
 
-        self.final_regs = state.regs
-        self.final_stack_offsets = state.stack_offsets
+        statements = def_use.statements
+        stmts_def_use = def_use.stmts_def_use
 
-    #
-    # Backward slice IRStmt handlers
-    #
+        active = list(states)
+        for stmt_idx in xrange(len(statements) - 1, -1, -1):
+            if not active:
+                break
 
-    def _backward_handler_stmt(self, stmt, state):
-        funcname = "_backward_handler_stmt_%s" % type(stmt).__name__
+            stmt_def_use = stmts_def_use[stmt_idx]
+            still_active = [ ]
 
-        in_slice = False
-        if hasattr(self, funcname):
-            in_slice = getattr(self, funcname)(stmt, state)
+            for slicer, state, indices in active:
+                if stmt_def_use is not None:
+                    kind, loc, uses = stmt_def_use
+                    if kind == 'tmp':
+                        defined = state.temps
+                    elif kind == 'reg':
+                        defined = state.regs
+                    else:
+                        defined = state.stack_offsets
 
-        return in_slice
+                    if loc in defined:
+                        defined.remove(loc)
+                        state.temps |= uses.temps
+                        state.regs |= uses.regs
+                        state.stack_offsets |= uses.stack_offsets
 
-    def _backward_handler_stmt_WrTmp(self, stmt, state):
-        tmp = stmt.tmp
+                        indices.append(stmt_idx)
 
-        if tmp not in state.temps:
-            return False
+                        if slicer._inslice_callback:
+                            slicer._inslice_callback(stmt_idx, statements[stmt_idx], slicer.inslice_callback_infodict)
 
-        state.temps.remove(tmp)
+                if state.regs or state.temps:
+                    still_active.append((slicer, state, indices))
 
-        self._backward_handler_expr(stmt.data, state)
+            active = still_active
 
-        return True
+        for slicer, state, indices in states:
+            indices.reverse()
+            slicer.stmt_indices = indices
+            slicer.stmts = [ statements[i] for i in indices ]
+            slicer.final_regs = state.regs
+            slicer.final_stack_offsets = state.stack_offsets
 
-    def _backward_handler_stmt_Put(self, stmt, state):
-        reg = stmt.offset
+    #
+    # Backward slice IRStmt handlers
+    #
+    # They return the (kind, location) a statement defines, or None, and add what it uses to define it to `uses`. Their
+    # results are cached per block (see _stmt_def_use()), so they must only depend on the statement and the aliases.
+    #
 
-        if reg in state.regs:
-            state.regs.remove(reg)
+    def _backward_handler_stmt_WrTmp(self, stmt, uses):
+        self._backward_handler_expr(stmt.data, uses)
 
-            self._backward_handler_expr(stmt.data, state)
+        return 'tmp', stmt.tmp
 
-            return True
+    def _backward_handler_stmt_Put(self, stmt, uses):
+        self._backward_handler_expr(stmt.data, uses)
 
-        else:
-            return False
+        return 'reg', stmt.offset
 
-    def _backward_handler_stmt_Store(self, stmt, state):
+    def _backward_handler_stmt_Store(self, stmt, uses):
 
         addr = stmt.addr
 
@@ -229,26 +370,22 @@ class SimSlicer(object):
 
             if tmp in self._aliases:
                 # We know its value
-                concrete_addr = self._aliases[tmp]
-                if concrete_addr in state.stack_offsets:
-                    # It's written at this statement
-                    state.stack_offsets.remove(concrete_addr)
-                    self._backward_handler_expr(addr, state)
-                    self._backward_handler_expr(stmt.data, state)
+                self._backward_handler_expr(addr, uses)
+                self._backward_handler_expr(stmt.data, uses)
 
-                    return True
+                return 'stack', self._aliases[tmp]
 
-        return False
+        return None
 
     #
     # Backward slice IRExpr handlers
     #
 
     def _backward_handler_expr(self, expr, state):
-        funcname = "_backward_handler_expr_%s" % type(expr).__name__
+        handler = self._handler("_backward_handler_expr_", type(expr).__name__)
         in_slice = False
-        if hasattr(self, funcname):
-            in_slice = getattr(self, funcname)(expr, state)
+        if handler is not None:
+            in_slice = handler(self, expr, state)
 
         return in_slice
 
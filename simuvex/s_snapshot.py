@@ -0,0 +1,262 @@
+#!/usr/bin/env python
+"""
+A compact binary format for moving states between processes.
+
+A snapshot is a table of entries followed by the roots (the states). Everything that is shared between the states of
+a snapshot is written to the table once and referred to by index from everywhere else:
+
+- the claripy ASTs, along with their DAG structure,
+- the memory pages, deduplicated by content: two pages that hold the same memory objects are written once and are
+  shared (copy-on-write) by the memories they are decoded into,
+- the memory objects that were loaded from a cle.Clemory backer. They are written as a reference to the backer and a
+  range, rather than as their bytes. If the backers are given by name to dump_states() and load_states(), the backer
+  itself is not written at all.
+
+    data = dump_states(states, backers={ 'main': project.loader.memory })
+    states = load_states(data, backers={ 'main': project.loader.memory })
+
+Everything else is pickled, and the storables (states, plugins, ASTs) go through their ANA state.
+"""
+
+import cPickle
+import weakref
+import collections
+from cStringIO import StringIO
+
+import ana
+import claripy
+import cle
+
+from .s_errors import SimSnapshotError
+
+import logging
+l = logging.getLogger("simuvex.s_snapshot")
+
+MAGIC = 'SIMSNAP'
+VERSION = 1
+
+# these are pickled as they are, without asking the table about them
+_INLINE_TYPES = frozenset((int, long, float, bool, str, unicode, type(None), tuple, list, dict, set, frozenset, type))
+_PROXY_TYPES = (weakref.ProxyType, weakref.CallableProxyType)
+
+_NONE_REF = ('n',)
+
+
+class SnapshotEncoder(object):
+    """
+    Encodes a batch of states into a snapshot.
+
+    :ivar stats:    A counter of what was written: 'entries', 'asts', 'storables', 'objects', 'pages',
+                    'deduplicated_pages' and 'backer_objects'.
+    """
+
+    def __init__(self, backers=None):
+        """
+        :param backers: A dict of name -> cle.Clemory, for the memory backers that the decoding side has too.
+        """
+        self.stats = collections.Counter()
+
+        self._entries = [ ]
+        self._refs = { }        # id(object) -> ref
+        self._page_refs = { }   # page content key -> ref
+        self._keep = [ ]        # the encoded objects, so that their ids stay valid
+        self._pending = set()   # ids of the objects that are being encoded
+        self._current = None
+
+        for name, backer in (backers or { }).iteritems():
+            self._refs[id(backer)] = ('x', name)
+            self._keep.append(backer)
+
+    def encode(self, states):
+        """
+        Encode some states.
+
+        :param states:  The states.
+        :return:        The snapshot, as a string.
+        """
+        roots = [ self._ref(s) for s in states ]
+        self.stats['entries'] = len(self._entries)
+        return MAGIC + chr(VERSION) + cPickle.dumps((self._entries, roots), 2)
+
+    #
+    # The table
+    #
+
+    def _add(self, obj, kind, payload):
+        ref = ('r', len(self._entries))
+        self._entries.append((kind, payload))
+        self._refs[id(obj)] = ref
+        self._keep.append(obj)
+        return ref
+
+    def _pickle(self, obj, payload=None):
+        """
+        Pickle an object, or its payload, with the objects it refers to written to the table first.
+        """
+        if id(obj) in self._pending:
+            raise SimSnapshotError("%s refers back to itself, which snapshots do not support" % type(obj).__name__)
+
+        buf = StringIO()
+        p = cPickle.Pickler(buf, 2)
+        p.persistent_id = self._persistent_id
+
+        outer, self._current = self._current, obj
+        self._pending.add(id(obj))
+        try:
+            p.dump(obj if payload is None else payload)
+        finally:
+            self._pending.discard(id(obj))
+            self._current = outer
+        return buf.getvalue()
+
+    def _ref(self, obj):
+        """
+        Write an object to the table, if it is not there already.
+
+        :return: The reference to the object.
+        """
+        try:
+            return self._refs[id(obj)]
+        except KeyError:
+            pass
+
+        if isinstance(obj, claripy.ast.Base):
+            self._encode_ast_tree(obj)
+            return self._refs[id(obj)]
+        elif isinstance(obj, ana.Storable):
+            self.stats['storables'] += 1
+            return self._add(obj, 's', self._pickle(obj, (type(obj), obj._ana_getstate())))
+        elif isinstance(obj, Page):
+            return self._page_ref(obj)
+        elif isinstance(obj, SimMemoryObject) and obj._backer is not None:
+            self.stats['backer_objects'] += 1
+            return self._add(obj, 'b', (self._ref(obj._backer), obj.base, obj.length))
+        else:
+            self.stats['objects'] += 1
+            return self._add(obj, 'o', self._pickle(obj))
+
+    def _page_ref(self, page):
+        key = page.content_key()
+        try:
+            ref = self._page_refs[key]
+        except KeyError:
+            self.stats['pages'] += 1
+            ref = self._page_refs[key] = self._add(page, 'o', self._pickle(page))
+        else:
+            self.stats['deduplicated_pages'] += 1
+            self._refs[id(page)] = ref
+            self._keep.append(page)
+        return ref
+
+    def _encode_ast_tree(self, root):
+        # the children go first, without recursing, since ASTs can be very deep
+        stack = [ (root, False) ]
+        while stack:
+            a, expanded = stack.pop()
+            if id(a) in self._refs:
+                continue
+            if expanded:
+                self.stats['asts'] += 1
+                self._add(a, 's', self._pickle(a, (type(a), a._ana_getstate())))
+            else:
+                stack.append((a, True))
+                stack.extend((c, False) for c in a.args if isinstance(c, claripy.ast.Base) and id(c) not in self._refs)
+
+    def _persistent_id(self, obj):
+        t = type(obj)
+        if t in _INLINE_TYPES or obj is self._current:
+            return None
+        elif t in _PROXY_TYPES or isinstance(obj, SimState):
+            # the back-references to the states are restored when the states register their plugins
+            return _NONE_REF
+        elif isinstance(obj, (ana.Storable, Page, SimMemoryObject, cle.Clemory)):
+            return self._ref(obj)
+        else:
+            return None
+
+
+class SnapshotDecoder(object):
+    """
+    Decodes a snapshot.
+    """
+
+    def __init__(self, backers=None):
+        """
+        :param backers: A dict of name -> cle.Clemory, for the backers the snapshot refers to by name.
+        """
+        self._backers = backers or { }
+        self._objects = [ ]
+
+    def decode(self, data):
+        """
+        Decode a snapshot.
+
+        :param data:    The snapshot, as a string.
+        :return:        The list of states.
+        """
+        if not data.startswith(MAGIC):
+            raise SimSnapshotError("not a state snapshot")
+        version = ord(data[len(MAGIC)])
+        if version != VERSION:
+            raise SimSnapshotError("unsupported snapshot version %d" % version)
+
+        entries, roots = cPickle.loads(data[len(MAGIC)+1:])
+        for kind, payload in entries:
+            if kind == 's':
+                cls, s = self._unpickle(payload)
+                self._objects.append(ana.D(None, cls, s))
+            elif kind == 'o':
+                self._objects.append(self._unpickle(payload))
+            elif kind == 'b':
+                backer_ref, base, length = payload
+                backer = self._persistent_load(backer_ref)
+                mo = SimMemoryObject(claripy.BVV(backer_bytes(backer, base, length)), base)
+                mo._backer = backer
+                self._objects.append(mo)
+            else:
+                raise SimSnapshotError("unknown snapshot entry kind %r" % kind)
+
+        return [ self._persistent_load(r) for r in roots ]
+
+    def _unpickle(self, payload):
+        u = cPickle.Unpickler(StringIO(payload))
+        u.persistent_load = self._persistent_load
+        return u.load()
+
+    def _persistent_load(self, ref):
+        if ref[0] == 'r':
+            return self._objects[ref[1]]
+        elif ref[0] == 'n':
+            return None
+        elif ref[0] == 'x':
+            try:
+                return self._backers[ref[1]]
+            except KeyError:
+                raise SimSnapshotError("the snapshot refers to memory backer %r, which was not provided" % ref[1])
+        else:
+            raise SimSnapshotError("unknown snapshot reference %r" % (ref,))
+
+
+def dump_states(states, backers=None):
+    """
+    Encode some states into a snapshot.
+
+    :param states:  The states.
+    :param backers: A dict of name -> cle.Clemory, for the memory backers that should be referred to by name.
+    :return:        The snapshot, as a string.
+    """
+    return SnapshotEncoder(backers=backers).encode(states)
+
+def load_states(data, backers=None):
+    """
+    Decode the states of a snapshot.
+
+    :param data:    The snapshot, as a string.
+    :param backers: A dict of name -> cle.Clemory, for the memory backers that the snapshot refers to by name.
+    :return:        The list of states.
+    """
+    return SnapshotDecoder(backers=backers).decode(data)
+
+from .s_state import SimState
+from .storage.paged_memory import Page, backer_bytes
+from .storage.memory_object import SimMemoryObject
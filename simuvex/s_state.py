@@ -27,6 +27,157 @@ from .plugins import default_plugins
 # This is a counter for the state-merging symbolic variables
 merge_counter = itertools.count()
 
+class SharedPlugin(object):
+    """
+    A plugin instance that is shared by several states after a fork. None of them owns it, so it is never modified in
+    place: a state that accesses it gets its own copy, unless it is the last state holding it, in which case it takes
+    the instance over.
+    """
+
+    __slots__ = ('plugin', 'holders')
+
+    def __init__(self, plugin, holders):
+        self.plugin = plugin
+        self.holders = holders
+
+    def acquire(self):
+        self.holders -= 1
+        if self.holders == 0:
+            return self.plugin
+        return self.plugin.copy()
+
+    def release(self):
+        self.holders -= 1
+
+def _is_alive(state):
+    """
+    Whether a plugin's state is still there. Plugins are bound to weak proxies of their states.
+    """
+    if state is None:
+        return False
+    try:
+        state.plugins
+    except ReferenceError:
+        return False
+    return True
+
+class SimStatePlugins(dict):
+    """
+    The plugins of a state. Plugins shared with other states after a fork are copied when they are first accessed
+    through this dict.
+    """
+
+    def __init__(self, state):
+        super(SimStatePlugins, self).__init__()
+        self._state = weakref.proxy(state)
+        # release our shared plugins when the state goes away, so that the other holders do not need to copy them
+        self._state_ref = weakref.ref(state, self._release_shared)
+
+    def _release_shared(self, _):
+        for name, p in dict.items(self):
+            if type(p) is SharedPlugin:
+                p.release()
+                dict.__delitem__(self, name)
+
+    def __getitem__(self, name):
+        p = dict.__getitem__(self, name)
+        if type(p) is SharedPlugin:
+            # copying the plugin may need a state. The instance is only rebound when the state it is bound to is gone,
+            # since it is still in use by that state otherwise, even while it is being copied.
+            if not _is_alive(p.plugin.state):
+                p.plugin.set_state(self._state)
+            p = p.acquire()
+            dict.__setitem__(self, name, p)
+            self._state.register_plugin(name, p)
+        return p
+
+    def __setitem__(self, name, p):
+        old = dict.get(self, name, None)
+        if type(old) is SharedPlugin:
+            old.release()
+        dict.__setitem__(self, name, p)
+
+    def __delitem__(self, name):
+        p = dict.__getitem__(self, name)
+        if type(p) is SharedPlugin:
+            p.release()
+        dict.__delitem__(self, name)
+
+    def get(self, name, default=None):
+        return self[name] if name in self else default
+
+    def itervalues(self):
+        for name in self.keys():
+            yield self[name]
+
+    def iteritems(self):
+        for name in self.keys():
+            yield name, self[name]
+
+    def values(self):
+        return list(self.itervalues())
+
+    def items(self):
+        return list(self.iteritems())
+
+    # the other ways dict has to hand out plugins go through __getitem__ as well, so that no SharedPlugin leaks out.
+    # Views cannot copy plugins as they are iterated, so the view methods return lists.
+
+    viewvalues = values
+    viewitems = items
+
+    def copy(self):
+        return dict(self.iteritems())
+
+    def pop(self, name, *default):
+        if name not in self:
+            if default:
+                return default[0]
+            raise KeyError(name)
+        p = self[name]
+        dict.__delitem__(self, name)
+        return p
+
+    def popitem(self):
+        for name in self.keys():
+            return name, self.pop(name)
+        raise KeyError('popitem(): dictionary is empty')
+
+    def setdefault(self, name, default=None):
+        if name in self:
+            return self[name]
+        self[name] = default
+        return default
+
+    def update(self, *args, **kwargs):
+        for name, p in dict(*args, **kwargs).iteritems():
+            self[name] = p
+
+    def share(self, name, p):
+        """
+        Add a plugin that is shared with other states, without binding it to our state.
+        """
+        dict.__setitem__(self, name, p)
+
+    def fork(self):
+        """
+        Share all our plugins with a new state. Plugins that keep no per-state data are left out, since the new state
+        creates them on demand.
+
+        :return: A dict of SharedPlugin instances for the new state.
+        """
+        forked = { }
+        for name, p in dict.items(self):
+            if type(p) is SharedPlugin:
+                p.holders += 1
+            elif p.STATELESS and default_plugins.get(name, None) is type(p):
+                continue
+            else:
+                p = SharedPlugin(p, 2)
+                dict.__setitem__(self, name, p)
+            forked[name] = p
+        return forked
+
 class SimState(ana.Storable): # pylint: disable=R0904
     """
     The SimState represents the state of a program, including its memory, registers, and so forth.
@@ -56,10 +207,13 @@ class SimState(ana.Storable): # pylint: disable=R0904
         self.mode = mode
 
         # plugins
-        self.plugins = { }
+        self.plugins = SimStatePlugins(self)
         if plugins is not None:
             for n,p in plugins.iteritems():
-                self.register_plugin(n, p)
+                if type(p) is SharedPlugin:
+                    self.plugins.share(n, p)
+                else:
+                    self.register_plugin(n, p)
 
         if not self.has_plugin('memory'):
             # we don't set the memory endness because, unlike registers, it's hard to understand
@@ -99,8 +253,15 @@ class SimState(ana.Storable): # pylint: disable=R0904
 
     def _ana_setstate(self, s):
         ana.Storable._ana_setstate(self, s)
-        for p in self.plugins.values():
-            p.set_state(self._get_weakref() if not isinstance(p, SimAbstractMemory) else self)
+        plugins = self.plugins
+        self.plugins = SimStatePlugins(self)
+        for n,p in plugins.iteritems():
+            self.register_plugin(n, p)
+
+    def __reduce__(self):
+        # copies of a state get their UUID lazily
+        self.make_uuid()
+        return ana.Storable.__reduce__(self)
 
     def _get_weakref(self):
         return weakref.proxy(self)
@@ -317,24 +478,74 @@ class SimState(ana.Storable): # pylint: disable=R0904
     # State branching operations
     #
 
-    # Returns a dict that is a copy of all the state's plugins
+    # Returns a dict of the state's plugins for a copy of the state. They are shared with the copy until either state
+    # accesses them.
     def _copy_plugins(self):
-        return { n: p.copy() for n,p in self.plugins.iteritems() }
+        return self.plugins.fork()
+
+    def footprint(self, seen=None):
+        """
+        Reports how much memory the state holds, per plugin. Plugins that are still shared with other states are looked
+        at without being copied.
+
+        :param seen:    A set of the ids of the objects that were already accounted for, which are not counted again.
+                        simuvex.s_footprint.footprint() passes the same set for several states to deduplicate the
+                        structure they share.
+        :return:        A dict of plugin name -> dict of counters. Each of them has a 'shared' flag, telling whether
+                        the plugin is still shared with other states.
+        """
+        seen = set() if seen is None else seen
+
+        report = { }
+        for name, p in dict.items(self.plugins):
+            shared = type(p) is SharedPlugin
+            if shared:
+                p = p.plugin
+            if id(p) in seen:
+                continue
+            seen.add(id(p))
+
+            report[name] = p.footprint(seen)
+            report[name]['shared'] = shared
+        return report
 
     def copy(self):
         """
         Returns a copy of the state.
         """
+        if s_profiler.profiler is None:
+            return self._copy_state()
+        else:
+            p = s_profiler.profiler
+            p.start('state', 'copy')
+            try:
+                return self._copy_state()
+            finally:
+                p.stop()
 
+    def _copy_state(self):
         if self._global_condition is not None:
             raise SimStateError("global condition was not cleared before state.copy().")
 
-        c_arch = self.arch.copy()
-        c_plugins = self._copy_plugins()
-        state = SimState(arch=c_arch, plugins=c_plugins, options=self.options, mode=self.mode)
+        # this is the hottest constructor we have, so __init__ is bypassed
+        state = type(self).__new__(type(self))
+
+        # the arch is shared. Code that needs to modify it (like x86g_dirtyhelper_write_cr0) swaps in a copy first.
+        state.arch = self.arch
+        # the options are copied, not shared copy-on-write: copying the set is cheap, while anything other than a
+        # plain set makes the `o.X in state.options` checks all over the hot paths slower
+        state.options = set(self.options)
+        state.mode = self.mode
+
+        state.plugins = SimStatePlugins(state)
+        for n,p in self._copy_plugins().iteritems():
+            state.plugins.share(n, p)
 
+        # like in __init__, except that the UUID is only made when the state is first stored
+        state._satisfiable = True
         state.uninitialized_access_handler = self.uninitialized_access_handler
         state._special_memory_filler = self._special_memory_filler
+        state._global_condition = None
         state.ip_constraints = self.ip_constraints
 
         return state
@@ -346,6 +557,17 @@ class SimState(ana.Storable): # pylint: disable=R0904
         :param others: the other states to merge
         :return: (merged state, merge flag, a bool indicating if any merging occured)
         """
+        if s_profiler.profiler is None:
+            return self._merge_states(*others)
+        else:
+            p = s_profiler.profiler
+            p.start('state', 'merge')
+            try:
+                return self._merge_states(*others)
+            finally:
+                p.stop()
+
+    def _merge_states(self, *others):
         # TODO: maybe make the length of this smaller? Maybe: math.ceil(math.log(len(others)+1, 2))
         merge_flag = self.se.BVS("state_merge_%d" % merge_counter.next(), 16)
         merge_values = range(len(others)+1)
@@ -627,3 +849,4 @@ from .s_errors import SimMergeError, SimValueError, SimStateError
 from .plugins.inspect import BP_AFTER, BP_BEFORE
 from .s_action import SimActionConstraint
 from . import s_options as o
+from . import s_profiler
@@ -107,12 +107,12 @@ class SimVariableSet(collections.MutableSet):
         # representing register offsets..
         # There shouldn't be any problem apart from GetI/PutI instructions. We simply ignore them for now.
         # TODO: Take care of register offsets that are not aligned to (arch.bits/8)
-        self.register_variable_offsets = set()
+        self.register_variable_offsets = SimIntervalSet()
 
         # memory_variables holds SimMemoryVariable objects
         self.memory_variables = set()
-        # For the sake of performance, we have another set that stores memory addresses of memory_variables
-        self.memory_variable_addresses = set()
+        # For the sake of performance, we have another set that stores memory addresses of memory_variables, as ranges
+        self.memory_variable_addresses = SimIntervalSet()
 
     def add(self, item):
         if type(item) is SimRegisterVariable:
@@ -132,8 +132,7 @@ class SimVariableSet(collections.MutableSet):
     def add_memory_variable(self, mem_var):
         self.memory_variables.add(mem_var)
         base_address = mem_var.addr.address # Dealing with AddressWrapper
-        for i in xrange(mem_var.size):
-            self.memory_variable_addresses.add(base_address + i)
+        self.memory_variable_addresses.add_range(base_address, base_address + mem_var.size)
 
     def discard(self, item):
         if type(item) is SimRegisterVariable:
@@ -152,8 +151,7 @@ class SimVariableSet(collections.MutableSet):
 
     def discard_memory_variable(self, mem_var):
         self.memory_variables.remove(mem_var)
-        for i in xrange(mem_var.size):
-            self.memory_variable_addresses.remove(mem_var.addr.address + i)
+        self.memory_variable_addresses.discard_range(mem_var.addr.address, mem_var.addr.address + mem_var.size)
 
     def __len__(self):
         return len(self.register_variables) + len(self.memory_variables)
@@ -201,6 +199,7 @@ class SimVariableSet(collections.MutableSet):
     def contains_memory_variable(self, mem_var):
         a = mem_var.addr
         if type(a) in (tuple, list): a = a[-1]
+        if isinstance(a, AddressWrapper): a = a.address
 
         return a in self.memory_variable_addresses
 
@@ -210,6 +209,7 @@ class SimVariableSet(collections.MutableSet):
         self.register_variable_offsets |= other.register_variable_offsets
         self.memory_variables |= other.memory_variables
         self.memory_variable_addresses |= other.memory_variable_addresses
+        return self
 
     def __contains__(self, item):
         if type(item) is SimRegisterVariable:
@@ -225,3 +225,4 @@ class SimVariableSet(collections.MutableSet):
             raise Exception("WTF is this variable?")
 
 from .storage.memory import AddressWrapper
+from .s_interval import SimIntervalSet
@@ -1,4 +1,5 @@
 from .file import SimFile
 from .memory import SimMemory
-from .memory_object import SimMemoryObject
-from .paged_memory import SimPagedMemory
+from .memory_object import SimMemoryObject, SimRepeatedMemoryObject
+from .paged_memory import SimPagedMemory, page_interning_stats
+from .page_source import SimPageSource
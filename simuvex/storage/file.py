@@ -39,13 +39,25 @@ def _deps_unpack(a):
         return a, None, None
 
 
+def _concrete_value(a):
+    """
+    Returns the integer value of `a`, or None if it is symbolic.
+    """
+    a = _deps_unpack(a)[0]
+    if isinstance(a, (int, long)):
+        return a
+    if a.symbolic:
+        return None
+    return a._model_concrete.value
+
+
 class SimFile(SimStatePlugin):
     """
     Represents a file.
     """
 
     # Creates a SimFile
-    def __init__(self, name, mode, pos=0, content=None, size=None, closed=None):
+    def __init__(self, name, mode, pos=0, content=None, size=None, closed=None, extent=None):
         super(SimFile, self).__init__()
         self.name = name
         self.mode = mode
@@ -57,6 +69,12 @@ class SimFile(SimStatePlugin):
         self.content = SimSymbolicMemory(memory_id="file_%s_%d" % (name, file_counter.next())) if content is None else content
         self.closed = False if closed is None else closed
 
+        # The (start, end) range of offsets that have been written to or read from the content, tracked as the file is
+        # accessed. None means the file is empty. If we are handed a content memory without an extent, we have no idea
+        # what is in there until we look.
+        self._extent = extent
+        self._extent_known = content is None or extent is not None
+
     @property
     def read_pos(self):
         return self.pos
@@ -109,6 +127,7 @@ class SimFile(SimStatePlugin):
             remaining = self.size - self.pos
             read_length = self.state.se.If(remaining < length, remaining, length)
 
+        self._update_extent(self.pos, read_length)
         self.content.copy_contents(dst_addr, self.pos, read_length , dst_memory=self.state.memory)
 
         self.read_pos += _deps_unpack(read_length)[0]
@@ -123,6 +142,7 @@ class SimFile(SimStatePlugin):
             remaining = self.size - self.pos
             read_length = self.state.se.If(remaining < length, remaining, length)
 
+        self._update_extent(self.pos, read_length)
         data = self.content.load(self.pos, read_length)
         self.read_pos += _deps_unpack(read_length)[0]
         return data
@@ -132,6 +152,13 @@ class SimFile(SimStatePlugin):
         # TODO: something about length
         # TODO: check file close status
 
+        data = _deps_unpack(content)[0]
+        if isinstance(data, str):
+            self._update_extent(self.pos, len(data))
+        elif isinstance(data, claripy.ast.Bits):
+            self._update_extent(self.pos, len(data) / 8)
+        else:
+            self._update_extent(self.pos, self.state.arch.bytes)
         self.content.store(self.pos, content)
         self.write_pos += _deps_unpack(length)[0]
         return length
@@ -146,19 +173,91 @@ class SimFile(SimStatePlugin):
 
     # Copies the SimFile object.
     def copy(self):
-        return SimFile(self.name, self.mode, pos=self.pos, content=self.content.copy(), size=self.size, closed=self.closed)
+        return SimFile(self.name, self.mode, pos=self.pos, content=self.content.copy(), size=self.size, closed=self.closed, extent=self._extent if self._extent_known else None)
 
-    def all_bytes(self):
-        indexes = self.content.mem.keys()
-        if len(indexes) == 0:
+    #
+    # Content extent
+    #
+
+    def _update_extent(self, pos, length):
+        """
+        Grows the tracked extent of the file to cover `length` bytes at `pos`. If either is symbolic, the extent is
+        forgotten and will be recovered from the content memory the next time it is needed.
+        """
+        if not self._extent_known:
+            return
+
+        pos = _concrete_value(pos)
+        length = _concrete_value(length)
+        if pos is None or length is None:
+            self._extent_known = False
+        elif length > 0:
+            if self._extent is None:
+                self._extent = (pos, pos + length)
+            else:
+                self._extent = (min(self._extent[0], pos), max(self._extent[1], pos + length))
+
+    @property
+    def extent(self):
+        """
+        The (start, end) range of offsets holding content in this file, or None if the file is empty.
+        """
+        if not self._extent_known:
+            self._extent = self.content.mem.extent()
+            self._extent_known = True
+        return self._extent
+
+    def _nonempty_extent(self):
+        extent = self.extent
+        if extent is None:
             raise SimFileError('no content in file %s' % self.name)
+        return extent
+
+    def all_bytes(self):
+        """
+        Returns the whole content of the file as a single AST.
+        """
+        start, end = self._nonempty_extent()
+        return self.content.load(start, end - start)
+
+    def concrete_bytes(self):
+        """
+        Returns the content of the file as a string, without going through the solver. If any part of the content is
+        symbolic (or was never written), None is returned and the caller should fall back to all_bytes().
+        """
+        start, end = self._nonempty_extent()
+        the_bytes, missing = self.content.mem.load_bytes(start, end - start)
+        if len(missing) > 0:
+            return None
+
+        offsets = sorted(the_bytes)
+        chunks = [ ]
+        for i, off in enumerate(offsets):
+            mo = the_bytes[off]
+            if not isinstance(mo, SimMemoryObject):
+                return None
+
+            run_length = (offsets[i+1] if i + 1 < len(offsets) else end - start) - off
+            data = mo.bytes_at(start + off, run_length)
+            if data.symbolic:
+                return None
 
-        min_idx = min(indexes)
-        max_idx = max(indexes)
-        buff = [ ]
-        for i in range(min_idx, max_idx+1):
-            buff.append(self.content.load(i, 1))
-        return self.state.se.Concat(*buff)
+            chunks.append(("%x" % data._model_concrete.value).zfill(run_length * 2).decode('hex'))
+
+        return ''.join(chunks)
+
+    def content_chunks(self, chunk_size=0x1000):
+        """
+        Iterates over the content of the file as (offset, AST) pairs of at most `chunk_size` bytes each, so that large
+        symbolic files can be processed without building a single giant AST.
+        """
+        extent = self.extent
+        if extent is None:
+            return
+
+        start, end = extent
+        for off in xrange(start, end, chunk_size):
+            yield off, self.content.load(off, min(chunk_size, end - off))
 
     def merge(self, others, merge_flag, flag_values):
         """
@@ -192,6 +291,12 @@ class SimFile(SimStatePlugin):
         #if len(set(o.mode for o in all_files)) > 1:
         #   raise SimMergeError("merging modes is not yet supported (TODO)")
 
+        if all(o._extent_known for o in all_files):
+            extents = [ o._extent for o in all_files if o._extent is not None ]
+            self._extent = (min(e[0] for e in extents), max(e[1] for e in extents)) if extents else None
+        else:
+            self._extent_known = False
+
         return self.content.merge([ o.content for o in others ], merge_flag, flag_values)
 
 class SimDialogue(SimFile):
@@ -199,8 +304,8 @@ class SimDialogue(SimFile):
     Emulates a dialogue with a program. Enables us to perform concrete short reads.
     """
 
-    def __init__(self, name, mode=None, pos=0, content=None, size=None, dialogue_entries=None):
-        super(SimDialogue, self).__init__(name, mode=mode, pos=pos, content=content, size=size)
+    def __init__(self, name, mode=None, pos=0, content=None, size=None, dialogue_entries=None, extent=None):
+        super(SimDialogue, self).__init__(name, mode=mode, pos=pos, content=content, size=size, extent=extent)
 
         self.dialogue_entries = [ ] if dialogue_entries is None else dialogue_entries
 
@@ -246,10 +351,12 @@ class SimDialogue(SimFile):
         length_c = lengths[0]
 
         if current_pkt_length <= length_c:
+            self._update_extent(self.pos, current_pkt_length)
             self.content.copy_contents(dst_addr, self.pos, current_pkt_length, dst_memory=self.state.memory)
             return_length = current_pkt_length
 
         else:
+            self._update_extent(self.pos, length_c)
             self.content.copy_contents(dst_addr, self.pos, length_c, dst_memory=self.state.memory)
             return_length = length_c
 
@@ -263,7 +370,8 @@ class SimDialogue(SimFile):
 
     # Copies the SimDialogue object.
     def copy(self):
-        return SimDialogue(self.name, mode=self.mode, pos=self.pos, content=self.content.copy(), size=self.size, dialogue_entries=list(self.dialogue_entries))
+        return SimDialogue(self.name, mode=self.mode, pos=self.pos, content=self.content.copy(), size=self.size, dialogue_entries=list(self.dialogue_entries), extent=self._extent if self._extent_known else None)
 
 from ..plugins.symbolic_memory import SimSymbolicMemory
+from .memory_object import SimMemoryObject
 from ..s_errors import SimMergeError, SimFileError
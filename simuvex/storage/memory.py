@@ -353,6 +353,19 @@ class SimMemory(SimStatePlugin):
         :param endness:         The endianness for the data.
         :param action:          A SimActionData to fill out with the final written value and constraints.
         """
+        if s_profiler.profiler is None:
+            return self._handle_store(addr, data, size=size, condition=condition, add_constraints=add_constraints,
+                                      endness=endness, action=action, inspect=inspect)
+        else:
+            p = s_profiler.profiler
+            p.start('memory', 'store')
+            try:
+                return self._handle_store(addr, data, size=size, condition=condition, add_constraints=add_constraints,
+                                          endness=endness, action=action, inspect=inspect)
+            finally:
+                p.stop()
+
+    def _handle_store(self, addr, data, size=None, condition=None, add_constraints=None, endness=None, action=None, inspect=True):
         addr_e = _raw_ast(addr)
         data_e = _raw_ast(data)
         size_e = _raw_ast(size)
@@ -444,6 +457,32 @@ class SimMemory(SimStatePlugin):
     def _store(self, request):
         raise NotImplementedError()
 
+    def unmap_region(self, addr, length): #pylint:disable=unused-argument,no-self-use
+        """
+        Releases the memory backing a region that was freed or unmapped. Memories that do not page their contents keep
+        everything, which is what this default does.
+
+        :param addr:    The start of the region.
+        :param length:  The length of the region, in bytes.
+        """
+        return
+
+    def store_repeated(self, addr, pattern, length):
+        """
+        Fills `length` bytes of memory, starting at `addr`, with `pattern` repeated over and over. The bytes are written
+        in the order they appear in `pattern`, regardless of the endianness of the memory.
+
+        :param addr:    The address to start at.
+        :param pattern: A claripy bitvector of the bytes to repeat.
+        :param length:  The number of bytes to fill.
+        """
+        max_length = self.state.se.max_int(length) if isinstance(length, claripy.ast.Base) else length
+        if max_length == 0:
+            return
+
+        data = SimRepeatedMemoryObject(pattern, 0, max_length).object
+        self.store(addr, data, size=length, endness='Iend_BE')
+
     # TODO(sduquette) : endness should be renamed endianness.
     def store_cases(self, addr, contents, conditions, fallback=None, add_constraints=None, endness=None, action=None):
         """
@@ -559,6 +598,19 @@ class SimMemory(SimStatePlugin):
 
             <A If(condition, BVV(0x41, 32), fallback)>
         """
+        if s_profiler.profiler is None:
+            return self._handle_load(addr, size=size, condition=condition, fallback=fallback,
+                                     add_constraints=add_constraints, action=action, endness=endness, inspect=inspect)
+        else:
+            p = s_profiler.profiler
+            p.start('memory', 'load')
+            try:
+                return self._handle_load(addr, size=size, condition=condition, fallback=fallback,
+                                         add_constraints=add_constraints, action=action, endness=endness, inspect=inspect)
+            finally:
+                p.stop()
+
+    def _handle_load(self, addr, size=None, condition=None, fallback=None, add_constraints=None, action=None, endness=None, inspect=True):
         add_constraints = True if add_constraints is None else add_constraints
 
         addr_e = _raw_ast(addr)
@@ -664,6 +716,18 @@ class SimMemory(SimStatePlugin):
     def _load(self, addr, size, condition=None, fallback=None):
         raise NotImplementedError()
 
+    def concrete_prefix(self, addr, size): #pylint:disable=unused-argument,no-self-use
+        """
+        Returns the longest concrete prefix of the `size` bytes at the concrete address `addr`, as a string of raw
+        bytes. This goes neither through the solver nor through breakpoints and actions, so it is meant for fast paths
+        that fall back to load() for whatever is not in the prefix. This default knows nothing concretely.
+
+        :param addr:    The address to read from, as an int.
+        :param size:    The maximum number of bytes to return.
+        :return:        A string of at most `size` bytes.
+        """
+        return ''
+
     def find(self, addr, what, max_search=None, max_symbolic_bytes=None, default=None):
         """
         Returns the address of bytes equal to 'what', starting from 'start'. Note that,  if you don't specify a default
@@ -716,8 +780,10 @@ class SimMemory(SimStatePlugin):
         raise NotImplementedError()
 
 from bintrees import AVLTree
+from .. import s_profiler
 from .. import s_options as o
 from ..s_action import SimActionData
 from ..s_action_object import SimActionObject, _raw_ast
 from ..s_errors import SimMemoryError, SimRegionMapError
+from .memory_object import SimRepeatedMemoryObject
 from ..plugins.inspect import BP_BEFORE, BP_AFTER
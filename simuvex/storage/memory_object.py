@@ -7,6 +7,10 @@ class SimMemoryObject(object):
     a specific object in SimSymbolicMemory. It is only used inside
     SimSymbolicMemory class.
     """
+
+    # the cle.Clemory this object was loaded from, if it holds unmodified bytes of the memory backer
+    _backer = None
+
     def __init__(self, object, base, length=None): #pylint:disable=redefined-builtin
         if not isinstance(object, claripy.ast.Base):
             raise SimMemoryError('memory can only store claripy Expression')
@@ -33,6 +37,13 @@ class SimMemoryObject(object):
     def object(self):
         return self._object
 
+    @property
+    def ast(self):
+        """
+        The expression this memory object is made of, without building anything that is not built yet.
+        """
+        return self._object
+
     def bytes_at(self, addr, length):
         if addr == self.base and length == self.length:
             return self.object
@@ -43,6 +54,9 @@ class SimMemoryObject(object):
         return self.object[left:right]
 
     def __eq__(self, other):
+        if isinstance(other, SimRepeatedMemoryObject):
+            # its _object may not be built yet
+            return other == self
         return self._object is other._object and self._base == other._base and hash(self._length) == hash(other._length)
 
     def __ne__(self, other):
@@ -51,3 +65,73 @@ class SimMemoryObject(object):
     def __repr__(self):
         return "MO(%s)" % (self.object)
 
+
+class SimRepeatedMemoryObject(SimMemoryObject):
+    """
+    A memory object for a byte pattern that is repeated over a range of memory, like the result of a memset() or of
+    zero-filling. The repeated expression is only built when something asks for the whole object; `bytes_at` slices
+    the pattern directly.
+    """
+    def __init__(self, pattern, base, length): #pylint:disable=super-init-not-called
+        if not isinstance(pattern, claripy.ast.Base):
+            raise SimMemoryError('memory can only store claripy Expression')
+        if pattern.size() == 0 or pattern.size() % 8 != 0:
+            raise SimMemoryError('the pattern of a repeated memory object must be a whole number of bytes')
+
+        self._pattern = pattern
+        self._pattern_length = pattern.size()/8
+        self._base = base
+        self._length = length
+        self._object = None
+
+    @property
+    def pattern(self):
+        return self._pattern
+
+    @property
+    def object(self):
+        if self._object is None:
+            self._object = self._repeat(0, self._length)
+        return self._object
+
+    @property
+    def ast(self):
+        return self._pattern if self._object is None else self._object
+
+    def _repeat(self, offset, length):
+        """
+        Builds the expression for `length` bytes of the repeated pattern, starting `offset` bytes into the object.
+        """
+        pattern = self._pattern
+        plen = self._pattern_length
+        offset %= plen
+
+        if not pattern.symbolic:
+            value = pattern._model_concrete.value
+            if value == 0:
+                return claripy.BVV(0, length*8)
+            s = ('%0*x' % (plen*2, value)).decode('hex')
+            s = s[offset:] + s[:offset]
+            return claripy.BVV((s * (length/plen + 1))[:length])
+
+        if plen == 1:
+            return pattern if length == 1 else claripy.Concat(*([ pattern ] * length))
+
+        # the bytes of the pattern, in memory order
+        pattern_bytes = [ pattern[(plen-i)*8-1:(plen-i-1)*8] for i in xrange(plen) ]
+        pieces = [ pattern_bytes[(offset+i) % plen] for i in xrange(length) ]
+        return pieces[0] if len(pieces) == 1 else claripy.Concat(*pieces)
+
+    def bytes_at(self, addr, length):
+        if addr == self.base and length == self.length:
+            return self.object
+        return self._repeat(addr - self.base, length)
+
+    def __eq__(self, other):
+        if type(other) is SimRepeatedMemoryObject:
+            return self._pattern is other._pattern and self._base == other._base and self._length == other._length
+        # the object is only built if everything else matches
+        return self._base == other._base and hash(self._length) == hash(other._length) and self.object is other.object
+
+    def __repr__(self):
+        return "MO(%s x %d)" % (self._pattern, self._length / self._pattern_length)
@@ -0,0 +1,70 @@
+import os
+import mmap
+
+from ..s_errors import SimMemoryError
+
+class SimPageSource(object):
+    """
+    A range of bytes that SimPagedMemory maps lazily (see SimPagedMemory.map_source()): the bytes are only read when a
+    page they cover is first touched. The bytes come from a part of a file, which is mmapped, or are all zero when there
+    is no file.
+    """
+
+    def __init__(self, path=None, offset=0, size=None):
+        """
+        :param path:    The file, or None for zeros.
+        :param offset:  The offset of the bytes in the file.
+        :param size:    The number of bytes. It defaults to the rest of the file.
+        """
+        if path is None and size is None:
+            raise SimMemoryError("a page source without a file needs a size")
+
+        if path is not None:
+            try:
+                file_size = os.path.getsize(path)
+            except OSError:
+                raise SimMemoryError("cannot map %s" % path)
+
+            if size is None:
+                size = file_size - offset
+            if offset < 0 or size < 0 or offset + size > file_size:
+                raise SimMemoryError("%s does not have %#x bytes at offset %#x" % (path, size, offset))
+
+        self.path = path
+        self.offset = offset
+        self.size = size
+        self._map = None
+
+    def __len__(self):
+        return self.size
+
+    def __repr__(self):
+        if self.path is None:
+            return "<SimPageSource of %#x zeros>" % self.size
+        return "<SimPageSource of %#x bytes of %s at %#x>" % (self.size, self.path, self.offset)
+
+    def __getstate__(self):
+        return { 'path': self.path, 'offset': self.offset, 'size': self.size }
+
+    def __setstate__(self, s):
+        self.__dict__.update(s)
+        self._map = None
+
+    def read(self, offset, length):
+        """
+        Read some of the bytes.
+
+        :param offset:  The offset in the source.
+        :param length:  The number of bytes.
+        :return:        The bytes, as a string.
+        """
+        if offset < 0 or offset + length > self.size:
+            raise SimMemoryError("reading %#x bytes at %#x from a %#x bytes page source" % (length, offset, self.size))
+
+        if self.path is None or length == 0:
+            return '\x00' * length
+
+        if self._map is None:
+            with open(self.path, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map[self.offset+offset:self.offset+offset+length]
@@ -1,3 +1,4 @@
+import weakref
 import cooldict
 import claripy
 import cffi
@@ -6,6 +7,7 @@ import cle
 from ..s_errors import SimMemoryError
 from .. import s_options as options
 from .memory_object import SimMemoryObject
+from ..s_footprint import count_ast_nodes
 from claripy.ast.bv import BV
 
 _ffi = cffi.FFI()
@@ -72,8 +74,66 @@ class Page(object):
         p.permissions = self.permissions
         return p
 
+    def content_key(self):
+        """
+        A key that identifies the contents of the page: its permissions, and the runs of memory objects it holds, by the
+        identity of their expressions along with their bases and lengths. Pages with equal keys read the same. The key
+        is only meaningful while the expressions it refers to are alive.
+        """
+        items = self._storage.iteritems() if type(self._storage) is dict else enumerate(self._storage)
+
+        runs = [ ]
+        last, run_start, run_end = None, None, None
+        for idx, mo in sorted(items):
+            if mo is None:
+                continue
+            if mo is last and idx == run_end:
+                run_end += 1
+                continue
+            if last is not None:
+                runs.append((run_start, run_end, type(last), id(last.ast), last.base, last.length))
+            last, run_start, run_end = mo, idx, idx + 1
+        if last is not None:
+            runs.append((run_start, run_end, type(last), id(last.ast), last.base, last.length))
+
+        return self._page_size, id(self.permissions), tuple(runs)
+
 _storage = Page
 
+# Pages interned by SimPagedMemory.intern_pages(), keyed by their contents. An interned page is shared by every memory
+# that holds it and is never written to: like any page a memory did not create since it was last branched, it is
+# copied before the first write.
+_interned_pages = weakref.WeakValueDictionary()
+_intern_stats = { 'lookups': 0, 'hits': 0, 'bytes_saved': 0 }
+
+def page_interning_stats():
+    """
+    Returns the statistics of page interning: how many pages were looked up, how many of them were replaced by an
+    identical interned page ('hits'), how many stored bytes those replacements freed, and how many interned pages are
+    currently alive.
+    """
+    stats = dict(_intern_stats)
+    stats['interned'] = len(_interned_pages)
+    return stats
+
+def backer_bytes(backer, addr, length):
+    """
+    Read bytes from a cle.Clemory memory backer.
+
+    :param backer:  The Clemory.
+    :param addr:    The address to read from.
+    :param length:  The number of bytes to read.
+    :return:        The bytes, as a string.
+    """
+    for start, cbacker in backer.cbackers:
+        if start <= addr and addr + length <= start + len(cbacker):
+            return _ffi.buffer(cbacker)[addr-start:addr-start+length]
+
+    try:
+        return ''.join(backer[a] for a in xrange(addr, addr + length))
+    except KeyError:
+        raise SimMemoryError("the memory backer does not hold %d bytes at %#x" % (length, addr))
+
 #pylint:disable=unidiomatic-typecheck
 
 class SimPagedMemory(object):
@@ -81,7 +141,7 @@ class SimPagedMemory(object):
     Represents paged memory.
     """
     def __init__(self, memory_backer=None, permissions_backer=None, pages=None, sinkholes=None, initialized=None, 
-                 name_mapping=None, hash_mapping=None, page_size=None):
+                 name_mapping=None, hash_mapping=None, page_size=None, sources=None):
         self._cowed = set()
         self._memory_backer = { } if memory_backer is None else memory_backer
         self._permissions_backer = permissions_backer # saved for copying
@@ -94,11 +154,18 @@ class SimPagedMemory(object):
         self._page_size = 0x1000 if page_size is None else page_size
         self.state = None
 
+        # the (start, end, SimPageSource, permissions) mappings that pages are initialized from, after the backer. The
+        # list is shared between branches, and replaced rather than modified.
+        self._sources = [ ] if sources is None else sources
+
         # reverse mapping
         self._name_mapping = cooldict.BranchingDict() if name_mapping is None else name_mapping
         self._hash_mapping = cooldict.BranchingDict() if hash_mapping is None else hash_mapping
         self._updated_mappings = set()
 
+        # whether anything has been written since the last clear_dirty() (here or in the memory we branched from)
+        self._dirty = False
+
     def __getstate__(self):
         return {
             '_memory_backer': self._memory_backer,
@@ -111,20 +178,32 @@ class SimPagedMemory(object):
             'state': self.state,
             '_name_mapping': self._name_mapping,
             '_hash_mapping': self._hash_mapping,
+            '_dirty': self._dirty,
+            '_sources': self._sources,
         }
 
     def __setstate__(self, s):
+        # nothing is owned after unpickling: the pages may be shared with other memories that were unpickled with us
+        self._cowed = set()
+        self._sinkholes_cowed = False
+        self._updated_mappings = set()
+        self._sources = [ ]
         self.__dict__.update(s)
 
     def branch(self):
         new_name_mapping = self._name_mapping.branch() if options.REVERSE_MEMORY_NAME_MAP in self.state.options else self._name_mapping
         new_hash_mapping = self._hash_mapping.branch() if options.REVERSE_MEMORY_HASH_MAP in self.state.options else self._hash_mapping
 
+        if options.INTERN_PAGES in self.state.options:
+            self.intern_pages()
+
         if _storage is cooldict.SinkholeCOWDict:
             new_pages = { k:v.branch() for k,v in self._pages.iteritems() }
         else:
             new_pages = dict(self._pages)
 
+        # the pages are now shared with the new memory, so we need to copy them again before writing to them
+        self._cowed = set()
         self._sinkholes_cowed = False
         m = SimPagedMemory(memory_backer=self._memory_backer,
                            permissions_backer=self._permissions_backer,
@@ -133,9 +212,85 @@ class SimPagedMemory(object):
                            initialized=set(self._initialized),
                            page_size=self._page_size,
                            name_mapping=new_name_mapping,
-                           hash_mapping=new_hash_mapping)
+                           hash_mapping=new_hash_mapping,
+                           sources=self._sources)
+        m._dirty = self._dirty
         return m
 
+    @property
+    def dirty(self):
+        """
+        True if this memory (or any memory it was branched from) has been written to since the last call to
+        clear_dirty().
+        """
+        return self._dirty
+
+    def clear_dirty(self):
+        self._dirty = False
+
+    def intern_pages(self):
+        """
+        Replace the pages this memory wrote to since it was last branched with identical interned pages, shared with
+        other memories. The pages that have no identical twin are interned themselves. Either way, this memory no longer
+        owns them and copies them before writing to them again.
+
+        :return: The number of pages that were replaced.
+        """
+        replaced = 0
+        for page_num in self._cowed:
+            page = self._pages.get(page_num, None)
+            if page is None:
+                continue
+
+            key = page.content_key()
+            _intern_stats['lookups'] += 1
+            interned = _interned_pages.get(key, None)
+            if interned is None:
+                _interned_pages[key] = page
+            elif interned is not page:
+                self._pages[page_num] = interned
+                replaced += 1
+                _intern_stats['hits'] += 1
+                _intern_stats['bytes_saved'] += len(page.keys())
+
+        self._cowed = set()
+        return replaced
+
+    def footprint(self, seen):
+        """
+        Account the pages of this memory, the memory objects in them, and the ASTs they hold. Anything that is already
+        in `seen` is skipped, and everything that is counted is added to it.
+
+        :return: A dict of counters. The pages that were copied since this memory was last branched are 'owned_pages',
+                 the rest may be shared with other memories and are 'shared_pages'.
+        """
+        report = dict(pages=0, owned_pages=0, shared_pages=0, sinkholes=0, bytes=0, memory_objects=0, ast_nodes=0)
+        asts = [ ]
+
+        for page_num, page in self._pages.iteritems():
+            if id(page) in seen:
+                continue
+            seen.add(id(page))
+
+            report['pages'] += 1
+            report['owned_pages' if page_num in self._cowed else 'shared_pages'] += 1
+            for mo in (page._storage.itervalues() if type(page._storage) is dict else page._storage):
+                if mo is None:
+                    continue
+                report['bytes'] += 1
+                if id(mo) not in seen:
+                    seen.add(id(mo))
+                    report['memory_objects'] += 1
+                    asts.append(mo.ast)
+
+        if id(self._sinkholes) not in seen:
+            seen.add(id(self._sinkholes))
+            report['sinkholes'] = len(self._sinkholes)
+            asts.extend(mo.ast for mo in self._sinkholes.itervalues())
+
+        report['ast_nodes'] = count_ast_nodes(asts, seen)
+        return report
+
     def __getitem__(self, addr):
         page_num = addr / self._page_size
         page_idx = addr % self._page_size
@@ -282,6 +437,7 @@ class SimPagedMemory(object):
 
                 snip = _ffi.buffer(backer)[snip_start:snip_start+write_size]
                 mo = SimMemoryObject(claripy.BVV(snip), write_start)
+                mo._backer = self._memory_backer
                 self._apply_object_to_page(n*self._page_size, mo, page=new_page)
 
                 new_page.permissions = claripy.BVV(flags, 3)
@@ -310,9 +466,48 @@ class SimPagedMemory(object):
                 except KeyError:
                     pass
 
+        for start, end, source, permissions in self._sources:
+            if start < new_page_addr + self._page_size and new_page_addr < end:
+                self._apply_source(n, start, end, source, permissions, page=new_page)
+                initialized = True
+
         return initialized
 
+    def _apply_source(self, page_num, start, end, source, permissions, page=None):
+        page_base = page_num * self._page_size
+        write_start = max(start, page_base)
+        write_end = min(end, page_base + self._page_size)
+
+        mo = SimMemoryObject(claripy.BVV(source.read(write_start - start, write_end - write_start)), write_start)
+        self._apply_object_to_page(page_base, mo, page=page)
+        if permissions is not None:
+            if page is None:
+                page = self._get_page(page_num, write=True, create=True)
+            page.permissions = claripy.BVV(permissions, 3)
+
+    def map_source(self, addr, source, permissions=None):
+        """
+        Map the bytes of a SimPageSource to an address. Nothing is read right away: each page is initialized from the
+        source when it is first touched, like it is from the memory backer. Only the pages that were already touched are
+        written to now.
+
+        :param addr:        The address to map the source to.
+        :param source:      The SimPageSource.
+        :param permissions: The permissions of the pages (a combination of the Page.PROT_* flags), or None to keep
+                            them.
+        """
+        end = addr + source.size
+        self._sources = self._sources + [ (addr, end, source, permissions) ]
+        self._dirty = True
+
+        for page_num in xrange(addr / self._page_size, (end + self._page_size - 1) / self._page_size):
+            if page_num in self._initialized or page_num in self._pages or self._sinkholed(page_num):
+                self._apply_source(page_num, addr, end, source, permissions)
+
     def _get_page(self, page_num, write=False, create=False, initialize=True):
+        if write or create:
+            self._dirty = True
+
         try:
             page = self._pages[page_num]
         except KeyError:
@@ -337,6 +532,7 @@ class SimPagedMemory(object):
         return page
 
     def _sinkhole(self, page_num, value, page=None, wipe=True):
+        self._dirty = True
         if _storage is cooldict.SinkholeCOWDict:
             if page is None:
                 page = self._get_page(page_num, initialize=False, create=True, write=True)
@@ -392,6 +588,51 @@ class SimPagedMemory(object):
     def __len__(self):
         return sum((len(self._page_keys(k)) if not self._sinkholed(k) else self._page_size) for k in self._pages.iterkeys())
 
+    def _page_extent(self, page_num):
+        """
+        Returns the (start, end) range of the defined bytes in a page, or None if the page holds nothing.
+        """
+        base = page_num * self._page_size
+        if self._sinkholed(page_num):
+            return base, base + self._page_size
+        if page_num not in self._pages:
+            return None
+
+        keys = self._page_keys(self._pages[page_num])
+        if len(keys) == 0:
+            return None
+        return base + min(keys), base + max(keys) + 1
+
+    def extent(self):
+        """
+        Returns the range of addresses that hold data, as a (start, end) tuple, without materializing every address like
+        keys() does. Returns None if nothing is stored.
+        """
+        page_nums = sorted(set(self._pages) | set(self._sinkholes))
+
+        start = None
+        for p in page_nums:
+            e = self._page_extent(p)
+            if e is not None:
+                start = e[0]
+                break
+
+        end = None
+        for p in reversed(page_nums):
+            e = self._page_extent(p)
+            if e is not None:
+                end = e[1]
+                break
+
+        if type(self._memory_backer) is dict and len(self._memory_backer) > 0:
+            backer_start, backer_end = min(self._memory_backer), max(self._memory_backer) + 1
+            start = backer_start if start is None else min(start, backer_start)
+            end = backer_end if end is None else max(end, backer_end)
+
+        if start is None:
+            return None
+        return start, end
+
     def _page_keys(self, page):
         if _storage is list:
             return set(e for e,v in enumerate(page) if v is not None)
@@ -460,9 +701,9 @@ class SimPagedMemory(object):
             elif c in self and c not in other:
                 differences.add(c)
             else:
-                if type(self[c]) is not SimMemoryObject:
+                if not isinstance(self[c], SimMemoryObject):
                     self[c] = SimMemoryObject(self.state.se.BVV(ord(self[c]), 8), c)
-                if type(other[c]) is not SimMemoryObject:
+                if not isinstance(other[c], SimMemoryObject):
                     other[c] = SimMemoryObject(self.state.se.BVV(ord(other[c]), 8), c)
                 if c in self and self[c] != other[c]:
                     # Try to see if the bytes are equal
@@ -496,6 +737,9 @@ class SimPagedMemory(object):
         page_num = page_base / self._page_size
         if mo.base <= page_base and mo.base + mo.length >= page_base + self._page_size:
             # takes up the whole page
+            if page is None and overwrite:
+                # nothing the backer holds would show through, so the page must not be initialized from it later
+                self._initialized.add(page_num)
             self._sinkhole(page_num, mo, page=page, wipe=overwrite)
             return False if _storage is not cooldict.SinkholeCOWDict else True
         else:
@@ -513,7 +757,9 @@ class SimPagedMemory(object):
         :param memory_object: the memory object to store
         """
 
-        self._update_range_mappings(mo.base, mo.object, mo.length)
+        # checked here, so that repeated memory objects are not materialized when there are no mappings to update
+        if options.REVERSE_MEMORY_NAME_MAP in self.state.options or options.REVERSE_MEMORY_HASH_MAP in self.state.options:
+            self._update_range_mappings(mo.base, mo.object, mo.length)
 
         mo_start = mo.base
         mo_end = mo.base + mo.length
@@ -623,35 +869,51 @@ class SimPagedMemory(object):
         self._updated_mappings.add(m)
 
     def _update_range_mappings(self, actual_addr, cnt, size):
-        if not (options.REVERSE_MEMORY_NAME_MAP in self.state.options or
-                options.REVERSE_MEMORY_HASH_MAP in self.state.options):
+        # the options, the variables and the hash of cnt are the same for the whole range, so they are only looked up
+        # once
+        state_options = self.state.options
+        name_map = options.REVERSE_MEMORY_NAME_MAP in state_options
+        hash_map = options.REVERSE_MEMORY_HASH_MAP in state_options
+        if not (name_map or hash_map):
             return
 
-        for i in range(actual_addr, actual_addr+size):
-            self._update_mappings(i, cnt)
-
-    def _update_mappings(self, actual_addr, cnt):
-        if not (options.REVERSE_MEMORY_NAME_MAP in self.state.options or
-                options.REVERSE_MEMORY_HASH_MAP in self.state.options):
+        new_vars = self.state.se.variables(cnt)
+        if not hash_map and len(new_vars) == 0:
             return
 
-        if (options.REVERSE_MEMORY_HASH_MAP not in self.state.options) and \
-                len(self.state.se.variables(cnt)) == 0:
-           return
+        new_hash = hash(cnt) if hash_map else None
 
-        l.debug("Updating mappings at address 0x%x", actual_addr)
+        for addr in xrange(actual_addr, actual_addr+size):
+            l.debug("Updating mappings at address 0x%x", addr)
 
-        try:
-            old_obj = self[actual_addr]
             l.debug("... removing old mappings")
-
+            self._remove_mappings(addr, name_map, hash_map)
+
+            l.debug("... adding new mappings")
+            if name_map:
+                # add the new variables to the mapping
+                for v in new_vars:
+                    self._mark_updated_mapping(self._name_mapping, v)
+                    if v not in self._name_mapping:
+                        self._name_mapping[v] = set()
+                    self._name_mapping[v].add(addr)
+
+            if hash_map:
+                # add the new variables to the hash->addrs mapping
+                self._mark_updated_mapping(self._hash_mapping, new_hash)
+                if new_hash not in self._hash_mapping:
+                    self._hash_mapping[new_hash] = set()
+                self._hash_mapping[new_hash].add(addr)
+
+    def _remove_mappings(self, actual_addr, name_map, hash_map):
+        try:
             # remove this address for the old variables
             old_obj = self[actual_addr]
             if isinstance(old_obj, SimMemoryObject):
                 old_obj = old_obj.object
 
             if isinstance(old_obj, claripy.ast.BV):
-                if options.REVERSE_MEMORY_NAME_MAP in self.state.options:
+                if name_map:
                     var_set = self.state.se.variables(old_obj)
                     for v in var_set:
                         self._mark_updated_mapping(self._name_mapping, v)
@@ -659,7 +921,7 @@ class SimPagedMemory(object):
                         if len(self._name_mapping[v]) == 0:
                             self._name_mapping.pop(v, None)
 
-                if options.REVERSE_MEMORY_HASH_MAP in self.state.options:
+                if hash_map:
                     h = hash(old_obj)
                     self._mark_updated_mapping(self._hash_mapping, h)
                     self._hash_mapping[h].discard(actual_addr)
@@ -668,23 +930,8 @@ class SimPagedMemory(object):
         except KeyError:
             pass
 
-        l.debug("... adding new mappings")
-        if options.REVERSE_MEMORY_NAME_MAP in self.state.options:
-            # add the new variables to the mapping
-            var_set = self.state.se.variables(cnt)
-            for v in var_set:
-                self._mark_updated_mapping(self._name_mapping, v)
-                if v not in self._name_mapping:
-                    self._name_mapping[v] = set()
-                self._name_mapping[v].add(actual_addr)
-
-        if options.REVERSE_MEMORY_HASH_MAP in self.state.options:
-            # add the new variables to the hash->addrs mapping
-            h = hash(cnt)
-            self._mark_updated_mapping(self._hash_mapping, h)
-            if h not in self._hash_mapping:
-                self._hash_mapping[h] = set()
-            self._hash_mapping[h].add(actual_addr)
+    def _update_mappings(self, actual_addr, cnt):
+        self._update_range_mappings(actual_addr, cnt, 1)
 
     def addrs_for_name(self, n):
         """
@@ -755,7 +1002,7 @@ class SimPagedMemory(object):
         return self._get_page(page_num).permissions
 
     def map_region(self, addr, length, permissions):
-        if o.TRACK_MEMORY_MAPPING not in self.state.options:
+        if options.TRACK_MEMORY_MAPPING not in self.state.options:
             return
 
         if self.state.se.symbolic(addr):
@@ -778,7 +1025,53 @@ class SimPagedMemory(object):
         if isinstance(permissions, (int, long)):
             permissions = claripy.BVV(permissions, 3)
 
+        self._dirty = True
         for page in xrange(pages):
             self._pages[base_page_num + page] = Page(self._page_size, permissions)
 
-from .. import s_options as o
+    def unmap_region(self, addr, length):
+        """
+        Releases the pages that lie entirely within [`addr`, `addr` + `length`), so that freed memory is no longer
+        carried through every branch. Pages that are only partly covered are left alone. Released pages read as
+        uninitialized memory afterwards, rather than going back to the memory backer.
+
+        :param addr:    The start of the region.
+        :param length:  The length of the region, in bytes.
+        """
+        if self.state.se.symbolic(addr):
+            raise SimMemoryError("cannot unmap region with a symbolic address")
+
+        if isinstance(addr, claripy.ast.bv.BV):
+            addr = self.state.se.any_int(addr)
+
+        first_page = (addr + self._page_size - 1) / self._page_size
+        last_page = (addr + length) / self._page_size
+        if first_page >= last_page:
+            return
+
+        released = [ p for p in set(self._pages) | set(self._sinkholes) if first_page <= p < last_page ]
+        if len(released) == 0:
+            return
+
+        name_map = options.REVERSE_MEMORY_NAME_MAP in self.state.options
+        hash_map = options.REVERSE_MEMORY_HASH_MAP in self.state.options
+
+        self._dirty = True
+        for page_num in released:
+            if name_map or hash_map:
+                page_base = page_num * self._page_size
+                for a in xrange(page_base, page_base + self._page_size):
+                    self._remove_mappings(a, name_map, hash_map)
+
+            if page_num in self._pages:
+                del self._pages[page_num]
+                self._cowed.discard(page_num)
+
+            if page_num in self._sinkholes:
+                if not self._sinkholes_cowed:
+                    self._sinkholes_cowed = True
+                    self._sinkholes = dict(self._sinkholes)
+                del self._sinkholes[page_num]
+
+            # keep the backer from filling the page in again
+            self._initialized.add(page_num)
@@ -258,5 +258,7 @@ def x86g_dirtyhelper_FINIT(state, bbptr): #pylint:disable=unused-argument
     return None, [ ]
 
 def x86g_dirtyhelper_write_cr0(state, value):
+    # copies of a state share their arch, so we need our own before changing it
+    state.arch = state.arch.copy()
     state.arch.vex_archinfo['x86_cr0'] = state.se.exactly_int(value)
     return None, [ ]
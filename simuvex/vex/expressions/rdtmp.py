@@ -5,7 +5,7 @@ from ...s_action import SimActionData
 class SimIRExpr_RdTmp(SimIRExpr):
     def _execute(self):
         if (o.SUPER_FASTPATH in self.state.options
-                and self._expr.tmp not in self.state.scratch.temps):
+                and not self.state.scratch.has_tmp(self._expr.tmp)):
             self.expr = self.state.se.BVV(0, self.size_bits())
         else:
             self.expr = self.state.scratch.tmp_expr(self._expr.tmp)
@@ -15,6 +15,11 @@ l = logging.getLogger("simuvex.vex.irop")
 import pyvex
 import claripy
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 #
 # The more sane approach
 #
@@ -128,6 +133,19 @@ bitwise_operation_map = {
     'And': '__and__',
     'Not': '__invert__',
 }
+concrete_operation_map = {
+    'Add': operator.add,
+    'Sub': operator.sub,
+    'Mul': operator.mul,
+    'Div': operator.div,
+    'Xor': operator.xor,
+    'Or': operator.or_,
+    'And': operator.and_,
+    'Not': operator.invert,
+    'Shl': operator.lshift,
+    'Shr': operator.rshift,
+}
+lane_operations = { 'Add', 'Sub', 'Mul', 'Shl', 'Shr', 'Sar' }
 rm_map = {
     0: claripy.fp.RM_RNE,
     1: claripy.fp.RM_RTN,
@@ -149,6 +167,11 @@ def supports_vector(f):
     f.supports_vector = True
     return f
 
+def _signed(value, bits):
+    if value >> (bits - 1) & 1:
+        return value - (1 << bits)
+    return value
+
 
 class SimIROp(object):
     """
@@ -327,6 +350,19 @@ class SimIROp(object):
             l.debug("... can't support operations")
             raise UnsupportedIROpError("no calculate function identified for %s" % self.name)
 
+        # integer operations have a pure-Python twin, which is used when all the operands are concrete. Integer
+        # vector operations are evaluated lane-wise with numpy, if it is available.
+        self._concrete_calculate = None
+        if not self._float and self._vector_count is None:
+            self._concrete_calculate = getattr(self, '_concrete' + self._calculate.__name__[3:], None)
+            if self._calculate == self._op_mapped and \
+               self._generic_name not in concrete_operation_map and self._generic_name != 'Sar':
+                self._concrete_calculate = None
+        elif not self._float and numpy is not None and self._vector_size in (8, 16, 32, 64):
+            self._concrete_calculate = getattr(self, '_lanes' + self._calculate.__name__[3:], None)
+            if self._calculate == self._op_vector_mapped and self._generic_name not in lane_operations:
+                self._concrete_calculate = None
+
     def __repr__(self):
         return "<SimIROp %s>" % self.name
 
@@ -345,6 +381,9 @@ class SimIROp(object):
             args = tuple(arg.to_bv() for arg in args)
 
         try:
+            if self._concrete_calculate is not None and all(a.op == 'BVV' for a in args):
+                return self._concrete_result(*self._concrete_calculate([ a.args[0] for a in args ],
+                                                                       [ a.length for a in args ]))
             return self.extend_size(self._calculate(args))
         except (TypeError, ValueError, SimValueError, claripy.ClaripyError):
             e_type, value, traceback = sys.exc_info()
@@ -367,6 +406,17 @@ class SimIROp(object):
         else:
             return o
 
+    def _concrete_result(self, value, size):
+        """
+        The concrete counterpart of extend_size(). Returns the result as a BVV.
+        """
+        if size < self._output_size_bits:
+            if self._to_signed == 'S' or (self._from_signed == 'S' and self._to_signed == None):
+                value = _signed(value & ((1 << size) - 1), size)
+        elif size > self._output_size_bits:
+            raise SimOperationError('output of %s is too big' % self.name)
+        return claripy.BVV(value & ((1 << self._output_size_bits) - 1), self._output_size_bits)
+
     @property
     def is_signed(self):
         return self._from_signed == 'S' or self._vector_signed == 'S'
@@ -404,6 +454,22 @@ class SimIROp(object):
 
         return getattr(claripy.ast.BV, o)(*sized_args)
 
+    def _concrete_mapped(self, args, sizes):
+        if self._from_size is not None:
+            size = self._from_size
+            if self.is_signed:
+                args = [ _signed(a, s) if s < size else a for a, s in zip(args, sizes) ]
+        else:
+            size = sizes[0]
+        mask = (1 << size) - 1
+
+        if self._generic_name == 'Sar':
+            return (_signed(args[0] & mask, size) >> (args[1] & mask)) & mask, size
+        elif self._generic_name == 'Not':
+            return ~args[0] & mask, size
+        else:
+            return concrete_operation_map[self._generic_name](args[0] & mask, args[1] & mask) & mask, size
+
     def _translate_rm(self, rm_num):
         if not rm_num.symbolic:
             return rm_map[rm_num._model_concrete.value]
@@ -426,6 +492,60 @@ class SimIROp(object):
                         for i in reversed(xrange(self._vector_count)))
         return claripy.Concat(*(self._op_mapped(ca) for ca in chopped_args))
 
+    #
+    # Lane-wise implementations of the vector operations, for concrete operands
+    #
+
+    def _lanes(self, value, size, signed=False):
+        """
+        Split a concrete vector into a numpy array of its lanes, least significant lane first.
+        """
+        lanes = numpy.frombuffer(('%0*x' % (size / 4, value)).decode('hex')[::-1],
+                                 dtype='<u%d' % (self._vector_size / 8))
+        return lanes.view('<i%d' % (self._vector_size / 8)) if signed else lanes
+
+    def _wide_lanes(self, value, size):
+        """
+        The lanes of a concrete vector, extended according to the signedness of the operation so that they can be
+        added or subtracted without overflowing.
+        """
+        return self._lanes(value, size, signed=self.is_signed).astype(numpy.int64 if self._vector_size <= 32 else object)
+
+    def _pack_lanes(self, lanes):
+        """
+        Put the (possibly wider) lanes back together into a concrete vector.
+        """
+        if lanes.dtype == object:
+            lanes = numpy.array([ l & ((1 << self._vector_size) - 1) for l in lanes ], dtype=numpy.uint64)
+        lanes = lanes.astype('<u%d' % (self._vector_size / 8))
+        return int(lanes.tobytes()[::-1].encode('hex'), 16), self._vector_size * self._vector_count
+
+    def _lanes_vector_mapped(self, args, sizes):
+        a = self._lanes(args[0], sizes[0])
+        b = self._lanes(args[1], sizes[1])
+
+        if self._generic_name in shift_operation_map:
+            return self._lanes_shift(a, b)
+        return self._pack_lanes(concrete_operation_map[self._generic_name](a, b))
+
+    def _lanes_shift(self, a, shift_by):
+        # numpy leaves shifting by the lane size or more undefined, while VEX shifts everything out
+        s = self._vector_size
+        too_far = shift_by >= s
+        shift_by = numpy.where(too_far, s - 1, shift_by).astype(a.dtype)
+
+        if self._generic_name.startswith('Sar'):
+            return self._pack_lanes(a.view('<i%d' % (s / 8)) >> shift_by.view('<i%d' % (s / 8)))
+        elif self._generic_name.startswith('Shl'):
+            return self._pack_lanes(numpy.where(too_far, 0, a << shift_by).astype(a.dtype))
+        else:
+            return self._pack_lanes(numpy.where(too_far, 0, a >> shift_by).astype(a.dtype))
+
+    def _lanes_compare(self, args, sizes, comparison):
+        a = self._lanes(args[0], sizes[0], signed=self.is_signed)
+        b = self._lanes(args[1], sizes[1], signed=self.is_signed)
+        return self._pack_lanes(-comparison(a, b).astype(a.dtype))
+
     def _op_float_op_just_low(self, args):
         chopped = [arg[(self._vector_size - 1):0].raw_to_fp() for arg in args]
         result = getattr(claripy, 'fp' + self._generic_name)(claripy.fp.RM.default(), *chopped).to_bv()
@@ -449,6 +569,27 @@ class SimIROp(object):
     def _op_zero_extend(self, args):
         return claripy.ZeroExt(self._to_size - args[0].size(), args[0])
 
+    def _concrete_concat(self, args, sizes):
+        value = 0
+        for a, s in zip(args, sizes):
+            value = (value << s) | a
+        return value, sum(sizes)
+
+    def _concrete_hi_half(self, args, sizes):
+        return args[0] >> (sizes[0]/2), sizes[0]/2
+
+    def _concrete_lo_half(self, args, sizes):
+        return args[0] & ((1 << (sizes[0]/2)) - 1), sizes[0]/2
+
+    def _concrete_extract(self, args, sizes):
+        return args[0] & ((1 << self._to_size) - 1), self._to_size
+
+    def _concrete_sign_extend(self, args, sizes):
+        return _signed(args[0], sizes[0]) & ((1 << self._to_size) - 1), self._to_size
+
+    def _concrete_zero_extend(self, args, sizes):
+        return args[0], self._to_size
+
     def vector_args(self, args):
         """
          Yields each of the individual lane pairs from the arguments, in
@@ -466,6 +607,12 @@ class SimIROp(object):
         op2 = self.extend_size(op2)
         return op1 * op2
 
+    def _concrete_generic_Mull(self, args, sizes):
+        size = self._output_size_bits
+        if self._to_signed == 'S' or (self._from_signed == 'S' and self._to_signed == None):
+            args = [ _signed(a, s) for a, s in zip(args, sizes) ]
+        return (args[0] * args[1]) & ((1 << size) - 1), size
+
     def _op_generic_Clz(self, args):
         """Count the leading zeroes"""
         wtf_expr = claripy.BVV(self._from_size, self._from_size)
@@ -482,6 +629,14 @@ class SimIROp(object):
             wtf_expr = claripy.If(bit == 1, claripy.BVV(a, self._from_size), wtf_expr)
         return wtf_expr
 
+    def _concrete_generic_Clz(self, args, sizes):
+        return self._from_size - args[0].bit_length(), self._from_size
+
+    def _concrete_generic_Ctz(self, args, sizes):
+        if args[0] == 0:
+            return self._from_size, self._from_size
+        return (args[0] & -args[0]).bit_length() - 1, self._from_size
+
     def generic_minmax(self, args, cmp_op):
         res_comps = []
         for i in reversed(range(self._vector_count)):
@@ -503,6 +658,16 @@ class SimIROp(object):
     def _op_generic_Max(self, args):
         return self.generic_minmax(args, claripy.SGT if self.is_signed else claripy.UGT)
 
+    def _lanes_generic_Min(self, args, sizes):
+        a = self._lanes(args[0], sizes[0], signed=self.is_signed)
+        b = self._lanes(args[1], sizes[1], signed=self.is_signed)
+        return self._pack_lanes(numpy.minimum(a, b))
+
+    def _lanes_generic_Max(self, args, sizes):
+        a = self._lanes(args[0], sizes[0], signed=self.is_signed)
+        b = self._lanes(args[1], sizes[1], signed=self.is_signed)
+        return self._pack_lanes(numpy.maximum(a, b))
+
     @supports_vector
     def _op_generic_GetMSBs(self, args):
         size = self._vector_count * self._vector_size
@@ -517,6 +682,19 @@ class SimIROp(object):
         src_vector = [ args[1][(i+1)*s-1:i*s] for i in xrange(c/2) ]
         return claripy.Concat(*itertools.chain.from_iterable(reversed(zip(dst_vector, src_vector))))
 
+    def _lanes_generic_GetMSBs(self, args, sizes):
+        size = self._vector_count * self._vector_size
+        return sum(((args[0] >> (i * 8 + 7)) & 1) << i for i in xrange(size / 8)), size / 8
+
+    def _lanes_generic_InterleaveLO(self, args, sizes):
+        a = self._lanes(args[0], sizes[0])
+        b = self._lanes(args[1], sizes[1])
+        half = self._vector_count / 2
+        interleaved = numpy.empty(self._vector_count, dtype=a.dtype)
+        interleaved[0::2] = b[:half]
+        interleaved[1::2] = a[:half]
+        return self._pack_lanes(interleaved)
+
     def generic_compare(self, args, comparison):
         if self._vector_size is not None:
             res_comps = []
@@ -570,6 +748,24 @@ class SimIROp(object):
         return self.generic_compare(args, claripy.SLE if self.is_signed else claripy.ULE)
     _op_generic_CasCmpLE = _op_generic_CmpLE
 
+    def _lanes_generic_CmpEQ(self, args, sizes):
+        return self._lanes_compare(args, sizes, operator.eq)
+
+    def _lanes_generic_CmpNEZ(self, args, sizes):
+        return self._lanes_compare([ args[0], 0 ], [ sizes[0], sizes[0] ], operator.ne)
+
+    def _lanes_generic_CmpGT(self, args, sizes):
+        return self._lanes_compare(args, sizes, operator.gt)
+
+    def _lanes_generic_CmpGE(self, args, sizes):
+        return self._lanes_compare(args, sizes, operator.ge)
+
+    def _lanes_generic_CmpLT(self, args, sizes):
+        return self._lanes_compare(args, sizes, operator.lt)
+
+    def _lanes_generic_CmpLE(self, args, sizes):
+        return self._lanes_compare(args, sizes, operator.le)
+
     def _op_generic_CmpORD(self, args):
         x = args[0]
         y = args[1]
@@ -577,6 +773,38 @@ class SimIROp(object):
         cond = x < y if self.is_signed else claripy.ULT(x, y)
         return claripy.If(x == y, claripy.BVV(0x2, s), claripy.If(cond, claripy.BVV(0x8, s), claripy.BVV(0x4, s)))
 
+    def concrete_compare(self, args, sizes, comparison):
+        if self.is_signed:
+            args = [ _signed(a, s) for a, s in zip(args, sizes) ]
+        return (1 if comparison(args[0], args[1]) else 0), 1
+
+    def _concrete_generic_CmpEQ(self, args, sizes):
+        return self.concrete_compare(args, sizes, operator.eq)
+
+    def _concrete_generic_CmpNE(self, args, sizes):
+        return self.concrete_compare(args, sizes, operator.ne)
+
+    def _concrete_generic_CmpNEZ(self, args, sizes):
+        return (1 if args[0] != 0 else 0), 1
+
+    def _concrete_generic_CmpGT(self, args, sizes):
+        return self.concrete_compare(args, sizes, operator.gt)
+
+    def _concrete_generic_CmpGE(self, args, sizes):
+        return self.concrete_compare(args, sizes, operator.ge)
+
+    def _concrete_generic_CmpLT(self, args, sizes):
+        return self.concrete_compare(args, sizes, operator.lt)
+
+    def _concrete_generic_CmpLE(self, args, sizes):
+        return self.concrete_compare(args, sizes, operator.le)
+
+    def _concrete_generic_CmpORD(self, args, sizes):
+        x, y = args
+        if self.is_signed:
+            x, y = _signed(x, sizes[0]), _signed(y, sizes[1])
+        return (0x2 if x == y else 0x8 if x < y else 0x4), self._from_size
+
     def generic_shift_thing(self, args, op):
         if self._vector_size is not None:
             shifted = []
@@ -605,6 +833,12 @@ class SimIROp(object):
     def _op_generic_SarN(self, args):
         return self.generic_shift_thing(args, operator.rshift)
 
+    def _lanes_generic_ShlN(self, args, sizes):
+        a = self._lanes(args[0], sizes[0])
+        return self._lanes_shift(a, numpy.full_like(a, min(args[1], self._vector_size)))
+    _lanes_generic_ShrN = _lanes_generic_ShlN
+    _lanes_generic_SarN = _lanes_generic_ShlN
+
     @supports_vector
     def _op_generic_HAdd(self, args):
         """
@@ -679,6 +913,27 @@ class SimIROp(object):
             components.append(claripy.If(cap_cond, cap, res))
         return claripy.Concat(*components)
 
+    def _lanes_generic_HAdd(self, args, sizes):
+        return self._pack_lanes((self._wide_lanes(args[0], sizes[0]) + self._wide_lanes(args[1], sizes[1])) >> 1)
+
+    def _lanes_generic_HSub(self, args, sizes):
+        return self._pack_lanes((self._wide_lanes(args[0], sizes[0]) - self._wide_lanes(args[1], sizes[1])) >> 1)
+
+    def _lanes_saturate(self, lanes):
+        if self.is_signed:
+            lowest, highest = -(1 << (self._vector_size - 1)), (1 << (self._vector_size - 1)) - 1
+        else:
+            lowest, highest = 0, (1 << self._vector_size) - 1
+        if lanes.dtype == object:
+            return self._pack_lanes(numpy.array([ min(max(l, lowest), highest) for l in lanes ], dtype=object))
+        return self._pack_lanes(numpy.clip(lanes, lowest, highest))
+
+    def _lanes_generic_QAdd(self, args, sizes):
+        return self._lanes_saturate(self._wide_lanes(args[0], sizes[0]) + self._wide_lanes(args[1], sizes[1]))
+
+    def _lanes_generic_QSub(self, args, sizes):
+        return self._lanes_saturate(self._wide_lanes(args[0], sizes[0]) - self._wide_lanes(args[1], sizes[1]))
+
     def _op_divmod(self, args):
         # TODO: handle signdness
         #try:
@@ -692,6 +947,12 @@ class SimIROp(object):
         )
         #except ZeroDivisionError:
         #   return state.se.BVV(0, self._to_size)
+
+    def _concrete_divmod(self, args, sizes):
+        quotient = args[0] / args[1]
+        remainder = args[0] % args[1]
+        mask = (1 << self._to_size) - 1
+        return ((remainder & mask) << self._to_size) | (quotient & mask), self._to_size * 2
     #pylint:enable=no-self-use,unused-argument
 
     # FP!
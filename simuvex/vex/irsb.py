@@ -64,7 +64,15 @@ class SimIRSB(SimRun):
         if o.BLOCK_SCOPE_CONSTRAINTS in self.state.options and 'solver_engine' in self.state.plugins:
             self.state.release_plugin('solver_engine')
 
-        self._handle_irsb()
+        if s_profiler.profiler is None:
+            self._handle_irsb()
+        else:
+            p = s_profiler.profiler
+            p.start('irsb', self.addr)
+            try:
+                self._handle_irsb()
+            finally:
+                p.stop(statements=len(self.statements))
 
         # It's for debugging
         # irsb.pp()
@@ -244,6 +252,8 @@ class SimIRSB(SimRun):
             self.has_default_exit = True
 
     def _prepare_temps(self, state):
+        state.scratch.prepare_temps(len(self.irsb.tyenv.types))
+
         # prepare symbolic variables for the statements if we're using SYMBOLIC_TEMPS
         if o.SYMBOLIC_TEMPS in self.state.options:
             for n, t in enumerate(self.irsb.tyenv.types):
@@ -271,6 +281,7 @@ from .expressions import translate_expr
 
 from . import size_bits
 from .. import s_options as o
+from .. import s_profiler
 from ..plugins.inspect import BP_AFTER, BP_BEFORE
 from ..s_errors import SimIRSBError, SimSolverError, SimMemoryAddressError
 from ..s_action import SimActionExit, SimActionObject
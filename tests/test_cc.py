@@ -39,5 +39,9 @@ def test_calling_conventions():
         for index, arg in enumerate(args):
             nose.tools.assert_true(s.se.is_true(manyargs.arg(index) == arg))
 
+        # fetching them all at once must give the same result
+        for arg, expr in zip(args, manyargs.cc.get_args(manyargs.state, len(args))):
+            nose.tools.assert_true(s.se.is_true(expr == arg))
+
 if __name__ == '__main__':
     test_calling_conventions()
@@ -10,5 +10,25 @@ def test_files():
     s.posix.write(0, "A"*0x1000, 0x1000)
     assert s.posix.dumps(0) == "A"*0x1000
 
+def test_concrete_bytes():
+    s = simuvex.SimState()
+    s.posix.write(1, "HELLO", 5)
+    f = s.posix.get_file(1)
+    assert f.extent == (0, 5)
+    assert f.concrete_bytes() == "HELLO"
+
+    # copies keep the extent, and symbolic content falls back to the solver
+    c = s.copy()
+    c.posix.write(1, c.se.BVS('sym', 16), 2)
+    cf = c.posix.get_file(1)
+    assert cf.extent == (0, 7)
+    assert cf.concrete_bytes() is None
+    assert c.posix.dumps(1).startswith("HELLO")
+    assert [ off for off,_ in cf.content_chunks(chunk_size=4) ] == [ 0, 4 ]
+
+    # the parent is untouched
+    assert f.concrete_bytes() == "HELLO"
+
 if __name__ == '__main__':
     test_files()
+    test_concrete_bytes()
@@ -1,4 +1,8 @@
+import os
 import time
+import shutil
+import struct
+import tempfile
 
 import simuvex
 import claripy
@@ -195,6 +199,40 @@ def test_memory():
     s1.add_constraints(c == 1)
     nose.tools.assert_equal(set(s1.se.any_n_int(s1.memory.load(0x8000, 4), 10)), { 0x11223344, 0xAA223344, 0xAABB3344, 0xAABBCC44, 0xAABBCCDD })
 
+def test_reverse_mappings():
+    s = SimState(arch="AMD64", mode='symbolic',
+                 add_options={ simuvex.o.REVERSE_MEMORY_NAME_MAP, simuvex.o.REVERSE_MEMORY_HASH_MAP })
+    # the mode's options are shared, and are left alone
+    nose.tools.assert_not_in(simuvex.o.REVERSE_MEMORY_NAME_MAP, simuvex.o.modes['symbolic'])
+
+    # one store spans two pages, and its value has two variables
+    a = s.se.BVS('rev_a', 32, explicit_name=True)
+    b = s.se.BVS('rev_b', 32, explicit_name=True)
+    ab = a.concat(b)
+    s.memory.store(0x1ffc, ab)
+    nose.tools.assert_equal(set(s.memory.addrs_for_name('rev_a')), set(xrange(0x1ffc, 0x2004)))
+    nose.tools.assert_equal(set(s.memory.addrs_for_name('rev_b')), set(xrange(0x1ffc, 0x2004)))
+    nose.tools.assert_equal(set(s.memory.addrs_for_hash(hash(ab))), set(xrange(0x1ffc, 0x2004)))
+
+    # a symbolic store over the middle of it only remaps the bytes it covers
+    c = s.se.BVS('rev_c', 32, explicit_name=True)
+    s2 = s.copy()
+    s2.memory.store(0x1ffe, c)
+    remaining = { 0x1ffc, 0x1ffd, 0x2002, 0x2003 }
+    nose.tools.assert_equal(set(s2.memory.addrs_for_name('rev_a')), remaining)
+    nose.tools.assert_equal(set(s2.memory.addrs_for_name('rev_b')), remaining)
+    nose.tools.assert_equal(set(s2.memory.addrs_for_hash(hash(ab))), remaining)
+    nose.tools.assert_equal(set(s2.memory.addrs_for_name('rev_c')), set(xrange(0x1ffe, 0x2002)))
+    nose.tools.assert_equal(set(s2.memory.addrs_for_hash(hash(c))), set(xrange(0x1ffe, 0x2002)))
+
+    # concrete data removes the names, and the original is unaffected
+    s2.memory.store(0x1ffc, s2.se.BVV(0, 64))
+    nose.tools.assert_equal(set(s2.memory.addrs_for_name('rev_a')), set())
+    nose.tools.assert_equal(set(s2.memory.addrs_for_name('rev_c')), set())
+    nose.tools.assert_equal(set(s2.memory.addrs_for_hash(hash(c))), set())
+    nose.tools.assert_equal(set(s.memory.addrs_for_name('rev_a')), set(xrange(0x1ffc, 0x2004)))
+    nose.tools.assert_equal(set(s.memory.addrs_for_name('rev_c')), set())
+
 def test_cased_store():
     initial_memory = { 0: 'A', 1: 'A', 2: 'A', 3: 'A' }
     so = SimState(arch="AMD64", memory_backer=initial_memory)
@@ -439,6 +477,37 @@ def test_abstract_memory_find():
     nose.tools.assert_equal(r_model.regions.keys(), ['global'])
     nose.tools.assert_true(claripy.backends.vsa.identical(r_model.regions['global'], s_expected))
 
+def test_abstract_memory_merge_regions():
+    s = SimState(mode='static',
+                 arch="AMD64",
+                 add_options={simuvex.o.ABSTRACT_SOLVER, simuvex.o.ABSTRACT_MEMORY})
+
+    def to_vs(region, offset):
+        return s.se.VS(region=region, bits=s.arch.bits, val=offset)
+
+    s.memory.store(to_vs('global', 0x10), s.se.BVV(1, 32))
+    s.memory.store(to_vs('heap', 0x10), s.se.BVV(2, 32))
+
+    # after a merge, every region is clean
+    m, _, _ = s.merge(s.copy())
+    nose.tools.assert_false(any(r.dirty for r in m.memory.regions.itervalues()))
+
+    a = m.copy()
+    b = m.copy()
+    b.memory.store(to_vs('global', 0x10), b.se.BVV(3, 32))
+    # the pages a memory shares after branching are not written in place
+    nose.tools.assert_equal(a.se.any_int(a.memory.load(to_vs('global', 0x10), 4)), 1)
+    nose.tools.assert_equal(m.se.any_int(m.memory.load(to_vs('global', 0x10), 4)), 1)
+
+    # only the region that was written to is merged
+    heap_token = a.memory.regions['heap']._merge_token
+    global_token = a.memory.regions['global']._merge_token
+    merged, _, _ = a.merge(b)
+    nose.tools.assert_is(merged.memory.regions['heap']._merge_token, heap_token)
+    nose.tools.assert_is_not(merged.memory.regions['global']._merge_token, global_token)
+    nose.tools.assert_equal(set(merged.se.any_n_int(merged.memory.load(to_vs('global', 0x10), 4), 10)), { 1, 3 })
+    nose.tools.assert_equal(merged.se.any_int(merged.memory.load(to_vs('heap', 0x10), 4)), 2)
+
 #@nose.tools.timed(10)
 def test_registers():
     s = simuvex.SimState(arch='AMD64')
@@ -540,6 +609,156 @@ def test_concrete_memset():
     s = simuvex.SimState(arch='AMD64')
     _individual_test(s, BASE, VAL, SIZE)
 
+def test_repeated_memory_object():
+    s = simuvex.SimState(arch='AMD64')
+
+    s.memory.store_repeated(0x10000, s.se.BVV(0x41, 8), 0x3000)
+    nose.tools.assert_is_instance(s.memory.mem[0x11000], simuvex.storage.SimRepeatedMemoryObject)
+    nose.tools.assert_equal(s.se.any_str(s.memory.load(0x10ffe, 4)), 'AAAA')
+    nose.tools.assert_equal(s.se.any_int(s.memory.load(0x12ffc, 8, endness='Iend_BE')), 0x41414141 << 32)
+
+    # multi-byte patterns are sliced at the right offset
+    s.memory.store_repeated(0x20000, s.se.BVV('abc'), 8)
+    nose.tools.assert_equal(s.se.any_str(s.memory.load(0x20001, 7)), 'bcabcab')
+
+    x = s.se.BVS('x', 8)
+    s.memory.store_repeated(0x30000, x, 4)
+    nose.tools.assert_true(s.memory.load(0x30001, 2) is s.se.Concat(x, x))
+
+    # two copies of the same fill have no differences
+    s2 = s.copy()
+    s2.memory.store(0x10010, s.se.BVV(0x41, 8))
+    s2.memory.store(0x10020, s.se.BVV(0x42, 8))
+    nose.tools.assert_equal(s.memory.changed_bytes(s2.memory), { 0x10020 })
+
+    # a repeated object equals the plain object it builds, from either side
+    mo = simuvex.storage.SimMemoryObject(s.memory.mem[0x30000].object, 0x30000)
+    rep = simuvex.storage.SimRepeatedMemoryObject(x, 0x30000, 4)
+    nose.tools.assert_true(rep == mo)
+    rep = simuvex.storage.SimRepeatedMemoryObject(x, 0x30000, 4)
+    nose.tools.assert_true(mo == rep)
+    nose.tools.assert_false(mo != rep)
+
+    # the write action does not build the repeated expression
+    s = simuvex.SimState(arch='AMD64', add_options={ simuvex.o.AUTO_REFS })
+    y = s.se.BVS('y', 8)
+    s.memory.store_repeated(0x40000, y, 0x100)
+    nose.tools.assert_is(s.memory.mem[0x40000]._object, None)
+    action = list(s.log.actions)[-1]
+    nose.tools.assert_equal(action.action, 'write')
+    nose.tools.assert_equal(action.size.ast, 0x100)
+
+def test_unmap_region():
+    s = simuvex.SimState(arch='AMD64')
+    malloc = simuvex.SimProcedures['libc.so.6']['malloc']
+    free = simuvex.SimProcedures['libc.so.6']['free']
+
+    a = s.se.any_int(malloc(s, inline=True, arguments=[s.se.BVV(0x2000, 64)]).ret_expr)
+    nose.tools.assert_equal(a % 0x1000, 0)
+    s.memory.store(a, s.se.BVV(0x41, 8))
+    s.memory.store_repeated(a, s.se.BVV(0, 8), 0x2000)
+    s2 = s.copy()
+
+    free(s, inline=True, arguments=[s.se.BVV(a, 64)])
+    nose.tools.assert_not_in(a / 0x1000, s.memory.mem._pages)
+    nose.tools.assert_not_in(a / 0x1000 + 1, s.memory.mem._sinkholes)
+    nose.tools.assert_true(s.se.symbolic(s.memory.load(a + 0x10, 1)))
+
+    # the copy is not affected
+    nose.tools.assert_equal(s2.se.any_int(s2.memory.load(a + 0x1010, 1)), 0)
+
+    # freed chunks are handed out again
+    b = s.se.any_int(malloc(s, inline=True, arguments=[s.se.BVV(0x1800, 64)]).ret_expr)
+    nose.tools.assert_equal(a, b)
+    c = s.se.any_int(malloc(s, inline=True, arguments=[s.se.BVV(0x18, 64)]).ret_expr)
+    free(s, inline=True, arguments=[s.se.BVV(c, 64)])
+    d = s.se.any_int(malloc(s, inline=True, arguments=[s.se.BVV(0x20, 64)]).ret_expr)
+    nose.tools.assert_equal(c, d)
+
+    nose.tools.assert_raises(simuvex.SimMemoryError, s.memory.unmap_region, s.se.BVS('unmap_addr', 64), 0x1000)
+
+def test_intern_pages():
+    from simuvex.storage import page_interning_stats
+
+    s = SimState(arch='AMD64', add_options={ simuvex.o.INTERN_PAGES })
+    x = s.se.BVS('x', 64)
+    s.memory.store(0x10000, x)
+
+    a = s.copy()
+    b = s.copy()
+    for c in (a, b):
+        c.memory.store(0x10008, s.se.BVV(0x41414141, 32))
+        c.memory.store(0x10010, x)
+    b.memory.store(0x20000, s.se.BVV(1, 8))
+
+    page_num = 0x10000 / 0x1000
+    nose.tools.assert_is_not(a.memory.mem._pages[page_num], b.memory.mem._pages[page_num])
+
+    hits = page_interning_stats()['hits']
+    a2 = a.copy()
+    b2 = b.copy()
+    nose.tools.assert_is(a.memory.mem._pages[page_num], b.memory.mem._pages[page_num])
+    nose.tools.assert_true(page_interning_stats()['hits'] > hits)
+
+    # the shared page is copied before it is written to
+    b2.memory.store(0x10008, s.se.BVV(0x42424242, 32))
+    nose.tools.assert_true(a2.se.is_true(a2.memory.load(0x10008, 4) == 0x41414141))
+    nose.tools.assert_true(b2.se.is_true(b2.memory.load(0x10008, 4) == 0x42424242))
+    nose.tools.assert_true(a.se.is_true(a.memory.load(0x10010, 8) == x))
+    nose.tools.assert_equal(b.memory.intern_pages(), 0)
+
+def _core_file(path, segment, vaddr, memsz, regs):
+    notes = struct.pack('<III', 5, 336, 1) + 'CORE\x00\x00\x00\x00' + \
+            '\x00' * 112 + struct.pack('<27Q', *regs) + '\x00' * 8
+    notes_off = 64 + 2 * 56
+    segment_off = notes_off + len(notes)
+
+    with open(path, 'wb') as f:
+        f.write('\x7fELF\x02\x01\x01' + '\x00' * 9)
+        f.write(struct.pack('<HHIQQQIHHHHHH', 4, 62, 1, 0, 64, 0, 0, 64, 56, 2, 0, 0, 0))
+        f.write(struct.pack('<IIQQQQQQ', 4, 0, notes_off, 0, 0, len(notes), 0, 4))
+        f.write(struct.pack('<IIQQQQQQ', 1, 6, segment_off, vaddr, 0, len(segment), memsz, 0x1000))
+        f.write(notes)
+        f.write(segment)
+
+def test_gdb_dumps():
+    d = tempfile.mkdtemp()
+    try:
+        data = ''.join(chr(i % 251) for i in xrange(0x2800))
+        with open(os.path.join(d, 'data'), 'wb') as f:
+            f.write(data)
+
+        s = SimState(arch='AMD64')
+        s.memory.store(0x401000, s.se.BVV(0x41414141, 32))
+        s.gdb.set_data(0x400800, os.path.join(d, 'data'))
+
+        # the pages that were touched already get the data now, the other ones when they are touched
+        nose.tools.assert_in(0x401, s.memory.mem._pages)
+        nose.tools.assert_not_in(0x402, s.memory.mem._pages)
+        nose.tools.assert_equal(s.se.any_str(s.memory.load(0x401000, 4)), data[0x800:0x804])
+        nose.tools.assert_equal(s.se.any_str(s.memory.load(0x400ffe, 0x1004)), data[0x7fe:0x1802])
+        nose.tools.assert_equal(s.se.any_str(s.memory.load(0x402ffc, 4)), data[0x27fc:0x2800])
+
+        # writes go over the mapped data
+        s.memory.store(0x402000, s.se.BVV(0, 0x8000))
+        nose.tools.assert_equal(s.se.any_int(s.memory.load(0x402000, 4)), 0)
+
+        regs = range(27)
+        regs[16] = 0x600010 # rip
+        regs[19] = 0x7ffff000 # rsp
+        _core_file(os.path.join(d, 'core'), data[:0x1800], 0x600000, 0x3000, regs)
+
+        c = SimState(arch='AMD64')
+        c.gdb.set_core(os.path.join(d, 'core'))
+        nose.tools.assert_equal(c.se.any_int(c.regs.rip), 0x600010)
+        nose.tools.assert_equal(c.se.any_int(c.regs.rsp), 0x7ffff000)
+        nose.tools.assert_equal(c.se.any_int(c.regs.rax), 10)
+        nose.tools.assert_equal(c.se.any_str(c.memory.load(0x6017fe, 4)), data[0x17fe:0x1800] + '\x00\x00')
+        nose.tools.assert_equal(c.se.any_int(c.memory.load(0x602ff8, 8)), 0)
+        nose.tools.assert_equal(c.se.any_int(c.memory.permissions(0x600000)), 3)
+    finally:
+        shutil.rmtree(d)
+
 def test_false_condition():
     s = simuvex.SimState(arch='AMD64')
 
@@ -559,7 +778,13 @@ if __name__ == '__main__':
     test_memory()
     test_copy()
     test_cased_store()
+    test_reverse_mappings()
     test_abstract_memory()
     test_abstract_memory_find()
+    test_abstract_memory_merge_regions()
     test_registers()
     test_concrete_memset()
+    test_repeated_memory_object()
+    test_unmap_region()
+    test_intern_pages()
+    test_gdb_dumps()
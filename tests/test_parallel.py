@@ -0,0 +1,101 @@
+import nose
+import simuvex
+
+from simuvex import SimState
+from simuvex.s_parallel import SimParallelStepper
+
+# cmp rdi, 10; jb +3; xor eax, eax; ret
+AMD64_BRANCH = '\x48\x83\xff\x0a\x72\x03\x31\xc0\xc3'
+
+def _states(n):
+    states = [ ]
+    for i in xrange(n):
+        s = SimState(arch='AMD64', mode='symbolic')
+        s.memory.store(0x400000, s.se.BVV(AMD64_BRANCH))
+        s.regs.rip = 0x400000
+        s.regs.rdi = i if i % 2 else s.se.BVS('rdi', 64)
+        states.append(s)
+    return states
+
+def _summary(results):
+    return [ (r.addr, r.error, [ [ s.se.any_int(s.ip) for s in getattr(r, name) ]
+                                 for name in simuvex.s_parallel.SUCCESSOR_LISTS ])
+             for r in results ]
+
+def test_parallel_step():
+    expected = _summary(SimParallelStepper(workers=0).step(_states(10)))
+    nose.tools.assert_equal(expected[0][0], 0x400000)
+    nose.tools.assert_equal(len(expected[0][2][1]), 2)
+    nose.tools.assert_equal(len(expected[1][2][1]), 1)
+
+    # the results do not depend on the number of workers
+    for workers in (1, 3):
+        stepper = SimParallelStepper(workers=workers, chunk_size=1)
+        with stepper:
+            nose.tools.assert_equal(_summary(stepper.step(_states(10))), expected)
+            nose.tools.assert_equal(stepper.stats['chunks'], 10)
+
+def _step_odd(state):
+    if state.se.symbolic(state.regs.rdi):
+        raise simuvex.SimIRSBError("even state")
+    return simuvex.s_parallel.step_block(state)
+
+def test_parallel_step_error():
+    with SimParallelStepper(step=_step_odd, workers=2) as stepper:
+        r, o = stepper.step(_states(2))
+    nose.tools.assert_in('even state', r.error)
+    nose.tools.assert_is(o.error, None)
+    nose.tools.assert_is_not(r.error, None)
+    nose.tools.assert_equal(r.flat_successors, [ ])
+
+class _UnpicklableRun(object):
+    def __init__(self):
+        self.addr = 0
+        self.successors = self.flat_successors = [ lambda: None ]
+        self.unsat_successors = self.unconstrained_successors = [ ]
+
+def _step_unpicklable(state):
+    if state.se.symbolic(state.regs.rdi):
+        return _UnpicklableRun()
+    return simuvex.s_parallel.step_block(state)
+
+def test_parallel_step_failed_chunk():
+    with SimParallelStepper(step=_step_unpicklable, workers=2, chunk_size=1) as stepper:
+        nose.tools.assert_raises(simuvex.SimParallelError, stepper.step, _states(6))
+
+        # the chunks of the failed batch do not leak into the next one
+        states = [ s for s in _states(6) if not s.se.symbolic(s.regs.rdi) ]
+        expected = _summary(SimParallelStepper(step=_step_unpicklable, workers=0).step(states))
+        nose.tools.assert_equal(_summary(stepper.step(states)), expected)
+
+def test_parallel_step_inline_copies():
+    states = _states(2)
+    SimParallelStepper(workers=0).step(states)
+    for s in states:
+        nose.tools.assert_equal(s.se.any_int(s.ip), 0x400000)
+        nose.tools.assert_is(s.scratch.bbl_addr, None)
+
+def test_step_block_side_effects():
+    s = _states(1)[0]
+    s.regs.rsp = 0x7fff0000
+    s.options.add(simuvex.o.TRACK_MEMORY_ACTIONS)
+    run = simuvex.s_parallel.step_block(s)
+    nose.tools.assert_equal(run.addr, 0x400000)
+
+    # the code was not read through load(), so nothing past it was touched
+    for succ in run.flat_successors:
+        nose.tools.assert_raises(KeyError, succ.memory.mem.__getitem__, 0x400000 + len(AMD64_BRANCH))
+        code_reads = [ a for a in succ.log.actions if a.type == 'mem' and a.action == 'read' and
+                       succ.se.any_int(a.addr.ast) == 0x400000 ]
+        nose.tools.assert_equal(code_reads, [ ])
+
+    s = SimState(arch='AMD64', mode='symbolic')
+    s.regs.rip = 0x500000
+    nose.tools.assert_raises(simuvex.SimIRSBError, simuvex.s_parallel.step_block, s)
+
+if __name__ == '__main__':
+    test_parallel_step()
+    test_parallel_step_error()
+    test_parallel_step_failed_chunk()
+    test_parallel_step_inline_copies()
+    test_step_block_side_effects()
@@ -61,6 +61,158 @@ def test_file_seek():
     nose.tools.assert_equal(r, -1)
     state.posix.close(fd)
 
+def test_lazy_file_copy():
+    state = SimState(arch="AMD64", mode='symbolic')
+    fd = state.posix.open("test", "wb")
+    state.posix.write(fd, state.se.BVV(0x41424344, 32), 4)
+    f = dict.__getitem__(state.posix.files, fd)
+
+    # the copy shares the file until it touches it
+    c = state.copy()
+    nose.tools.assert_is(dict.__getitem__(c.posix.files, fd), f)
+
+    c.posix.write(fd, state.se.BVV(0x45464748, 32), 4)
+    nose.tools.assert_is_not(c.posix.files[fd], f)
+    nose.tools.assert_true(c.se.is_true(c.posix.files[fd].pos == 8))
+
+    # the original is unaffected
+    nose.tools.assert_true(state.se.is_true(state.posix.files[fd].pos == 4))
+    nose.tools.assert_equal(state.posix.dumps(fd), "ABCD")
+    nose.tools.assert_equal(c.posix.dumps(fd), "ABCDEFGH")
+
+def _pcap_file(path, packets):
+    import dpkt
+    import socket
+
+    with open(path, 'wb') as f:
+        w = dpkt.pcap.Writer(f)
+        for i, (outgoing, payload) in enumerate(packets):
+            if outgoing:
+                src, dst, sport, dport = '10.0.0.2', '10.0.0.1', 40000, 8888
+            else:
+                src, dst, sport, dport = '10.0.0.1', '10.0.0.2', 8888, 40000
+            tcp = dpkt.tcp.TCP(sport=sport, dport=dport, flags=dpkt.tcp.TH_ACK, data=payload)
+            ip = dpkt.ip.IP(src=socket.inet_aton(src), dst=socket.inet_aton(dst), p=dpkt.ip.IP_PROTO_TCP, data=tcp)
+            w.writepkt(str(dpkt.ethernet.Ethernet(type=dpkt.ethernet.ETH_TYPE_IP, data=ip)), ts=i)
+
+def test_pcap():
+    import os
+    import shutil
+    import tempfile
+    from simuvex import PCAP, SimStateSystem
+    from simuvex.s_pcap import PCAPIndex
+
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, 'flow.pcap')
+        index_path = os.path.join(tmp, 'flow.idx')
+        _pcap_file(path, [ (True, 'GET'), (False, 'hello'), (False, ''), (False, 'world!') ])
+
+        # the index only has the packets with a payload, split by direction
+        p = PCAP(path, ('10.0.0.1', 8888), index_path=index_path)
+        nose.tools.assert_equal(list(p.in_streams), [ (5, 'hello'), (6, 'world!') ])
+        nose.tools.assert_equal(list(p.out_streams), [ (3, 'GET') ])
+        nose.tools.assert_true(os.path.exists(index_path))
+
+        # recv stops at the end of a packet
+        nose.tools.assert_equal(p.recv(3), ('hel', 3))
+        c = p.copy()
+        nose.tools.assert_equal(p.recv(10), ('lo', 2))
+        nose.tools.assert_equal(p.recv(4), ('worl', 4))
+        nose.tools.assert_equal(p.recv(4), ('d!', 2))
+
+        # copies share the index, but not the cursor
+        nose.tools.assert_is(c._index, p._index)
+        nose.tools.assert_equal(c.recv(10), ('lo', 2))
+
+        # every copy of a state reads the pcap with its own cursor
+        backer = PCAP(path, ('10.0.0.1', 8888))
+        state = SimState(arch="AMD64", mode='symbolic', plugins={ 'posix': SimStateSystem(pcap_backer=backer) })
+        c = state.copy()
+        nose.tools.assert_is_not(c.posix.pcap, state.posix.pcap)
+        nose.tools.assert_is(c.posix.pcap._index, backer._index)
+        nose.tools.assert_equal(c.posix.pcap.recv(3), ('hel', 3))
+        nose.tools.assert_equal((state.posix.pcap.packet_num, state.posix.pcap.pos), (0, 0))
+        backer._index.close()
+
+        # the index is loaded from the cache file while the capture is unchanged...
+        build_index = PCAPIndex._build_index
+        def no_build(self):
+            raise AssertionError("the cached index was not used")
+        PCAPIndex._build_index = no_build
+        try:
+            nose.tools.assert_equal(list(PCAP(path, ('10.0.0.1', 8888), index_path=index_path).in_streams),
+                                    list(p.in_streams))
+        finally:
+            PCAPIndex._build_index = build_index
+
+        # ...and rebuilt when it changes
+        p._index.close()
+        _pcap_file(path, [ (False, 'bye') ])
+        p = PCAP(path, ('10.0.0.1', 8888), index_path=index_path)
+        nose.tools.assert_equal(list(p.in_streams), [ (3, 'bye') ])
+        p._index.close()
+    finally:
+        shutil.rmtree(tmp)
+
+def test_syscall_dispatch():
+    import simuvex
+    from simuvex import SimProcedures, UnsupportedSyscallError
+    from simuvex.plugins.solver import SimSolver
+    from simuvex.procedures.syscalls import syscall_table
+    handler = SimProcedures['syscalls']['handler']
+
+    state = SimState(arch="AMD64", mode='symbolic')
+    state.regs.ip = 0x400000
+
+    # a concrete syscall number is dispatched without asking the solver
+    any_n_int = SimSolver.any_n_int
+    def no_solving(*args, **kwargs):
+        raise AssertionError("the solver was asked about a concrete syscall number")
+    SimSolver.any_n_int = no_solving
+    try:
+        state.regs.rax = 39
+        run = handler(state, addr=0x400000)
+    finally:
+        SimSolver.any_n_int = any_n_int
+    nose.tools.assert_equal(run.callname, 'getpid')
+    nose.tools.assert_equal(len(run.flat_successors), 1)
+    nose.tools.assert_true(run.flat_successors[0].se.is_true(run.flat_successors[0].regs.rax == state.posix.pid))
+    nose.tools.assert_equal(len(run.state.se.constraints), len(state.se.constraints))
+
+    # a symbolic one is constrained to its possible values
+    n = state.se.BVS('syscall_num', 64)
+    s = state.copy()
+    s.regs.rax = n
+    s.add_constraints(s.se.Or(n == 39, n == 186))
+    run = handler(s, addr=0x400000)
+    nose.tools.assert_in(run.callname, ('getpid', 'gettid'))
+    nose.tools.assert_equal(len(run.flat_successors), 2)
+    nose.tools.assert_equal(sorted(run.state.se.any_n_int(n, 3)), [ 39, 186 ])
+
+    # the calling convention is shared by all the syscalls of an arch
+    nose.tools.assert_is(run.syscall.cc, handler(state, addr=0x400000).syscall.cc)
+
+    # numbers without a syscall, or without a procedure for it, are unsupported
+    syscall_table['AMD64'][500] = 'not_a_syscall'
+    try:
+        for num, message in ((501, "no syscall 501"), (500, "not_a_syscall (500) is not implemented")):
+            s = state.copy()
+            s.regs.rax = num
+            try:
+                handler(s, addr=0x400000)
+            except UnsupportedSyscallError as e:
+                nose.tools.assert_in(message, str(e))
+            else:
+                raise AssertionError("syscall %d should not be supported" % num)
+
+            s.options.add(simuvex.o.BYPASS_UNSUPPORTED_SYSCALL)
+            run = handler(s, addr=0x400000)
+            nose.tools.assert_is(run.callname, None)
+            nose.tools.assert_is(run.syscall, None)
+    finally:
+        del syscall_table['AMD64'][500]
+
 def main():
     g = globals()
     if len(sys.argv) > 1:
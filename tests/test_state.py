@@ -181,10 +181,261 @@ def test_global_condition():
         nose.tools.assert_equals(s.se.any_n_int(s.regs.rbx, 10), [ 1 ])
         nose.tools.assert_items_equal(s.se.any_n_int(s.regs.rax, 10), [ 25 ])
 
+def test_lazy_plugin_copy():
+    s = SimState(arch='AMD64')
+    s.memory.store(0x100, s.se.BVV(1, 32))
+    s.regs.rax = 10
+    posix = s.posix
+
+    c = s.copy()
+    nose.tools.assert_is(type(dict.__getitem__(c.plugins, 'posix')), simuvex.s_state.SharedPlugin)
+    nose.tools.assert_not_in('regs', dict.keys(c.plugins))
+
+    c.memory.store(0x100, c.se.BVV(2, 32))
+    c.regs.rax = 20
+    nose.tools.assert_equals(s.se.any_int(s.memory.load(0x100, 4)), 1)
+    nose.tools.assert_equals(c.se.any_int(c.memory.load(0x100, 4)), 2)
+    nose.tools.assert_equals(s.se.any_int(s.regs.rax), 10)
+    nose.tools.assert_equals(c.se.any_int(c.regs.rax), 20)
+
+    # the posix plugin was never touched by the copy, so the original gets its instance back
+    del c
+    gc.collect()
+    nose.tools.assert_is(s.posix, posix)
+
+    # the children of a state that is gone can still copy the plugins they share
+    a = s.copy()
+    b = s.copy()
+    del s, posix
+    gc.collect()
+    a.memory.store(0x100, a.se.BVV(3, 32))
+    b.memory.store(0x100, b.se.BVV(4, 32))
+    a.scratch.jumpkind = 'Ijk_Boring'
+    nose.tools.assert_equals(a.se.any_int(a.memory.load(0x100, 4)), 3)
+    nose.tools.assert_equals(b.se.any_int(b.memory.load(0x100, 4)), 4)
+    nose.tools.assert_is(b.scratch.jumpkind, None)
+
+    # a plugin that forks its own state keeps its binding to that state
+    s = SimState(arch='AMD64')
+    mem = s.memory
+    c = mem.state.copy()
+    c.memory.store(0x200, c.se.BVV(5, 32))
+    nose.tools.assert_is(mem.state.plugins, s.plugins)
+    del c
+    gc.collect()
+    mem.store(0x200, mem.state.se.BVV(6, 32))
+    nose.tools.assert_is(s.memory, mem)
+    nose.tools.assert_equals(s.se.any_int(s.memory.load(0x200, 4)), 6)
+
+    # the plugins never leave the dict shared
+    c = s.copy()
+    for plugins in (c.plugins.copy(), dict(c.plugins.viewitems()), { 'memory': c.plugins.pop('memory') }):
+        for p in plugins.itervalues():
+            nose.tools.assert_is_not(type(p), simuvex.s_state.SharedPlugin)
+    nose.tools.assert_is_not(type(c.plugins.setdefault('posix', None)), simuvex.s_state.SharedPlugin)
+    nose.tools.assert_is(c.plugins.pop('memory', None), None)
+
+def test_scratch_temps():
+    s = SimState(arch='AMD64')
+    s.scratch.prepare_temps(4)
+    s.scratch.store_tmp(2, s.se.BVV(5, 32))
+
+    nose.tools.assert_true(s.scratch.has_tmp(2))
+    nose.tools.assert_false(s.scratch.has_tmp(1))
+    nose.tools.assert_false(s.scratch.has_tmp(10))
+    nose.tools.assert_equals(s.se.any_int(s.scratch.tmp_expr(2)), 5)
+    nose.tools.assert_raises(KeyError, s.scratch.tmp_expr, 1)
+
+    # temps are dead after the block, so they are not copied
+    c = s.copy()
+    nose.tools.assert_false(c.scratch.has_tmp(2))
+
+def test_solver_passthroughs():
+    from simuvex.plugins import solver
+    from simuvex.s_action_object import SimActionObject
+
+    # claripy operations are real methods, rather than partials built on every access
+    nose.tools.assert_in('If', vars(solver.SimSolver))
+    nose.tools.assert_in('Concat', vars(solver.SimSolver))
+
+    s = SimState(arch='AMD64')
+    x = SimActionObject(s.se.BVV(0x41, 8))
+    r = s.se.If(x == 0x41, s.se.Concat(x, x), s.se.BVV(0, 16))
+    nose.tools.assert_is_instance(r, claripy.ast.BV)
+    nose.tools.assert_equal(s.se.any_int(r), 0x4141)
+
+    solver.enable_timing()
+    try:
+        nose.tools.assert_equal(s.se.any_int(s.se.Concat(x, x)), 0x4141)
+    finally:
+        solver.disable_timing()
+
+def test_footprint():
+    from simuvex.s_footprint import footprint
+
+    s = SimState(arch='AMD64')
+    for i in xrange(4):
+        s.memory.store(0x1000 + i * 0x1000, s.se.BVS('x_%d' % i, 64))
+    s.add_constraints(s.se.BVS('y', 32) > 10)
+
+    r = s.footprint()
+    nose.tools.assert_equal(r['memory']['pages'], 4)
+    nose.tools.assert_equal(r['memory']['bytes'], 32)
+    nose.tools.assert_equal(r['memory']['memory_objects'], 4)
+    nose.tools.assert_true(r['memory']['ast_nodes'] >= 4)
+    nose.tools.assert_equal(r['solver_engine']['constraints'], 1)
+    nose.tools.assert_false(r['memory']['shared'])
+
+    # footprinting does not copy the shared plugins
+    c = s.copy()
+    nose.tools.assert_true(c.footprint()['memory']['shared'])
+    nose.tools.assert_true(c.footprint()['memory']['shared'])
+
+    # after a write, the copy owns one page and shares the rest
+    c.memory.store(0x1000, s.se.BVV(0, 64))
+    r = c.footprint()
+    nose.tools.assert_false(r['memory']['shared'])
+    nose.tools.assert_equal(r['memory']['owned_pages'], 1)
+    nose.tools.assert_equal(r['memory']['shared_pages'], 3)
+
+    # the pages that are shared between the two states are counted once
+    totals = footprint([ s, c ])
+    nose.tools.assert_equal(totals['memory']['pages'], 5)
+    nose.tools.assert_equal(totals['memory']['memory_objects'], 5)
+    nose.tools.assert_equal(totals['solver_engine']['ast_nodes'], s.footprint()['solver_engine']['ast_nodes'])
+
+def test_snapshot():
+    from simuvex.s_snapshot import SnapshotEncoder, load_states
+
+    x = claripy.BVS('x', 64)
+    s = SimState(arch='AMD64')
+    s.memory.store(0x1000, x)
+    s.memory.store(0x2000, s.se.BVV(0x41424344, 32))
+    s.regs.rax = x + 1
+    s.add_constraints(x > 10)
+    c = s.copy()
+    c.memory.store(0x2000, s.se.BVV(0x45464748, 32))
+
+    # a state that is not a copy, but holds the same page
+    t = SimState(arch='AMD64')
+    t.memory.store(0x1000, x)
+
+    encoder = SnapshotEncoder()
+    data = encoder.encode([ s, c, t ])
+    nose.tools.assert_true(encoder.stats['deduplicated_pages'] >= 1)
+
+    ds, dc, dt = load_states(data)
+    nose.tools.assert_is(ds.memory.load(0x1000, 8), dc.memory.load(0x1000, 8))
+    nose.tools.assert_is(ds.memory.load(0x1000, 8), dt.memory.load(0x1000, 8))
+    nose.tools.assert_equal(ds.se.any_int(ds.memory.load(0x2000, 4)), 0x41424344)
+    nose.tools.assert_equal(dc.se.any_int(dc.memory.load(0x2000, 4)), 0x45464748)
+    nose.tools.assert_equal(ds.se.min_int(ds.regs.rax), 12)
+    nose.tools.assert_is(ds.memory.state.memory, ds.memory)
+
+    # the decoded states share their pages copy-on-write
+    dt.memory.store(0x1000, dt.se.BVV(0, 64))
+    nose.tools.assert_equal(dt.se.any_int(dt.memory.load(0x1000, 8)), 0)
+    nose.tools.assert_equal(ds.memory.load(0x1000, 8).variables, x.variables)
+
+def test_variable_set():
+    from simuvex.s_interval import SimIntervalSet
+    from simuvex.s_variable import SimVariableSet, SimMemoryVariable, SimRegisterVariable
+    from simuvex.storage.memory import AddressWrapper
+
+    i = SimIntervalSet()
+    i.add_range(0x10, 0x20)
+    i.add_range(0x30, 0x40)
+    i.add_range(0x20, 0x30)
+    nose.tools.assert_equal(i.ranges(), [ (0x10, 0x40) ])
+    i.discard_range(0x18, 0x28)
+    nose.tools.assert_equal(i.ranges(), [ (0x10, 0x18), (0x28, 0x40) ])
+    nose.tools.assert_equal(len(i), 0x20)
+    nose.tools.assert_in(0x17, i)
+    nose.tools.assert_not_in(0x18, i)
+    nose.tools.assert_true(i.contains_range(0x28, 0x40))
+    nose.tools.assert_false(i.contains_range(0x10, 0x20))
+    nose.tools.assert_equal(set(i - SimIntervalSet(xrange(0x12, 0x30))), { 0x10, 0x11 } | set(xrange(0x30, 0x40)))
+
+    used = SimVariableSet()
+    stack = lambda a: AddressWrapper('stack', a, True, None)
+    big = SimMemoryVariable(stack(0x1000), 0x10000)
+    used.add(big)
+    used.add(SimRegisterVariable(16, 8))
+    nose.tools.assert_in(SimMemoryVariable(stack(0x1000), 4), used)
+    nose.tools.assert_equal(used.memory_variable_addresses.ranges(), [ (0x1000, 0x11000) ])
+
+    inputs = SimVariableSet()
+    inputs.add(SimMemoryVariable(stack(0x2000), 8))
+    ignored = used.complement(inputs)
+    nose.tools.assert_equal(ignored.memory_variable_addresses.ranges(), [ (0x1000, 0x2000), (0x2008, 0x11000) ])
+    nose.tools.assert_in(16, ignored.register_variable_offsets)
+
+    used.discard(big)
+    nose.tools.assert_equal(len(used.memory_variable_addresses), 0)
+
+    # copies of the scratch keep the variables
+    s = SimState(arch='AMD64')
+    s.scratch.used_variables.add(SimRegisterVariable(16, 8))
+    nose.tools.assert_in(SimRegisterVariable(16, 8), s.copy().scratch.used_variables)
+
+def test_state_copy():
+    from simuvex.vex import dirty
+
+    class MyState(SimState):
+        pass
+
+    s = MyState(arch='X86', add_options={ simuvex.o.TRACK_MEMORY_ACTIONS })
+    s.regs.eax = 0x41
+    s.ip_constraints.append(s.se.BVS('ip', 32) == 0x1000)
+    s.uninitialized_access_handler = lambda *args: None
+
+    # copies are built without __init__, but end up like the original
+    c = s.copy()
+    nose.tools.assert_is(type(c), MyState)
+    nose.tools.assert_equal(c.mode, s.mode)
+    nose.tools.assert_equal(c.options, s.options)
+    nose.tools.assert_is_not(c.options, s.options)
+    nose.tools.assert_is(c.uninitialized_access_handler, s.uninitialized_access_handler)
+    nose.tools.assert_equal(c.ip_constraints, s.ip_constraints)
+    nose.tools.assert_is(c._global_condition, None)
+    nose.tools.assert_true(c.satisfiable())
+    nose.tools.assert_true(c.se.is_true(c.regs.eax == 0x41))
+    c.regs.eax = 0x42
+    nose.tools.assert_true(s.se.is_true(s.regs.eax == 0x41))
+    c.options.add(simuvex.o.TRACK_REGISTER_ACTIONS)
+    nose.tools.assert_not_in(simuvex.o.TRACK_REGISTER_ACTIONS, s.options)
+
+    # the copies share the arch until one of them has to change it
+    c2 = c.copy()
+    nose.tools.assert_is(c.arch, s.arch)
+    nose.tools.assert_is(c2.arch, s.arch)
+    cr0 = s.arch.vex_archinfo.get('x86_cr0', None)
+    dirty.x86g_dirtyhelper_write_cr0(c, c.se.BVV(0x80000011, 32))
+    nose.tools.assert_is_not(c.arch, s.arch)
+    nose.tools.assert_equal(c.arch.vex_archinfo['x86_cr0'], 0x80000011)
+    nose.tools.assert_equal(s.arch.vex_archinfo.get('x86_cr0', None), cr0)
+    nose.tools.assert_is(c2.arch, s.arch)
+
+    # the UUID of a copy is only made when it is first pickled
+    p = SimState(arch='X86')
+    p.regs.eax = 0x41
+    pc = p.copy()
+    nose.tools.assert_is(getattr(pc, '_ana_uuid', None), None)
+    loaded = pickle.loads(pickle.dumps(pc, -1))
+    nose.tools.assert_is_not(getattr(pc, '_ana_uuid', None), None)
+    nose.tools.assert_equal(loaded._ana_uuid, pc._ana_uuid)
+    nose.tools.assert_true(loaded.se.is_true(loaded.regs.eax == 0x41))
 
 if __name__ == '__main__':
     test_state()
     test_state_merge()
     test_state_merge_static()
     test_state_pickle()
+    test_state_copy()
     test_global_condition()
+    test_lazy_plugin_copy()
+    test_scratch_temps()
+    test_solver_passthroughs()
+    test_footprint()
+    test_snapshot()
+    test_variable_set()
@@ -161,6 +161,30 @@ def test_inline_strcmp():
     nose.tools.assert_false(s_match.satisfiable())
     nose.tools.assert_false(s_match.satisfiable())
 
+def test_concrete_strcmp():
+    s = SimState(arch="AMD64", mode="symbolic")
+    a_addr = s.se.BVV(0x10, 64)
+    b_addr = s.se.BVV(0xb0, 64)
+    c_addr = s.se.BVV(0x150, 64)
+    s.memory.store(a_addr, s.se.BVV("hello world\x00"), endness="Iend_BE")
+    s.memory.store(b_addr, s.se.BVV("hello there\x00"), endness="Iend_BE")
+    s.memory.store(c_addr, s.se.Concat(s.se.BVV("hello "), s.se.BVS("rest", 8), s.se.BVV("orld\x00")),
+                   endness="Iend_BE")
+
+    # fully concrete strings are compared without adding any constraints
+    n_constraints = len(s.se.constraints)
+    nose.tools.assert_equal(s.se.any_int(strcmp(s, inline=True, arguments=[a_addr, b_addr]).ret_expr), 1)
+    nose.tools.assert_equal(s.se.any_int(strcmp(s, inline=True, arguments=[b_addr, a_addr]).ret_expr), 0xffffffffffffffff)
+    nose.tools.assert_equal(s.se.any_int(strcmp(s, inline=True, arguments=[a_addr, a_addr]).ret_expr), 0)
+    nose.tools.assert_equal(s.se.any_int(strncmp(s, inline=True, arguments=[a_addr, b_addr, s.se.BVV(6, 64)]).ret_expr), 0)
+    nose.tools.assert_equal(s.se.any_int(memcmp(s, inline=True, arguments=[a_addr, b_addr, s.se.BVV(7, 64)]).ret_expr), 1)
+    nose.tools.assert_equal(len(s.se.constraints), n_constraints)
+
+    # only the symbolic rest is constrained
+    cmpres = strcmp(s, inline=True, arguments=[a_addr, c_addr]).ret_expr
+    s.add_constraints(cmpres == 0)
+    nose.tools.assert_equal(s.se.any_n_str(s.memory.load(c_addr, 7), 2), [ "hello w" ])
+
 #@nose.tools.timed(10)
 def test_inline_strncmp():
     l.info("symbolic left, symbolic right, symbolic len")
@@ -895,6 +919,7 @@ if __name__ == '__main__':
     test_fgetc()
     test_getchar()
     test_inline_strcmp()
+    test_concrete_strcmp()
     test_inline_strlen()
     test_inline_strncmp()
     test_memcmp()
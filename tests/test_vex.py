@@ -1,4 +1,5 @@
 import nose
+import random
 from simuvex import SimState, SimIRSB
 import simuvex.vex.ccall as s_ccall
 import pyvex
@@ -193,6 +194,102 @@ def test_some_vector_ops():
     correct_result = s.se.BVV(0xee007766, 32)
     nose.tools.assert_true(s.se.is_true(calc_result == correct_result))
 
+def test_concrete_irop():
+    from simuvex.vex.irop import operations
+
+    s = SimState()
+    r = random.Random(0x41)
+
+    # each operation, with the sizes of its arguments
+    ops = [
+        ('Iop_Add8', (8, 8)), ('Iop_Add32', (32, 32)), ('Iop_Add64', (64, 64)),
+        ('Iop_Sub32', (32, 32)), ('Iop_Sub64', (64, 64)), ('Iop_Mul32', (32, 32)), ('Iop_Mul64', (64, 64)),
+        ('Iop_DivU32', (32, 32)), ('Iop_DivS64', (64, 64)),
+        ('Iop_And8', (8, 8)), ('Iop_Or32', (32, 32)), ('Iop_Xor64', (64, 64)), ('Iop_Not32', (32,)),
+        ('Iop_Shl32', (32, 8)), ('Iop_Shr64', (64, 8)), ('Iop_Sar32', (32, 8)), ('Iop_Sar64', (64, 8)),
+        ('Iop_CmpEQ32', (32, 32)), ('Iop_CmpNE64', (64, 64)), ('Iop_CmpNEZ8', (8,)),
+        ('Iop_CmpLT32S', (32, 32)), ('Iop_CmpLT64U', (64, 64)), ('Iop_CmpLE32S', (32, 32)), ('Iop_CmpLE64U', (64, 64)),
+        ('Iop_CasCmpEQ8', (8, 8)), ('Iop_ExpCmpNE32', (32, 32)),
+        ('Iop_CmpORD32S', (32, 32)), ('Iop_CmpORD64U', (64, 64)),
+        ('Iop_MullS32', (32, 32)), ('Iop_MullU64', (64, 64)),
+        ('Iop_Clz32', (32,)), ('Iop_Clz64', (64,)), ('Iop_Ctz32', (32,)), ('Iop_Ctz64', (64,)),
+        ('Iop_DivModU64to32', (64, 32)), ('Iop_DivModS64to32', (64, 32)), ('Iop_DivModU128to64', (128, 64)),
+        ('Iop_8Uto32', (8,)), ('Iop_8Sto64', (8,)), ('Iop_16Sto32', (16,)), ('Iop_32Uto64', (32,)),
+        ('Iop_64to32', (64,)), ('Iop_64to8', (64,)), ('Iop_64HIto32', (64,)), ('Iop_128to64', (128,)),
+        ('Iop_128HIto64', (128,)), ('Iop_32HLto64', (32, 32)), ('Iop_64HLto128', (64, 64)), ('Iop_1Uto8', (1,)),
+    ]
+
+    for name, sizes in ops:
+        op = operations[name]
+        nose.tools.assert_is_not_none(op._concrete_calculate, name)
+
+        for i in xrange(32):
+            values = [ ]
+            for size in sizes:
+                if i == 0:
+                    v = 0
+                elif i == 1:
+                    v = (1 << size) - 1
+                elif i == 2:
+                    v = 1 << (size - 1)
+                else:
+                    v = r.getrandbits(size) >> r.randint(0, size - 1)
+                values.append(v)
+            if 'Div' in name and values[1] == 0:
+                values[1] = 1
+
+            args = [ s.se.BVV(v, size) for v, size in zip(values, sizes) ]
+            concrete = op.calculate(*args)
+            symbolic = op.extend_size(op._calculate(args))
+
+            nose.tools.assert_equal(concrete.op, 'BVV')
+            nose.tools.assert_equal(concrete.length, symbolic.length, name)
+            nose.tools.assert_true(s.se.is_true(concrete == symbolic), "%s%r" % (name, tuple(values)))
+
+def test_concrete_vector_irop():
+    from simuvex.vex import irop
+    if irop.numpy is None:
+        raise nose.SkipTest("numpy is not installed")
+
+    s = SimState()
+    r = random.Random(0x42)
+
+    ops = [
+        'Iop_Add8x16', 'Iop_Add16x8', 'Iop_Add32x4', 'Iop_Add64x2', 'Iop_Sub8x16', 'Iop_Sub64x2', 'Iop_Mul16x8',
+        'Iop_Shl16x8', 'Iop_Shr32x4', 'Iop_Sar8x16', 'Iop_ShlN16x8', 'Iop_ShrN64x2', 'Iop_SarN32x4',
+        'Iop_CmpEQ8x16', 'Iop_CmpEQ32x4', 'Iop_CmpGT8Sx16', 'Iop_CmpGT16Ux8', 'Iop_CmpGT64Sx2', 'Iop_CmpNEZ8x16',
+        'Iop_Min8Ux16', 'Iop_Min16Sx8', 'Iop_Max8Ux16', 'Iop_Max32Sx4', 'Iop_GetMSBs8x16',
+        'Iop_InterleaveLO8x16', 'Iop_InterleaveLO64x2', 'Iop_HAdd8Sx4', 'Iop_HSub16Ux2',
+        'Iop_QAdd8Sx16', 'Iop_QAdd16Ux8', 'Iop_QSub8Ux16', 'Iop_QSub16Sx8', 'Iop_QAdd64Sx2', 'Iop_QSub64Ux2',
+    ]
+
+    for name in ops:
+        op = irop.operations[name]
+        nose.tools.assert_is_not_none(op._concrete_calculate, name)
+        size = op._vector_size * op._vector_count
+        if op._generic_name in ('ShlN', 'ShrN', 'SarN'):
+            sizes = (size, 8)
+        elif op._generic_name in ('GetMSBs', 'CmpNEZ'):
+            sizes = (size,)
+        else:
+            sizes = (size, size)
+
+        for i in xrange(32):
+            if i < 2:
+                lane = (0, (1 << op._vector_size) - 1)[i]
+                values = [ sum(lane << (j * op._vector_size) for j in xrange(op._vector_count)) ] * len(sizes)
+            else:
+                values = [ r.getrandbits(n) for n in sizes ]
+            if sizes[-1] == 8 and len(sizes) == 2:
+                values[1] %= op._vector_size + 4
+
+            args = [ s.se.BVV(v, n) for v, n in zip(values, sizes) ]
+            concrete = op.calculate(*args)
+            symbolic = op.extend_size(op._calculate(args))
+
+            nose.tools.assert_equal(concrete.op, 'BVV')
+            nose.tools.assert_true(s.se.is_true(concrete == symbolic), "%s%r" % (name, tuple(values)))
+
 def test_store_simplification():
     state = SimState(arch='X86')
     state.regs.esp = state.se.BVS('stack_pointer', 32)
@@ -205,6 +302,101 @@ def test_store_simplification():
 
     nose.tools.assert_true(claripy.backends.z3.is_true(exit_state.regs.ebp == state.regs.esp - 4))
 
+def test_profiler():
+    from simuvex import s_profiler, SimProcedures
+
+    state = SimState(arch='AMD64')
+    state.regs.rsp = 0x7fff0000
+    state.regs.rdi = state.se.BVS('rdi', 64)
+    state.memory.store(0x1000, state.se.BVV('hello\x00'), endness='Iend_BE')
+    # mov rax, rdi; mov [rsp+8], rax; mov rbx, [rsp+8]; ret
+    irsb = pyvex.IRSB('\x48\x89\xf8\x48\x89\x44\x24\x08\x48\x8b\x5c\x24\x08\xc3', 0x400000, state.arch)
+
+    p = s_profiler.enable_profiling()
+    try:
+        SimIRSB(state.copy(), irsb).flat_successors
+        SimIRSB(state.copy(), irsb).flat_successors
+        SimProcedures['libc.so.6']['strlen'](state, inline=True, arguments=[state.se.BVV(0x1000, 64)])
+    finally:
+        nose.tools.assert_is(s_profiler.disable_profiling(), p)
+
+    block = p.counters['irsb'][0x400000]
+    nose.tools.assert_equal(block['count'], 2)
+    nose.tools.assert_equal(block['statements'], 2 * len(irsb.statements))
+    nose.tools.assert_equal(p.counters['procedure']['strlen']['count'], 1)
+    nose.tools.assert_true(p.counters['state']['copy']['count'] >= 2)
+    nose.tools.assert_true(p.counters['memory']['store']['count'] >= 2)
+    nose.tools.assert_true(p.counters['memory']['load']['count'] >= 2)
+    for stats in p.counters['solver'].itervalues():
+        nose.tools.assert_equal(sum(stats['sites'].itervalues()), stats['count'])
+
+    # nested calls show up under their callers
+    nose.tools.assert_true(any(line.startswith('irsb 0x400000;memory ') for line in p.collapsed_stacks()))
+    nose.tools.assert_in('0x400000', p.to_dict()['irsb'])
+
+    # nothing is collected when profiling is disabled
+    SimIRSB(state.copy(), irsb)
+    nose.tools.assert_equal(block['count'], 2)
+
+def test_slicer():
+    from simuvex import s_slicer
+    from simuvex.s_slicer import SimSlicer
+
+    arch = SimState(arch='AMD64').arch
+    rax, rbx, rdi = [ arch.registers[r][0] for r in ('rax', 'rbx', 'rdi') ]
+    # mov rax, rdi; mov [rsp+8], rax; mov rbx, [rsp+8]; ret
+    code = '\x48\x89\xf8\x48\x89\x44\x24\x08\x48\x8b\x5c\x24\x08\xc3'
+    irsb = pyvex.IRSB(code, 0x400000, arch)
+
+    s_slicer.clear_def_use_cache()
+    targets = [ (None, { rbx }, None), (None, { rax }, None), (None, { rax, rbx }, None) ]
+    many = SimSlicer.slice_many(arch, irsb.statements, targets)
+    for (t, r, o), m in zip(targets, many):
+        single = SimSlicer(arch, irsb.statements, target_tmps=t, target_regs=r, target_stack_offsets=o)
+        nose.tools.assert_equal(m.stmt_indices, single.stmt_indices)
+        nose.tools.assert_equal(m.final_regs, single.final_regs)
+        nose.tools.assert_equal(m.final_stack_offsets, single.final_stack_offsets)
+        # the def-use information of the block is only computed once
+        nose.tools.assert_is(m._def_use, single._def_use)
+
+    # rbx goes through the stack back to rdi
+    nose.tools.assert_in(rdi, many[0].final_regs)
+    nose.tools.assert_equal(many[2].stmt_indices, sorted(set(many[0].stmt_indices) | set(many[1].stmt_indices)))
+
+    # the statement handlers of subclasses are used
+    class NoPutSlicer(SimSlicer):
+        def _backward_handler_stmt_Put(self, stmt, uses):
+            return None
+    nose.tools.assert_equal(NoPutSlicer(arch, irsb.statements, target_regs={ rbx }).stmt_indices, [ ])
+
+    # the least recently used blocks are evicted
+    size = s_slicer.DEF_USE_CACHE_SIZE
+    s_slicer.DEF_USE_CACHE_SIZE = 2
+    try:
+        s_slicer.clear_def_use_cache()
+        blocks = [ pyvex.IRSB(code, 0x400000, arch) for _ in xrange(3) ]
+        def def_use(b):
+            return SimSlicer(arch, b.statements, target_regs={ rbx })._def_use
+
+        first, second = def_use(blocks[0]), def_use(blocks[1])
+        nose.tools.assert_is(def_use(blocks[0]), first)
+        def_use(blocks[2])
+        nose.tools.assert_equal(len(s_slicer._def_use_cache), 2)
+        nose.tools.assert_is(def_use(blocks[0]), first)
+        nose.tools.assert_is_not(def_use(blocks[1]), second)
+        for b in blocks:
+            nose.tools.assert_equal(SimSlicer(arch, b.statements, target_regs={ rbx }).stmt_indices,
+                                    many[0].stmt_indices)
+    finally:
+        s_slicer.DEF_USE_CACHE_SIZE = size
+        s_slicer.clear_def_use_cache()
+
+    # the alias analysis depends on the initial stack pointer
+    other_arch = arch.copy()
+    other_arch.initial_sp += 0x1000
+    nose.tools.assert_is_not(SimSlicer(other_arch, irsb.statements, target_regs={ rbx })._def_use,
+                             SimSlicer(arch, irsb.statements, target_regs={ rbx })._def_use)
+
 if __name__ == '__main__':
     g = globals().copy()
     for func_name, func in g.iteritems():